@@ -19,10 +19,15 @@
 # Author: Abid H. Mujtaba
 # Date: 2014-03-01
 #
-# This script reads bitcoin data from "data.txt" and then displays it in an interactive plot to aid in analysis.
+# This script reads bitcoin data from "data.db" and then displays it in an interactive plot to aid in analysis.
 #
-# Furthermore it calculates a weighted moving average to smooth out the fluctuations and grant greater insight in to how
-# the price is trending.
+# The weighted averages stored alongside the prices are plotted to smooth out the fluctuations and grant greater insight
+# in to how the price is trending.
+#
+# Only the visible range (plus a margin on either side for panning) is handed to the plot and it is decimated to about
+# one min/max pair per pixel, so that histories of several months pan and zoom smoothly.
+#
+# Usage:        python analyze.py [DAYS]            - Plot the last DAYS days of prices (default: 2)
 
 from chaco.api import ArrayPlotData, Plot
 from chaco.tools.api import PanTool, ZoomTool
@@ -31,6 +36,7 @@ from enable.component_editor import ComponentEditor
 import numpy
 import os
 import sqlite3
+import sys
 import time
 from traits.api import HasTraits, Instance
 from traitsui.api import Item, View
@@ -42,6 +48,8 @@ LIGHT_RED = (0.9, 0, 0, 0.8)
 GREEN = (0, 0.9, 0)
 LIGHT_GREEN = (0, 0.9, 0, 0.7)
 
+PIXELS = 1200           # Width in pixels assumed for the decimation until the plot has been laid out
+
 
 class PricePlot(HasTraits):
 
@@ -54,38 +62,30 @@ class PricePlot(HasTraits):
 
     def __init__(self, time, buy, sell, weighted_buy, weighted_sell):
 
-        t = numpy.array(time)       # Convert lists to numpy arrays in preparation for plotting
-        b = numpy.array(buy)
-        s = numpy.array(sell)
-        wb = numpy.array(weighted_buy)
-        ws = numpy.array(weighted_sell)
+        # The full series are kept as numpy arrays. Only a decimated slice of them is plotted (see _update_data)
+        self.t = numpy.asarray(time, dtype=float)
+        self.b = numpy.asarray(buy, dtype=float)
+        self.s = numpy.asarray(sell, dtype=float)
+        self.wb = numpy.asarray(weighted_buy, dtype=float)
+        self.ws = numpy.asarray(weighted_sell, dtype=float)
 
-        self.t = t
-        self.b = b
-        self.s = s
+        self.plot_data = ArrayPlotData()
+        self._update_data(self.t[0], self.t[-1])
 
-        plot_data = ArrayPlotData(t=t, b=b, s=s, wb=wb, ws=ws)
-
-        plot = Plot(plot_data)
+        plot = Plot(self.plot_data)
         self.plot = plot
 
-        # Calculate range of plot so it shows latest 1 day of data
-        end = t[-1]
-        start = end - 86400
-
-        self._configure_plot(plot, start, end)
-
         # Scatter point for prices
-        buy_renderer = plot.plot(("t", "b"), type="scatter", color=RED)[0]
-        sell_renderer = plot.plot(("t", "s"), type="scatter", color=GREEN)[0]
+        buy_renderer = plot.plot(("tb", "b"), type="scatter", color=RED)[0]
+        sell_renderer = plot.plot(("ts", "s"), type="scatter", color=GREEN)[0]
 
         # Line plot to connect the scatter points together
-        plot.plot(("t", "b"), type="line", color=LIGHT_RED)        # Using RGBA color tuple to get a lighter color
-        plot.plot(("t", "s"), type="line", color=LIGHT_GREEN)
+        plot.plot(("tb", "b"), type="line", color=LIGHT_RED)        # Using RGBA color tuple to get a lighter color
+        plot.plot(("ts", "s"), type="line", color=LIGHT_GREEN)
 
         # Line plot of moving average of prices (thicker to indicate this fact)
-        plot.plot(("t", "wb"), type="line", color=RED, line_width=2)
-        plot.plot(("t", "ws"), type="line", color=GREEN, line_width=2)
+        plot.plot(("twb", "wb"), type="line", color=RED, line_width=2)
+        plot.plot(("tws", "ws"), type="line", color=GREEN, line_width=2)
 
         buy_renderer.marker_size = 3
         buy_renderer.marker = "circle"
@@ -95,6 +95,12 @@ class PricePlot(HasTraits):
 
         plot.title = "Current Price - Buy: ${} - Sell: ${}".format(buy[-1], sell[-1])       # Display current price in title
 
+        # Calculate range of plot so it shows latest 1 day of data
+        end = self.t[-1]
+        start = end - 86400
+
+        self._configure_plot(plot, start, end)
+
 
     def _configure_plot(self, plot, start, end):
         """
@@ -125,7 +131,7 @@ class PricePlot(HasTraits):
 
         plot.index_mapper.range.set_bounds(start, end)         # Set range of index (x values i.e. domain)
 
-        plot.index_mapper.range.on_trait_change(self._xrange_changed, name='_low_value')        # We attach a listener on the range that is called when the _low_value attribute is changed
+        plot.index_mapper.range.on_trait_change(self._xrange_changed, name=['_low_value', '_high_value'])        # We attach a listener on the range that is called when either bound is changed (pan or zoom)
         self._xrange_changed()      # We call this initially to fit the y-range initially
 
 
@@ -134,32 +140,59 @@ class PricePlot(HasTraits):
         Calculates the min and max values of the arrays b and s in the x-range currently chosen
         """
 
-        (a, b) = self.plot.index_mapper.range.bound_data(self.t)        # We find the indices that bound the data self.t in the currently chosen x_range
+        x_range = self.plot.index_mapper.range
 
-        min = 1e6       # Start with a maximum possible value from which to go down
-        max = 0
+        a, b = self._bounds(x_range.low, x_range.high)         # The indices that bound the data self.t in the currently chosen x_range
 
-        for jj in range(a, b):      # We iterate over the indices of the bounds finding the min and max values of self.b and self.s in the range
+        if a == b:          # There is no data in the x-range so we fit all of it
 
-            if self.b[jj] < min:
-                min = self.b[jj]
+            a, b = 0, len(self.t)
 
-            if self.s[jj] < min:
-                min = self.s[jj]
+        return min(self.b[a:b].min(), self.s[a:b].min()), max(self.b[a:b].max(), self.s[a:b].max())
 
-            if self.b[jj] > max:
-                max = self.b[jj]
 
-            if self.s[jj] > max:
-                max = self.b[jj]
+    def _bounds(self, low, high):
+        """
+        Returns the indices (a, b) such that self.t[a:b] are the times in the range [low, high].
+        """
+
+        return numpy.searchsorted(self.t, low), numpy.searchsorted(self.t, high, side='right')
 
-        return min, max
+
+    def _update_data(self, low, high):
+        """
+        Hand the plot the data in the x-range (plus one width of the range on either side so that panning does not reveal
+        an empty plot before the data is updated) decimated to about one min/max pair per pixel.
+        """
+
+        margin = high - low
+        a, b = self._bounds(low - margin, high + margin)
+
+        pixels = int(self.plot.width) if self.plot is not None and self.plot.width > 1 else PIXELS
+
+        visible = self._bounds(low, high)
+        visible = max(visible[1] - visible[0], 1)
+
+        buckets = max(pixels * (b - a) // visible, 1)          # The margins are decimated at the same density as the visible range
+
+        for name, series in (('b', self.b), ('s', self.s), ('wb', self.wb), ('ws', self.ws)):
+
+            indices = decimate(series, a, b, buckets)
+
+            self.plot_data.set_data('t' + name, self.t[indices])
+            self.plot_data.set_data(name, series[indices])
 
 
     def _xrange_changed(self):
         """
-        Method called when the xrange is changed so that the yrange can be changed to better fit the y-values
+        Method called when the xrange is changed so that the data can be re-decimated and the yrange changed to better
+        fit the y-values
         """
+
+        x_range = self.plot.index_mapper.range
+
+        self._update_data(x_range.low, x_range.high)
+
         # Calculate the highest and lowest value of the graphs in the specified x-range.
         (y_min, y_max) = self._y_bounds()
         delta = 0.1 * (y_max - y_min)       # We calculate margins on the bound using 10% of the data-spread
@@ -175,53 +208,41 @@ class PricePlot(HasTraits):
 
 
 
-def weighted_running_average(series, N, weighing_function = None):
+def decimate(series, a, b, buckets):
     """
-    Calculates the Weighted Running Average of a sequence over the last N values using the specified weighing_funciton.
+    Returns the (sorted) indices of the points of series[a:b] to plot: all of them if there are no more than two per
+    bucket, otherwise the min and the max of each of the 'buckets' consecutive runs of points (in the order they occur)
+    so that the outline of the plot is unchanged.
     """
 
-    if not weighing_function:       # No weighing function provided so we specify the default one
-
-        weighing_function = lambda x: 1       # Standard mean over N values. NOTE: If you set N = 1 you get the exact value back
+    n = b - a
 
-    weighted_series = []
+    if n <= 2 * buckets:
 
-    for ii in range(len(series)):
+        return numpy.arange(a, b)
 
-        sum = 0
-        denom = 0
+    size = -(-n // buckets)         # Number of points per bucket (rounded up)
+    pad = (-n) % size
 
-        for jj in range(N):
+    values = series[a:b]
 
-            if (ii - jj) < 0:
+    if pad: values = numpy.concatenate((values, numpy.repeat(values[-1], pad)))        # Pad the last bucket with its last value
 
-                break
+    values = values.reshape(-1, size)
+    offsets = a + numpy.arange(len(values)) * size
 
-            sum += series[ii - jj] * weighing_function(jj)       # Multiply value by weight calculated accordingly to distance from main value
-            denom += weighing_function(jj)
+    lows = offsets + values.argmin(axis=1)
+    highs = offsets + values.argmax(axis=1)
 
-        weighted_series.append(sum / float(denom))     # Append the calculated weighted sum to the output series
+    indices = numpy.column_stack((numpy.minimum(lows, highs), numpy.maximum(lows, highs))).ravel()
 
-    return weighted_series
+    return numpy.minimum(indices, b - 1)          # The padding points map back to the last point
 
 
 
 if __name__ == '__main__':
 
-    # Define the weighted sum sampling window to be 1 hours: i.e. the number of 5 min intervals in 1 hours
-    N = 1 * 12
-
-    # Exponential weighing factor:          (The larger the factor the more effect old values have on the average)
-    # FACTOR = 1.0 / 1e3
-
-    # Define the weighing function used to calculate the average
-    weighing_function = lambda x: (N - x)           # We use a linear weighing function. x = 0 is the end-value
-                                                    # and as x increases we are looking at successively older values
-
-
-    times = []
-    buy = []
-    sell = []
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 2
 
     filepath = os.path.join(os.path.dirname(__file__), 'data.db')       # Get absolute path to the database by using the fact that it is in the same folder as this script
 
@@ -229,18 +250,13 @@ if __name__ == '__main__':
     cursor = conn.cursor()
 
     now = int(time.time())      # Current epoch time
-    threshold = now - (86400 * 2)       # Epoch time exactly two days ago.
+    threshold = now - int(86400 * days)
 
-    for values in cursor.execute('''SELECT "time", "buy", "sell" FROM "prices" WHERE "time" > ?''', (threshold,)):
-
-        times.append(values[0])
-        buy.append(values[1])
-        sell.append(values[2])
+    # The weighted averages are stored with the prices (calculated by the tick writer). A missing one is plotted as the price.
+    rows = cursor.execute('''SELECT "time", "buy", "sell", COALESCE("wa_buy", "buy"), COALESCE("wa_sell", "sell") FROM "prices" WHERE "time" > ? ORDER BY "time"''', (threshold,)).fetchall()
 
     conn.close()
 
-    weighted_buy = weighted_running_average(buy, N, weighing_function)
-    weighted_sell = weighted_running_average(sell, N, weighing_function)
-
+    times, buy, sell, weighted_buy, weighted_sell = zip(*rows)
 
     PricePlot(times, buy, sell, weighted_buy, weighted_sell).configure_traits()
@@ -0,0 +1,149 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-05
+#
+# Generates a synthetic database with the schema of data.db for benchmarking.
+#
+# The prices are a random walk sampled every minute. The finite differences are exact but, to keep the generation of
+# the larger databases fast, the weighted and moving averages are simply set to the price (bitcoin.utilities.backfill
+# can be run on the result to calculate them properly). A trade (alternately a buy and a sell) is recorded roughly every
+# TRADE_INTERVAL samples.
+#
+# Usage (from the root of the project):  python -m benchmarks.generate PATH ROWS [SEED]
+
+
+import os
+import random
+import sys
+
+from bitcoin import aggregates, extrema, rollups, round2, schema
+
+
+START = 1388534400          # 2014-01-01 00:00:00 UTC
+INTERVAL = 60               # Seconds between samples
+SPREAD = 1.5                # Difference between the buy and the sell price
+TRADE_INTERVAL = 2000       # Average number of samples between trades
+CHUNK_SIZE = 100000         # Number of rows written per executemany
+
+
+def walk(rows, seed=0):
+    """
+    Generate the tuples (time, buy, sell) of a random walk of prices.
+    """
+
+    rng = random.Random(seed)
+    price = 450.0
+
+    for ii in range(rows):
+
+        price = max(price + rng.gauss(0, 0.5), 10.0)
+
+        buy = round2(price + SPREAD / 2)
+        yield START + ii * INTERVAL, buy, round2(buy - SPREAD)
+
+
+def generate(path, rows, seed=0):
+    """
+    Create a database with the specified number of price samples at path (which is overwritten).
+    """
+
+    if os.path.exists(path):
+
+        os.remove(path)
+
+    conn = schema.connect(path)         # Creates the tables and indexes
+
+    conn.execute('''PRAGMA synchronous = OFF''')        # The database is disposable so we trade safety for speed
+
+    cursor = conn.cursor()
+    rng = random.Random(seed + 1)
+
+    prices = []
+    diffs = []
+    averages = []
+    transactions = []
+
+    last = []           # The previous two samples (needed for the finite differences)
+    buying = True
+
+    for t, buy, sell in walk(rows, seed):
+
+        prices.append((t, buy, sell, buy, sell))
+        averages.append((t, buy, buy, 0.0, sell, sell, 0.0))
+
+        if len(last) == 2:
+
+            (_, b2, s2), (_, b1, s1) = last
+            diffs.append((t, round2(buy - b1), round2(sell - s1), round2((buy - b1) - (b1 - b2)), round2((sell - s1) - (s1 - s2))))
+
+        last = [last[-1], (t, buy, sell)] if last else [(t, buy, sell)]
+
+        if rng.random() < 1.0 / TRADE_INTERVAL:
+
+            btc = round(rng.uniform(0.5, 3.0), 8)
+
+            if buying:
+
+                transactions.append((t, -round2(btc * buy), btc, buy))
+
+            else:
+
+                transactions.append((t, round2(btc * sell), -btc, sell))
+
+            buying = not buying
+
+        if len(prices) == CHUNK_SIZE:
+
+            _write(cursor, prices, diffs, averages, transactions)
+
+    _write(cursor, prices, diffs, averages, transactions)
+
+    if not cursor.execute('''SELECT COUNT(*) FROM "transactions" WHERE "usd" < 0''').fetchone()[0]:         # The OODA loop needs at least one buy and one sell
+
+        cursor.execute('''INSERT INTO "transactions" VALUES (?, ?, ?, ?)''', (START - 2, -450.0, 1.0, 450.0))
+
+    if not cursor.execute('''SELECT COUNT(*) FROM "transactions" WHERE "usd" > 0''').fetchone()[0]:
+
+        cursor.execute('''INSERT INTO "transactions" VALUES (?, ?, ?, ?)''', (START - 1, 448.5, -1.0, 448.5))
+
+    aggregates.sync(cursor, *aggregates.last_trade_times(cursor))           # As the tick writer and OODA loop would have kept them
+    rollups.rebuild(cursor)
+    extrema.rebuild(cursor)
+
+    conn.commit()
+    conn.close()
+
+
+def _write(cursor, prices, diffs, averages, transactions):
+    """
+    Write the buffered rows and empty the buffers.
+    """
+
+    cursor.executemany('''INSERT INTO "prices" VALUES (?, ?, ?, ?, ?)''', prices)
+    cursor.executemany('''INSERT INTO "diffs" VALUES (?, ?, ?, ?, ?)''', diffs)
+    cursor.executemany('''INSERT INTO "averages" VALUES (?, ?, ?, ?, ?, ?, ?)''', averages)
+    cursor.executemany('''INSERT INTO "transactions" VALUES (?, ?, ?, ?)''', transactions)
+
+    for rows in (prices, diffs, averages, transactions):
+
+        del rows[:]
+
+
+
+if __name__ == '__main__':
+
+    generate(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 0)
@@ -0,0 +1,327 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-05
+#
+# Benchmark suite measuring how the main code paths scale with the size of the database. For every size a synthetic
+# database is generated (see benchmarks.generate, re-used between runs) and the following are timed:
+#
+#       tick_insert         - priming a TickWriter and inserting one sample (fetch.py --insert without the HTTP call)
+#       data                - constructing models.Data
+#       ooda_cycle          - a full cycle of ooda.py (every decision active)
+#       moving_average      - the LMA of the whole buy price history (and with the numpy backend if it is installed)
+#       backfill            - recalculating every derived value (the former migrate_2/4/5 scripts)
+#       extract_buy         - running bitcoin/utilities/extract_buy.py
+#
+# The BitStamp API and redis are replaced by the in-memory stand-ins of bitcoin.simulation. The results (min and
+# median of the repeats, in seconds) are written as JSON together with the commit and python version so that runs of
+# different versions can be compared.
+#
+# Usage (from the root of the project):
+#
+#       python -m benchmarks.suite [--sizes 10000,1000000,10000000] [--dir DIR] [--repeat N] [--output FILE] [--only NAME,...]
+
+
+import argparse
+import json
+import os
+import platform
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import bitcoin
+from bitcoin import redis_client, schema
+from bitcoin.settings import LMA_SAMPLES
+from bitcoin.simulation import FakeRedis, SimulatedExchange, install
+from bitcoin.tick import TickWriter
+from bitcoin.utilities import backfill
+from bitcoin.utilities.moving_averages import moving_average
+
+from benchmarks.generate import generate, INTERVAL
+
+
+SIZES = [10000, 1000000, 10000000]
+
+
+def measure(function, repeat):
+    """
+    Call the function 'repeat' times and return a dictionary with the min and median time taken (in seconds).
+    """
+
+    times = []
+
+    for _ in range(repeat):
+
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+
+    times.sort()
+
+    return {'min': round(times[0], 6), 'median': round(times[len(times) // 2], 6)}
+
+
+def latest(path):
+    """
+    Returns the latest (time, buy, sell) sample in the database.
+    """
+
+    conn = schema.connect(path)
+    values = conn.execute('''SELECT "time", "buy", "sell" FROM "prices" ORDER BY "time" DESC LIMIT 1''').fetchone()
+    conn.close()
+
+    return values
+
+
+def simulated(path):
+    """
+    Returns an (exchange, redis) pair of stand-ins with the prices of the latest sample and the default configuration
+    with every decision active.
+    """
+
+    t, buy, sell = latest(path)
+
+    exchange = SimulatedExchange(usd=1000.0, btc=1.0)
+    exchange.tick(t, buy, sell)
+
+    rds = FakeRedis()
+
+    with install(exchange, rds):
+
+        redis_client.load()
+
+        for key in rds.keys():
+
+            if key.startswith('active_'): rds.set(key, True)
+
+    return exchange, rds
+
+
+def bench_tick_insert(path):
+
+    def run():
+
+        t = latest(path)[0] + INTERVAL
+
+        writer = TickWriter(schema.connect(path))
+        writer.insert(t, 450.0, 448.5)
+        writer.close()
+
+    return run
+
+
+def bench_data(path):
+
+    from bitcoin.models import Data
+
+    return Data
+
+
+def bench_ooda_cycle(path):
+
+    import ooda
+
+    decisions = ooda.initiate_decisions()
+
+    return lambda: ooda.evaluate(decisions)
+
+
+def _buy_prices(path):
+
+    conn = schema.connect(path)
+    series = [values[0] for values in conn.execute('''SELECT "buy" FROM "prices" ORDER BY "time"''')]
+    conn.close()
+
+    return series
+
+
+def bench_moving_average(path):
+
+    return lambda: moving_average(_buy_prices(path), LMA_SAMPLES)
+
+
+def bench_moving_average_numpy(path):
+
+    try:
+        import numpy
+
+    except ImportError:
+
+        return None
+
+    return lambda: moving_average(_buy_prices(path), LMA_SAMPLES, backend='numpy')
+
+
+def bench_backfill(path):
+
+    def run():
+
+        conn = schema.connect(path)
+        backfill.backfill(conn, restart=True, log=False)
+        conn.close()
+
+    return run
+
+
+def bench_extract_buy(path):
+
+    script = os.path.join(os.path.dirname(os.path.abspath(bitcoin.__file__)), 'utilities', 'extract_buy.py')      # Resolved before the chdir
+
+    def run():
+
+        cwd = os.getcwd()
+        os.chdir(os.path.dirname(path))         # The script writes buy.txt in the current directory
+
+        try:
+            runpy.run_path(script, run_name='__main__')
+
+        finally:
+
+            os.chdir(cwd)
+
+    return run
+
+
+BENCHMARKS = [
+    ('tick_insert', bench_tick_insert),
+    ('data', bench_data),
+    ('ooda_cycle', bench_ooda_cycle),
+    ('moving_average', bench_moving_average),
+    ('moving_average_numpy', bench_moving_average_numpy),
+    ('backfill', bench_backfill),
+    ('extract_buy', bench_extract_buy),
+]
+
+
+def run(path, repeat, only=None):
+    """
+    Run the benchmarks against the database at path and return a dictionary mapping each name to its timings. A
+    benchmark that fails is recorded with its error (instead of timings) and the rest are still run.
+    """
+
+    results = {}
+    get_db = bitcoin.get_db
+
+    bitcoin.get_db = lambda: path           # Scripts and models that connect to the default database use this one
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')          # Silence the output of the decisions and scripts
+
+    try:
+        for name, factory in BENCHMARKS:
+
+            if only and name not in only:
+
+                continue
+
+            exchange, rds = simulated(path)
+
+            try:
+                with install(exchange, rds):
+
+                    function = factory(path)
+
+                    if function is not None:
+
+                        results[name] = measure(function, repeat)
+
+            except Exception as e:
+
+                sys.stderr.write("WARNING: Benchmark {} failed: {!r}\n".format(name, e))
+                results[name] = {'error': repr(e)}
+
+    finally:
+
+        sys.stdout.close()
+        sys.stdout = stdout
+
+        bitcoin.get_db = get_db
+
+    return results
+
+
+def metadata():
+    """
+    Returns a dictionary describing the version of the code and the environment the benchmarks were run in.
+    """
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=open(os.devnull, 'w')).strip()
+
+    except (OSError, subprocess.CalledProcessError):
+
+        commit = None
+
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(), 'time': int(time.time())}
+
+
+def write(report, path):
+    """
+    Write the report as JSON to the file at path.
+    """
+
+    with open(path, 'w') as fout:
+
+        json.dump(report, fout, indent=4, sort_keys=True)
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark the code against synthetic databases.")
+
+    parser.add_argument('--sizes', default=",".join(str(size) for size in SIZES))
+    parser.add_argument('--dir', help="Directory in which the generated databases are kept (default: a temporary one)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmarks.json')
+    parser.add_argument('--only', help="Comma separated names of the benchmarks to run")
+
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp()
+    only = set(args.only.split(',')) if args.only else None
+
+    report = {'meta': metadata(), 'results': {}}
+
+    try:
+        for size in [int(size) for size in args.sizes.split(',')]:
+
+            path = os.path.join(directory, 'data-{}.db'.format(size))
+            pristine = path + '.orig'
+
+            if not os.path.exists(pristine):
+
+                sys.stderr.write("Generating database with {} rows ...\n".format(size))
+                generate(pristine, size)
+
+            shutil.copy(pristine, path)             # The benchmarks write to the database so every size starts from the same state
+
+            sys.stderr.write("Benchmarking {} rows ...\n".format(size))
+            report['results'][str(size)] = run(path, args.repeat, only)
+
+            write(report, args.output)          # After every size so that an interrupted run keeps the results so far
+
+    finally:
+
+        if not args.dir:
+
+            shutil.rmtree(directory)
+
+    print(json.dumps(report['results'], indent=4, sort_keys=True))
@@ -0,0 +1,75 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-25
+#
+# Micro-benchmark comparing the fixed-format (and memoized) unix_timestamp with the dateutil based conversion.
+#
+# Usage (from the root of the project):  python -m benchmarks.unix_timestamp
+
+
+import random
+import timeit
+
+from bitcoin.utilities import _cache, CACHE_SIZE, dateutil_timestamp, fixed_format_timestamp, unix_timestamp
+
+
+NUMBER = 10000          # Number of conversions timed for each function
+
+
+def timestrings(count):
+    """
+    Generate a list of random BitStamp style timestrings.
+    """
+
+    return ['2014-%02d-%02d %02d:%02d:%02d' % (random.randint(1, 12), random.randint(1, 28), random.randint(0, 23), random.randint(0, 59), random.randint(0, 59)) for _ in range(count)]
+
+
+def measure(function, strings):
+    """
+    Returns the average time (in microseconds) taken by the function to convert one of the strings.
+    """
+
+    seconds = min(timeit.repeat(lambda: [function(s) for s in strings], number=1, repeat=3))
+
+    return seconds / len(strings) * 1e6
+
+
+if __name__ == '__main__':
+
+    strings = timestrings(NUMBER)
+
+    for s in strings[:100]:         # Sanity check that the functions agree
+
+        assert unix_timestamp(s) == dateutil_timestamp(s)
+
+    results = [('dateutil (original)', measure(dateutil_timestamp, strings)), ('fixed format', measure(fixed_format_timestamp, strings))]
+
+    _cache.clear()
+    results.append(('unix_timestamp (cold cache)', measure(lambda s: unix_timestamp(s) if _cache.clear() is None else None, strings)))
+
+    recent = strings[:CACHE_SIZE // 2]          # The repeated syncs of the same (recent) transactions hit the cache
+    for s in recent: unix_timestamp(s)
+    results.append(('unix_timestamp (warm cache)', measure(unix_timestamp, recent)))
+
+    baseline = results[0][1]
+
+    for name, us in results:
+
+        print("{:<30} {:8.2f} us/call   x{:.1f}".format(name, us, baseline / us))
@@ -4,7 +4,6 @@
 # Module containing methods that are required by a number of other scripts/modules.
 
 import datetime
-import rpy2.robjects as robjects
 import math
 import os
 import time
@@ -30,10 +29,14 @@ def chop_btc(btc):
 
 def max_price(prices):
     """
-    Function that uses R to find the maximum price from a list of float prices.
+    Function for finding the maximum price from a list of float prices.
     """
 
-    return robjects.r['max'](prices)[0]        # We use the R object to access the 'max' function, pass in the list of prices and then get the 1st element to get the result
+    if hasattr(prices, 'maximum'):          # A PriceSeries already keeps track of its maximum value
+
+        return prices.maximum
+
+    return max(prices)
 
 
 def format_time(t):
@@ -19,104 +19,34 @@
 # Implements various actions that are called both internally and externally. They are placed here to avoid circular imports since they call on methods from all over the place and in turn are called from all over.
 
 
-import time
+import bitcoin.execution as execution
 
-import bitcoin
-import bitcoin.client as client
-import bitcoin.settings as settings
 
-PRICE_DELTA = 0.1       # Amount in dollars by which the buy and sell price are offset to favor a quick acquire or purge
-
-
-def purge():
+def purge(hook=None):
     """
-    Method for selling all BTC as quickly as possible.
+    Method for starting the sale of all BTC as quickly as possible. The sale is carried out by bitcoin.execution one step
+    per price sample so this returns immediately. The optional hook (dotted path of a function) is called when the
+    purge ends. Returns False if another purge or acquire is already in progress.
     """
 
-    print("Beginning purge")
-
-    flag = True
-    prev_sell_price = 1e9           # A very large number so that the condition is triggered the first time.
-
-    while flag:
-
-        btc = float(client.balance()['btc_balance'])      # No. of BTC still in account
-
-        if btc > 0:
-
-            print("Remaining BTC: {}".format(btc))
-            print("Previous sell price: {}".format(prev_sell_price))
-
-            sell_price = float(client.current_price()['sell'])
-            print("Current sell price: {}".format(sell_price))
-
-            if sell_price < prev_sell_price:            # The sell price has fallen and so the previous sell price will NOT trigger an actual sale (because of the way limit orders work) so we create a new order
-
-                client.cancel_all_orders()
-
-                client.sell_order(btc, sell_price - PRICE_DELTA)      # Offer to sell at a slightly lower price than the current sell price (to sweeten the deal)
-                prev_sell_price = sell_price        # Update prev_sell_price for later comparison
-
-            elif sell_price > settings.SELL_PRICE_RISE_FACTOR * prev_sell_price:
-
-                print("Sell price has increased to a factor of {}. Cancelling purge".format(settings.SELL_PRICE_RISE_FACTOR))
-                client.cancel_all_orders()
-                return
-
-            # NOTE: If the sell_price doesn't fall by more than DROP_FACTOR or rise by more than RISE_FACTOR we keep the same sell order active.
-
-            time.sleep(settings.TRANSACTION_INTERVAL)           # Wait for specified interval to allow sale to occur before continuing
+    if execution.start('purge', hook):
 
-        else:
+        print("Beginning purge")
+        return True
 
-            import bitcoin.decisions.rising_peak as rising_peak     # We import here to avoid a circular import
+    print("Execution already in progress. Purge not started.")
+    return False
 
-            flag = False        # Break while loop
-            rising_peak.delete()        # Clear Redis information about band since the BTC has been purged
 
-            print("All BTC sold. Purge ends.\n")
-
-
-def acquire():
+def acquire(hook=None):
     """
-    Method for acquiring all BTC as quickly as possible.
+    Method for starting the acquisition of BTC with all USD as quickly as possible (see purge).
     """
 
-    print("Beginning acquire")
-    prev_buy_price = 0                  # A very small number so that the condition is triggered the first time.
-
-    flag = True
-
-    while flag:
-
-        bal = client.balance()
-        usd = float(bal['usd_balance'])      # Amount of USD still in account
-        fee = float(bal['fee'])              # %age of cost taken as transaction fee
-        amount = bitcoin.adjusted_usd_amount(usd, fee)     # Amount of USD that can be used to buy BTC once the fee has been subtracted
-
-        if usd > 1:      # BitStamp requires at least a $1 order (some small amount might be left once fees are calculated)
-
-            print("Remaining USD: {}".format(usd))
-            print("Previous buy price: {}".format(prev_buy_price))
-
-            buy_price = float(client.current_price()['buy']) + PRICE_DELTA          # Offer to buy at slightly above the current buy price (to sweeten the deal)
-            btc = bitcoin.chop_btc(amount / buy_price)              # Calculate the correctly floored (rounded) amount of btc that can be bought at the current buy price
-
-            print("Current buy price: {}".format(buy_price))
-            print("Fee %age: {}".format(fee))
-            print("Buying BTC: {}".format(btc))
-
-
-            if buy_price != prev_buy_price:       # If the buy price has changed we update the buy_order to ensure a quick acquire.
-
-                client.cancel_all_orders()
-
-                client.buy_order(btc, buy_price)
-                prev_buy_price = buy_price
-
-            time.sleep(settings.TRANSACTION_INTERVAL)           # Wait for 5 seconds before continuing
+    if execution.start('acquire', hook):
 
-        else:
+        print("Beginning acquire")
+        return True
 
-            flag = False        # Break while loop
-            print("All USD spent. Acquire ends.\n")
+    print("Execution already in progress. Acquire not started.")
+    return False
@@ -0,0 +1,122 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-26
+#
+# Implements running aggregates (max, min and count) of the prices since the last trade, stored in the "aggregates"
+# table of the database:
+#
+#       buy         - buy prices since the last time BTC was sold
+#       sell        - sell prices since the last time BTC was bought
+#       wa_sell     - weighted sell prices since the last time BTC was bought
+#
+# The aggregates are updated incrementally by the tick writer whenever a price is inserted and reset when a new trade is
+# recorded, so that the OODA loop can get them in O(1) instead of scanning the price history since the last trade.
+
+
+from bitcoin import extrema
+
+
+# Map the name of each aggregate (a column of bitcoin.extrema) to the type of trade that resets it
+AGGREGATES = {
+    'buy': 'sell',
+    'sell': 'buy',
+    'wa_sell': 'buy',
+}
+
+
+class Aggregate(object):
+    """
+    The max, min and count of a price since the specified time.
+    """
+
+    __slots__ = ('since', 'maximum', 'minimum', 'count')
+
+    def __init__(self, since, maximum, minimum, count):
+
+        self.since = since
+        self.maximum = maximum
+        self.minimum = minimum
+        self.count = count
+
+
+    def __str__(self):
+
+        return "max: {} - min: {} - count: {}".format(self.maximum, self.minimum, self.count)
+
+
+
+def update(cursor, time, buy, sell, wa_sell):
+    """
+    Update the aggregates with the prices of a newly inserted tick.
+    """
+
+    values = {'buy': buy, 'sell': sell, 'wa_sell': wa_sell}
+
+    cursor.executemany('''UPDATE "aggregates" SET "max" = MAX(COALESCE("max", ?), ?), "min" = MIN(COALESCE("min", ?), ?), "count" = "count" + 1 WHERE "name" = ? AND "since" < ?''',
+                       [(v, v, v, v, name, time) for name, v in values.items()])
+
+
+def reset(cursor, name, since):
+    """
+    Re-calculate the aggregate from the prices after the specified time (the time of the last trade).
+    """
+
+    if since is not None:
+
+        maximum, minimum, count = extrema.summary(cursor, name, since + 1, 2 ** 62)         # From the block summaries in O(log n)
+
+    else:
+
+        maximum, minimum, count = None, None, 0
+
+    cursor.execute('''REPLACE INTO "aggregates" ("name", "since", "max", "min", "count") VALUES (?, ?, ?, ?, ?)''', (name, since, maximum, minimum, count))
+
+
+def sync(cursor, last_sell_time, last_buy_time):
+    """
+    Ensure that the aggregates are based on the specified times of the last trades. Any aggregate that is missing or
+    based on an older trade is reset.
+    """
+
+    current = dict(cursor.execute('''SELECT "name", "since" FROM "aggregates"''').fetchall())
+
+    for name, trade in AGGREGATES.items():
+
+        since = last_sell_time if trade == 'sell' else last_buy_time
+
+        if current.get(name) != since:
+
+            reset(cursor, name, since)
+
+
+def fetch(cursor):
+    """
+    Returns a dictionary mapping the name of each aggregate to an Aggregate object.
+    """
+
+    return dict((values[0], Aggregate(*values[1:])) for values in cursor.execute('''SELECT "name", "since", "max", "min", "count" FROM "aggregates"'''))
+
+
+def last_trade_times(cursor):
+    """
+    Returns the times (last_sell_time, last_buy_time) of the latest trades recorded in the "transactions" table.
+    """
+
+    last_sell_time = cursor.execute('''SELECT MAX("time") FROM "transactions" WHERE "usd" > 0''').fetchone()[0]
+    last_buy_time = cursor.execute('''SELECT MAX("time") FROM "transactions" WHERE "usd" < 0''').fetchone()[0]
+
+    return last_sell_time, last_buy_time
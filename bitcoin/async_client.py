@@ -0,0 +1,120 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-23
+#
+# Implements a concurrent variant of bitcoin.client. Each function starts the corresponding client call in the
+# background and immediately returns a Future. Futures can be gathered so that a set of calls costs the latency of the
+# slowest one rather than the sum of all of them.
+#
+# Example:
+#
+#       price, bal, orders = gather( current_price(), balance(), open_orders() )
+#
+# The calls share the keep-alive connection pool of the client and are pointed at a local stand-in server by setting
+# the BITSTAMP_API_URL environment variable.
+
+
+import sys
+import threading
+
+import bitcoin.client as client
+
+
+class Future(object):
+    """
+    The eventual result of a function call running in a background thread.
+    """
+
+    def __init__(self, function, *args, **kwargs):
+
+        self._result = None
+        self._exception = None
+
+        self._thread = threading.Thread(target=self._run, args=(function, args, kwargs))
+        self._thread.daemon = True          # A hung request must not keep the process alive
+        self._thread.start()
+
+
+    def _run(self, function, args, kwargs):
+
+        try:
+            self._result = function(*args, **kwargs)
+
+        except BaseException:           # Includes the SystemExit of client.request (which would end the thread silently)
+
+            self._exception = sys.exc_info()[1]
+
+
+    def done(self):
+        """
+        Returns True if the call has completed.
+        """
+
+        return not self._thread.is_alive()
+
+
+    def result(self, timeout=None):
+        """
+        Wait for the call to complete and return its result (or raise the exception it raised).
+        """
+
+        self._thread.join(timeout)
+
+        if self._thread.is_alive():
+
+            raise client.ClientException("Timed out waiting for result")
+
+        if self._exception is not None:
+
+            raise self._exception
+
+        return self._result
+
+
+
+def spawn(function, *args, **kwargs):
+    """
+    Run any function in the background and return a Future for its result.
+    """
+
+    return Future(function, *args, **kwargs)
+
+
+def gather(*futures):
+    """
+    Wait for all of the futures and return a list of their results (in the same order).
+    """
+
+    return [future.result() for future in futures]
+
+
+
+# Concurrent variants of the client functions:
+
+def current_price():  return spawn(client.current_price)
+
+def balance(fresh=False):  return spawn(client.balance, fresh)
+
+def transactions(offset=0, limit=100, sort='desc'):  return spawn(client.transactions, offset, limit, sort)
+
+def open_orders():  return spawn(client.open_orders)
+
+def cancel_order(id):  return spawn(client.cancel_order, id)
+
+def buy_order(amount, price):  return spawn(client.buy_order, amount, price)
+
+def sell_order(amount, price):  return spawn(client.sell_order, amount, price)
@@ -0,0 +1,364 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-03
+#
+# Implements a backtester that replays the recorded prices through the real decisions (in the same order as ooda.py)
+# and the purge/acquire execution, against a simulated exchange and an in-memory redis (see bitcoin.simulation).
+#
+# Each recorded price is treated as one OODA cycle: the open orders are filled against the price, then either the
+# execution in progress is advanced or the decisions are evaluated on a Data-like snapshot that is maintained in memory
+# (balances, last trades and the aggregates of the prices since them) instead of being read from the database and API.
+#
+# Usage:
+#
+#       python -m bitcoin.backtest [options]
+#
+#       --from TIME / --to TIME     - Unix time range of the prices to replay (default: all)
+#       --usd USD / --btc BTC       - Starting balances (default: $1000 and no BTC)
+#       --fee PERCENT               - Fee charged per trade (default: 0.5)
+#       --set KEY=VALUE             - Override a configuration value (default: the values of redis_client.load() with
+#                                     every decision active). May be repeated.
+#       --trades FILE               - Write the trade log as csv (default: trades.csv)
+#       --equity FILE               - Write the equity curve as csv (default: equity.csv)
+#       --every N                   - Record the equity every N prices (default: 60)
+#       --verbose                   - Show the output of the decisions
+
+
+import argparse
+import csv
+import os
+import sys
+
+from bitcoin import schema
+from bitcoin.aggregates import Aggregate
+import bitcoin.config as config
+import bitcoin.decisions.absolute_zero as absolute_zero
+import bitcoin.decisions.falling_trench as falling_trench
+import bitcoin.decisions.minimize_loss as minimize_loss
+import bitcoin.decisions.minimum_profit as minimum_profit
+import bitcoin.decisions.rising_peak as rising_peak
+import bitcoin.execution as execution
+import bitcoin.redis_client as redis_client
+from bitcoin.simulation import FakeRedis, SimulatedExchange, install
+
+
+# The decisions in the order in which ooda.py carries them out
+DECISIONS = [absolute_zero, minimize_loss, minimum_profit, rising_peak, falling_trench]
+
+# The active flags turned on by default (the defaults of redis_client.load() turn them all off)
+ACTIVE_KEYS = [
+    redis_client.KEY_ACTIVE_ABSOLUTE_ZERO,
+    redis_client.KEY_ACTIVE_MINIMIZE_LOSS,
+    redis_client.KEY_ACTIVE_MINIMUM_PROFIT,
+    redis_client.KEY_ACTIVE_RISING_PEAK,
+    redis_client.KEY_ACTIVE_FALLING_TRENCH,
+]
+
+
+class SimulatedData(object):
+    """
+    Holds the same attributes as models.Data that the decisions use.
+    """
+
+    __slots__ = ('time', 'buy', 'sell', 'avg_buy', 'avg_sell', 'usd_balance', 'btc_balance',
+                 'last_buy_time', 'last_buy_price', 'last_sell_time', 'last_sell_price',
+                 'buy_aggregate', 'sell_aggregate', 'weighted_sell_aggregate', 'config')
+
+
+
+class Backtest(object):
+    """
+    Replays prices through the decisions. 'settings' is a dictionary of configuration values (redis key to value) that
+    override the defaults.
+    """
+
+    def __init__(self, settings=None, usd=1000.0, btc=0.0, fee=0.5, every=60):
+
+        self.settings = settings or {}
+        self.every = every
+
+        self.rds = FakeRedis()
+        self.exchange = SimulatedExchange(usd, btc, fee)
+
+        self.equity = []            # Tuples (time, usd, btc, equity) recorded every 'every' prices
+        self.max_drawdown = 0.0     # Largest fall of the equity from a previous peak (as a fraction of the peak)
+
+        self._peak = None
+        self._seen = 0              # Number of trades of the exchange already accounted for
+
+        self.data = SimulatedData()
+
+
+    def configure(self):
+        """
+        Load the configuration in to the fake redis.
+        """
+
+        redis_client.load()
+
+        for key in ACTIVE_KEYS:
+
+            self.rds.set(key, True)
+
+        for key, value in self.settings.items():
+
+            self.rds.set(key, value)
+
+        redis_client.bump_version()
+
+
+    def run(self, rows, quiet=True):
+        """
+        Replay the rows (tuples of time, buy, sell, wa_buy, wa_sell in chronological order) and return the summary().
+        With quiet=True the output of the decisions is suppressed.
+        """
+
+        stdout = sys.stdout
+
+        if quiet: sys.stdout = open(os.devnull, 'w')
+
+        try:
+            with install(self.exchange, self.rds):
+
+                self.configure()
+                self._replay(rows)
+
+        finally:
+
+            if quiet:
+
+                sys.stdout.close()
+                sys.stdout = stdout
+
+        return self.summary()
+
+
+    def _replay(self, rows):
+
+        d = self.data
+        exchange = self.exchange
+        decisions = [module.decision for module in DECISIONS]
+
+        first = True
+        ii = 0
+
+        for t, buy, sell, wa_buy, wa_sell in rows:
+
+            if first:       # We start as if the last trades took place just before the first price
+
+                d.last_buy_time = d.last_sell_time = t - 1
+                d.last_buy_price = buy
+                d.last_sell_price = sell
+
+                d.buy_aggregate = Aggregate(t - 1, None, None, 0)
+                d.sell_aggregate = Aggregate(t - 1, None, None, 0)
+                d.weighted_sell_aggregate = Aggregate(t - 1, None, None, 0)
+
+                first = False
+
+            exchange.tick(t, buy, sell)
+            self._account()
+
+            _update(d.buy_aggregate, buy)
+            _update(d.sell_aggregate, sell)
+            _update(d.weighted_sell_aggregate, sell if wa_sell is None else wa_sell)
+
+            if execution.active():
+
+                execution.step(buy, sell)
+
+            else:
+
+                d.time = t
+                d.buy = buy
+                d.sell = sell
+                d.avg_buy = wa_buy
+                d.avg_sell = wa_sell
+                d.usd_balance = exchange.usd
+                d.btc_balance = exchange.btc
+                d.config = config.snapshot()
+
+                for decision in decisions:
+
+                    decision.execute(d)
+
+                    if decision.final():
+
+                        break
+
+                if execution.active():          # A decision has started a purge or acquire so we place its first order right away
+
+                    execution.step(buy, sell)
+
+            self._account()         # Orders placed during this cycle may have been filled straight away
+
+            equity = exchange.equity()
+
+            if self._peak is None or equity > self._peak:
+
+                self._peak = equity
+
+            elif self._peak > 0:
+
+                self.max_drawdown = max(self.max_drawdown, (self._peak - equity) / self._peak)
+
+            if ii % self.every == 0:
+
+                self.equity.append((t, exchange.usd, exchange.btc, round(equity, 2)))
+
+            ii += 1
+
+        if ii and (ii - 1) % self.every != 0:          # Always record the final equity
+
+            self.equity.append((t, exchange.usd, exchange.btc, round(equity, 2)))
+
+
+    def _account(self):
+        """
+        Update the last trades and reset the aggregates for the trades the exchange has carried out since the last call.
+        """
+
+        d = self.data
+        trades = self.exchange.trades
+
+        for trade in trades[self._seen:]:
+
+            t, kind, price = trade[0], trade[1], trade[3]
+
+            if kind == 'buy':
+
+                d.last_buy_time = t
+                d.last_buy_price = price
+
+                d.sell_aggregate = Aggregate(t, None, None, 0)      # The sell aggregates are since the last buy
+                d.weighted_sell_aggregate = Aggregate(t, None, None, 0)
+
+            else:
+
+                d.last_sell_time = t
+                d.last_sell_price = price
+
+                d.buy_aggregate = Aggregate(t, None, None, 0)
+
+        self._seen = len(trades)
+
+
+    def summary(self):
+        """
+        Returns a dictionary summarizing the result of the backtest.
+        """
+
+        start = self.equity[0][3] if self.equity else 0.0
+        end = self.equity[-1][3] if self.equity else 0.0
+
+        return {
+            'start_equity': start,
+            'final_equity': end,
+            'pnl': round(end - start, 2),
+            'max_drawdown': round(self.max_drawdown, 4),
+            'trades': len(self.exchange.trades),
+        }
+
+
+    def write_trades(self, path):
+        """
+        Write the trade log to a csv file.
+        """
+
+        with open(path, 'wb') as fout:
+
+            writer = csv.writer(fout)
+            writer.writerow(['time', 'type', 'amount', 'price', 'value', 'fee', 'usd_balance', 'btc_balance', 'order_id'])
+            writer.writerows(self.exchange.trades)
+
+
+    def write_equity(self, path):
+        """
+        Write the equity curve to a csv file.
+        """
+
+        with open(path, 'wb') as fout:
+
+            writer = csv.writer(fout)
+            writer.writerow(['time', 'usd_balance', 'btc_balance', 'equity'])
+            writer.writerows(self.equity)
+
+
+
+def _update(aggregate, value):
+    """
+    Add a price to an aggregate.
+    """
+
+    if aggregate.maximum is None or value > aggregate.maximum: aggregate.maximum = value
+    if aggregate.minimum is None or value < aggregate.minimum: aggregate.minimum = value
+
+    aggregate.count += 1
+
+
+def read_prices(cursor, start=None, end=None):
+    """
+    Returns an iterator over the rows (time, buy, sell, wa_buy, wa_sell) of the prices in the time range in
+    chronological order. The rows are streamed from the database.
+    """
+
+    return cursor.execute('''SELECT "time", "buy", "sell", "wa_buy", "wa_sell" FROM "prices" WHERE "time" >= ? AND "time" <= ? ORDER BY "time"''',
+                          (start if start is not None else 0, end if end is not None else 2 ** 62))
+
+
+def parse_settings(pairs):
+    """
+    Convert a list of "key=value" strings to a dictionary.
+    """
+
+    return dict(pair.split('=', 1) for pair in pairs)
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Replay the recorded prices through the decisions.")
+
+    parser.add_argument('--from', dest='start', type=int)
+    parser.add_argument('--to', dest='end', type=int)
+    parser.add_argument('--usd', type=float, default=1000.0)
+    parser.add_argument('--btc', type=float, default=0.0)
+    parser.add_argument('--fee', type=float, default=0.5)
+    parser.add_argument('--set', dest='settings', action='append', default=[])
+    parser.add_argument('--trades', default='trades.csv')
+    parser.add_argument('--equity', default='equity.csv')
+    parser.add_argument('--every', type=int, default=60)
+    parser.add_argument('--verbose', action='store_true')
+
+    args = parser.parse_args()
+
+    conn = schema.connect()
+
+    backtest = Backtest(parse_settings(args.settings), args.usd, args.btc, args.fee, args.every)
+    result = backtest.run(read_prices(conn.cursor(), args.start, args.end), quiet=not args.verbose)
+
+    conn.close()
+
+    backtest.write_trades(args.trades)
+    backtest.write_equity(args.equity)
+
+    for key in ('start_equity', 'final_equity', 'pnl', 'max_drawdown', 'trades'):
+
+        print("{}: {}".format(key, result[key]))
@@ -7,12 +7,27 @@ import hashlib
 import hmac
 import json
 import sys
+import threading
 import time
 import urllib
-import urllib2
 
 import bitcoin
 from bitcoin.secrets import api
+from bitcoin.settings import ACCOUNT_CACHE_TTL, API_URL, FEE_CACHE_TTL
+from bitcoin.tracing import traced
+from bitcoin.transport import pool
+
+
+# Cache of the account state. Maps a key to a tuple (expiry time, value).
+_cache = {}
+
+# The orders placed by this process that have not been cancelled. Maps the order id to a dictionary with the keys
+# 'id', 'type' ('buy' or 'sell'), 'amount' and 'price'.
+orders = {}
+
+# The last nonce used. Requests can be made concurrently (see bitcoin.async_client) so the nonce is generated under a lock.
+_nonce = [0]
+_nonce_lock = threading.Lock()
 
 
 def warning(msg):
@@ -29,7 +44,10 @@ def credentials():
 
     creds = {}
 
-    nonce = str(int(time.time() * 1e6))       # We use the Unix timestamp in microseconds converted to a string as the nonce.
+    with _nonce_lock:
+
+        _nonce[0] = max(int(time.time() * 1e6), _nonce[0] + 1)        # We use the Unix timestamp in microseconds as the nonce. It must be strictly increasing.
+        nonce = str(_nonce[0])
     key = api['key']
     message = nonce + api['client_id'] + key
 
@@ -42,28 +60,95 @@ def credentials():
     return creds
 
 
+def cached(key):
+    """
+    Returns the cached value of the key or None if it is absent or has expired.
+    """
+
+    entry = _cache.get(key)
+
+    if entry and entry[0] > time.time():
+
+        return entry[1]
+
+    return None
+
+
+def cache(key, value, ttl):
+    """
+    Store the value in the cache for ttl seconds.
+    """
+
+    _cache[key] = (time.time() + ttl, value)
+
+
+def invalidate():
+    """
+    Invalidate the cached account state (balance and open orders). Called after any order is placed or cancelled.
+
+    The fee is NOT invalidated since it does not change when an order is placed.
+    """
+
+    _cache.pop('balance', None)
+    _cache.pop('open_orders', None)
+
+
+@traced('client.current_price')
 def current_price():
     """
     Fetch the current buy and sell prices.
     """
 
-    url = "https://www.bitstamp.net/api/ticker/"
+    url = API_URL + "ticker/"
+
+    status, body = pool.get(url)
+
+    if status != 200:
 
-    response = json.load(urllib2.urlopen(url))
+        raise ClientException("HTTP Error {}: {}".format(status, url))
+
+    response = json.loads(body)
 
     data = {'buy': response["ask"], 'sell': response["bid"]}
 
     return data
 
 
-def balance():
+@traced('client.balance')
+def balance(fresh=False):
     """
     Fetch the BTC and USD balance in the account.
+
+    The balance is cached for ACCOUNT_CACHE_TTL seconds (or until an order is placed or cancelled). Pass fresh=True to
+    bypass the cache.
     """
 
-    url = "https://www.bitstamp.net/api/balance/"
+    bal = None if fresh else cached('balance')
+
+    if bal is None:
+
+        url = API_URL + "balance/"
+
+        bal = request(url)
+
+        cache('balance', bal, ACCOUNT_CACHE_TTL)
+        cache('fee', float(bal['fee']), FEE_CACHE_TTL)
+
+    return bal
+
+
+def fee():
+    """
+    Returns the fee %age as a Float. It is cached for much longer (FEE_CACHE_TTL) than the rest of the balance.
+    """
+
+    value = cached('fee')
+
+    if value is None:
 
-    return request(url)
+        value = float(balance(fresh=True)['fee'])
+
+    return value
 
 
 def btc():
@@ -80,34 +165,53 @@ def usd():
     return float(balance()['usd_balance'])
 
 
-def transactions():
+@traced('client.transactions')
+def transactions(offset=0, limit=100, sort='desc'):
     """
-    Fetch the User Transaction history.
+    Fetch the User Transaction history. By default the latest 100 transactions are returned (newest first). Use the
+    offset and limit to page through the history.
     """
 
-    url = "https://www.bitstamp.net/api/user_transactions/"
+    url = API_URL + "user_transactions/"
 
-    return request(url)
+    return request(url, {'offset': offset, 'limit': limit, 'sort': sort})
 
 
+@traced('client.open_orders')
 def open_orders():
     """
     Fetch all currently open orders.
     """
 
-    url = "https://www.bitstamp.net/api/open_orders/"
+    orders = cached('open_orders')
+
+    if orders is None:
+
+        url = API_URL + "open_orders/"
 
-    return request(url)
+        orders = request(url)
 
+        cache('open_orders', orders, ACCOUNT_CACHE_TTL)
 
+    return orders
+
+
+@traced('client.cancel_order')
 def cancel_order(id):
     """
     Cancel the order with the specified id.
     """
 
-    url = "https://www.bitstamp.net/api/cancel_order/"
+    url = API_URL + "cancel_order/"
+
+    try:
+        response = request(url, {'id': id}, retry=False)
+        orders.pop(id, None)            # Only once the order is known to be cancelled (it is still open if the request failed)
+
+        return response
 
-    return request(url, {'id': id})
+    finally:
+        invalidate()            # The account state changes (or may have changed if the request failed)
 
 
 def cancel_all_orders():
@@ -122,24 +226,109 @@ def cancel_all_orders():
         cancel_order(datum['id'])
 
 
+@traced('client.buy_order')
 def buy_order(amount, price):
     """
     Create a Buy Limit order.
     """
 
-    url = "https://www.bitstamp.net/api/buy/"
+    url = API_URL + "buy/"
+
+    try:
+        return track('buy', amount, price, request(url, {'amount': amount, 'price': price}, retry=False))
 
-    return request(url, {'amount': amount, 'price': price})
+    finally:
+        invalidate()            # The account state changes (or may have changed if the request failed)
 
 
+@traced('client.sell_order')
 def sell_order(amount, price):
     """
     Create a Sell Limit order.
     """
 
-    url = "https://www.bitstamp.net/api/sell/"
+    url = API_URL + "sell/"
+
+    try:
+        return track('sell', amount, price, request(url, {'amount': amount, 'price': price}, retry=False))
 
-    return request(url, {'amount': amount, 'price': price})
+    finally:
+        invalidate()            # The account state changes (or may have changed if the request failed)
+
+
+def track(kind, amount, price, response):
+    """
+    Record an order that has just been placed and return the response of the request unchanged.
+    """
+
+    if type(response) == dict and 'id' in response:
+
+        orders[response['id']] = {'id': response['id'], 'type': kind, 'amount': amount, 'price': price}
+
+    return response
+
+
+@traced('client.replace_order')
+def replace_order(order, kind, amount, price):
+    """
+    Replace the order (a dictionary as stored in 'orders', or None) with a new order of the specified kind ('buy' or
+    'sell'), amount and price, and return the dictionary describing the new order.
+
+    If the order already matches nothing is sent. If its id is known it alone is cancelled and the new order is
+    submitted once the cancellation is complete: BitStamp requires the nonces of successive requests to increase so the
+    two can not be sent concurrently. An order that has already been filled or cancelled is simply replaced, but if the
+    cancellation fails for any other reason the order may still be open and the exception is raised without submitting.
+    BitStamp can take a moment to release the funds reserved by the cancelled order, so a new order rejected for a lack
+    of funds is submitted once more. Without a known order all open orders are cancelled first (as before).
+    """
+
+    if order and order['type'] == kind and order['amount'] == amount and order['price'] == price:
+
+        return order
+
+    submit = buy_order if kind == 'buy' else sell_order
+
+    if not order:
+
+        cancel_all_orders()
+
+        return orders[submit(amount, price)['id']]
+
+    try:
+        cancel_order(order['id'])
+
+    except ClientException as e:
+
+        if 'order not found' not in str(e).lower():
+
+            raise
+
+        warning("Order {} has already been filled or cancelled".format(order['id']))
+        orders.pop(order['id'], None)
+
+    try:
+        response = submit(amount, price)
+
+    except ClientException as e:
+
+        if not insufficient_funds(e):
+
+            raise
+
+        response = submit(amount, price)
+
+    return orders[response['id']]
+
+
+def insufficient_funds(e):
+    """
+    Returns True if the ClientException was raised because BitStamp rejected an order for a lack of funds (the only
+    rejection after which an order is safely submitted again).
+    """
+
+    message = str(e)
+
+    return 'You need' in message or 'You have only' in message
 
 
 def buy_for_usd(usd):
@@ -161,21 +350,34 @@ def usd_buy_order(usd, price):
     So you can place a buy order for $1200 worth of BTC at $510.
     """
 
-    fee = float(balance()['fee'])
-    amount = bitcoin.adjusted_usd_amount(usd, fee)
-
-    btc = bitcoin.chop_btc(amount / price)
+    btc = usd_btc_amount(usd, price)
 
     print("Buying {} btc at ${} at a cost of ${}".format(btc, price, usd))
 
-    buy_order(btc, price)
+    return buy_order(btc, price)
+
+
+def usd_btc_amount(usd, price):
+    """
+    Returns the amount of BTC that can be bought at the specified price for the specified amount of USD, taking the fee
+    in to account.
+    """
+
+    amount = bitcoin.adjusted_usd_amount(usd, fee())
 
+    return bitcoin.chop_btc(amount / price)
 
-def request(url, payload={}):
+
+def request(url, payload={}, retry=True):
     """
     Uses the BitStamp REST API to POST a request and get the response back as a Python Dictionary.
 
     We pass in a dictionary payload containing data above and beyond the credentials.
+
+    When requests are made concurrently one with a smaller nonce can reach the server after one with a larger nonce, in
+    which case it is rejected. Such a request is retried once with a new nonce, unless retry is False. The order calls
+    pass False: the pool resends a request on a connection reset with the same nonce so a nonce error may mean that the
+    order has already been placed (or cancelled) and must not be sent again.
     """
 
     pd = credentials()      # Initial payload is the credentials dictionary
@@ -183,13 +385,16 @@ def request(url, payload={}):
 
     data = urllib.urlencode( pd )
 
-    fin = urllib2.urlopen(url, data)
-    jResponse = fin.readlines()
+    status, jResponse = pool.post(url, data)         # Uses a persistent connection from the pool shared by all client functions
 
     #print("{}\n{}\n".format(url, jResponse))
 
+    if status != 200:
+
+        raise ClientException("HTTP Error {}: {}".format(status, url))
+
     try:
-        response = json.loads( jResponse[0] )
+        response = json.loads( jResponse )
 
     except ValueError:
 
@@ -198,6 +403,10 @@ def request(url, payload={}):
 
     if type(response) == dict and 'error' in response.keys():
 
+        if retry and 'nonce' in str(response['error']).lower():
+
+            return request(url, payload, False)
+
         raise ClientException("API Error: " + str(response['error']))
 
     return response
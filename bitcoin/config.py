@@ -0,0 +1,203 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-29
+#
+# Implements a snapshot of the configuration (thresholds, factors and active flags of the decisions) stored in redis.
+#
+# All values are read in a single round trip (a pipelined MGET together with the version counter) and parsed once into
+# typed attributes of a Config object which is shared by all decisions in an OODA cycle (as data.config).
+#
+# A long-running process calls snapshot() every cycle. The cached Config is only re-loaded when something has changed,
+# which is detected either by:
+#
+#       a keyspace notification         - if subscribe() has been called and the redis server has notifications enabled
+#                                         (notify-keyspace-events must contain 'K' and '$'), in which case an unchanged
+#                                         configuration costs no round trip at all
+#
+#       the version counter             - incremented by redis_client.change(), toggle() and load() and otherwise
+#                                         checked with one GET per cycle
+
+
+import bitcoin.redis_client as redis_client
+
+
+# The attributes of Config with the corresponding redis keys and the functions used to parse their (string) values
+FIELDS = [
+    ('absolute_zero_min_threshold', redis_client.KEY_ABSOLUTE_ZERO_MINIMUM_THRESHOLD, float),
+    ('minimize_loss_drop_factor', redis_client.KEY_MINIMIZE_LOSS_DROP_FACTOR, float),
+    ('min_profit_band_upper_factor', redis_client.KEY_MIN_PROFIT_BAND_UPPER_FACTOR, float),
+    ('min_profit_band_lower_factor', redis_client.KEY_MIN_PROFIT_BAND_LOWER_FACTOR, float),
+    ('min_profit_trigger_threshold', redis_client.KEY_MIN_PROFIT_TRIGGER_THRESHOLD, float),
+    ('rising_peak_activation_threshold', redis_client.KEY_RISING_PEAK_ACTIVATION_THRESHOLD, float),
+    ('rising_peak_upper_limit_factor', redis_client.KEY_RISING_PEAK_UPPER_LIMIT_FACTOR, float),
+    ('rising_peak_lower_limit_factor', redis_client.KEY_RISING_PEAK_LOWER_LIMIT_FACTOR, float),
+    ('falling_trench_activation_threshold', redis_client.KEY_FALLING_TRENCH_ACTIVATION_THRESHOLD, float),
+    ('falling_trench_lower_limit_factor', redis_client.KEY_FALLING_TRENCH_LOWER_LIMIT_FACTOR, float),
+    ('falling_trench_upper_limit_factor', redis_client.KEY_FALLING_TRENCH_UPPER_LIMIT_FACTOR, float),
+    ('active_absolute_zero', redis_client.KEY_ACTIVE_ABSOLUTE_ZERO, redis_client.parse_bool),
+    ('active_minimize_loss', redis_client.KEY_ACTIVE_MINIMIZE_LOSS, redis_client.parse_bool),
+    ('active_minimum_profit', redis_client.KEY_ACTIVE_MINIMUM_PROFIT, redis_client.parse_bool),
+    ('active_rising_peak', redis_client.KEY_ACTIVE_RISING_PEAK, redis_client.parse_bool),
+    ('active_falling_trench', redis_client.KEY_ACTIVE_FALLING_TRENCH, redis_client.parse_bool),
+]
+
+KEYS = [key for _, key, _ in FIELDS]
+
+
+class Config(object):
+    """
+    An immutable snapshot of the configuration. A value missing from redis is None (or False for the active flags).
+    """
+
+    __slots__ = ['version'] + [name for name, _, _ in FIELDS]
+
+    def __init__(self, values, version):
+        """
+        Parse the raw values (in the order of FIELDS) read from redis.
+        """
+
+        for (name, _, parse), value in zip(FIELDS, values):
+
+            if value is None and parse is float:
+
+                setattr(self, name, None)
+
+            else:
+
+                setattr(self, name, parse(value))
+
+        self.version = version
+
+
+    def __str__(self):
+
+        return "\n".join("{}: {}".format(name, getattr(self, name)) for name in self.__slots__)
+
+
+
+def load(rds=None):
+    """
+    Read all values and the version counter in a single round trip and return a new Config object.
+    """
+
+    rds = rds or redis_client.rds
+
+    values, version = rds.pipeline(transaction=False).mget(KEYS).get(redis_client.KEY_CONFIG_VERSION).execute()
+
+    return Config(values, version)
+
+
+
+class Snapshot(object):
+    """
+    Holds the current Config and re-loads it only when the configuration in redis has changed.
+    """
+
+    def __init__(self, rds=None):
+
+        self.rds = rds or redis_client.rds
+
+        self.config = None
+        self._pubsub = None
+
+
+    def subscribe(self):
+        """
+        Subscribe to the keyspace notifications of the configuration keys. Returns False (and keeps relying on the
+        version counter) if the server does not have keyspace notifications for string commands enabled.
+        """
+
+        try:
+            flags = self.rds.config_get('notify-keyspace-events').get('notify-keyspace-events', '')
+
+        except Exception:           # CONFIG may be disabled on the server in which case we can not know
+
+            return False
+
+        if 'K' not in flags or not ('$' in flags or 'A' in flags):
+
+            return False
+
+        db = self.rds.connection_pool.connection_kwargs.get('db', 0)
+
+        self._pubsub = self.rds.pubsub()
+        self._pubsub.subscribe(*["__keyspace@{}__:{}".format(db, key) for key in KEYS + [redis_client.KEY_CONFIG_VERSION]])
+
+        self.config = None          # Changes made before the subscription was active must not be missed
+
+        return True
+
+
+    def get(self):
+        """
+        Returns the current Config, re-loading it if the configuration has changed since it was last loaded.
+        """
+
+        if self.config is None or self._changed():
+
+            self.config = load(self.rds)
+
+        return self.config
+
+
+    def _changed(self):
+
+        if self._pubsub is not None:
+
+            changed = False
+            message = self._pubsub.get_message()
+
+            while message is not None:          # Drain all pending notifications without blocking
+
+                if message['type'] == 'message':
+
+                    changed = True
+
+                message = self._pubsub.get_message()
+
+            return changed
+
+        return self.rds.get(redis_client.KEY_CONFIG_VERSION) != self.config.version
+
+
+    def close(self):
+
+        if self._pubsub is not None:
+
+            self._pubsub.close()
+            self._pubsub = None
+
+
+
+# The snapshot shared by the decisions of the process
+_snapshot = Snapshot()
+
+
+def snapshot():
+    """
+    Returns the current Config of the process.
+    """
+
+    return _snapshot.get()
+
+
+def subscribe():
+    """
+    Use keyspace notifications (if available) instead of the version counter to detect changes.
+    """
+
+    return _snapshot.subscribe()
@@ -30,13 +30,12 @@
 
 from bitcoin import current_time
 import bitcoin.actions as actions
-import bitcoin.redis_client as redis_client
 from bitcoin.models import Decision
 
 
-# Define the necessary descriptive values:
-
-MINIMUM_THRESHOLD = redis_client.absolute_zero_min_threshold()      #         # Min value below which if the sell-price falls the purge should be initiated
+# The descriptive values are read from the configuration snapshot (data.config):
+#
+#   absolute_zero_min_threshold         - Min value below which if the sell-price falls the purge should be initiated
 
 
 def log(msg, newline=False):
@@ -53,10 +52,10 @@ def condition(data):        # Define the condition function of the Decision
 
     if data.btc_balance > 0:
 
-        if data.sell < MINIMUM_THRESHOLD:
+        if data.sell < data.config.absolute_zero_min_threshold:
 
             log(current_time())
-            log("Sell price = ${} has fallen below the Min. Threshold = ${}".format(data.sell, MINIMUM_THRESHOLD), True)
+            log("Sell price = ${} has fallen below the Min. Threshold = ${}".format(data.sell, data.config.absolute_zero_min_threshold), True)
 
             return True
 
@@ -49,11 +49,11 @@ import bitcoin.redis_client as redis_client
 from bitcoin.models import Decision
 
 
-# Define the necessary descriptive values:
-
-ACTIVATION_THRESHOLD = redis_client.falling_trench_activation_threshold()       # Value below which if the avg buy price decreases the buying/trench band is activated
-LOWER_LIMIT_FACTOR = redis_client.falling_trench_lower_limit_factor()          # The factor by which the buy price is multiplied to get the new lower limit of the band
-UPPER_LIMIT_FACTOR = redis_client.falling_trench_upper_limit_factor()           # The factor by which the buy price is multiplied to get the new upper limit of the band
+# The descriptive values are read from the configuration snapshot (data.config):
+#
+#   falling_trench_activation_threshold - Value below which if the avg buy price decreases the buying/trench band is activated
+#   falling_trench_lower_limit_factor   - The factor by which the buy price is multiplied to get the new lower limit of the band
+#   falling_trench_upper_limit_factor   - The factor by which the buy price is multiplied to get the new upper limit of the band
 
 REDIS_KEY = "falling_trench_band"
 
@@ -103,7 +103,9 @@ def delete():
 
 def condition(data):        # Define the condition function of the Decision
 
-    if redis_client.active_falling_trench() and data.usd_balance > 10:
+    config = data.config
+
+    if config.active_falling_trench and data.usd_balance > 10:
 
         band = fetch()
 
@@ -113,7 +115,7 @@ def condition(data):        # Define the condition function of the Decision
 
                 return True
 
-            delta = round2(band['lower'] - data.buy * LOWER_LIMIT_FACTOR)      # Change in lower band based on the current buy price
+            delta = round2(band['lower'] - data.buy * config.falling_trench_lower_limit_factor)      # Change in lower band based on the current buy price
 
             if delta > 0:       # If the buy price has decreased such that the band is pushed downwards we update the band (it NEVER goes up)
 
@@ -128,27 +130,27 @@ def condition(data):        # Define the condition function of the Decision
                 log(current_time())
                 log("Delta = -${}. Pushing band down to: ${} - ${}.\n".format(delta, band['lower'], band['upper']))
 
-                push(band)
+                price = round2(band['lower'])
+                band['order'] = client.replace_order(band.get('order'), 'buy', client.usd_btc_amount(data.usd_balance, price), price)      # Move the buy order (tracked in the band) down
 
-                usd = data.usd_balance
-                client.cancel_all_orders()
-                client.usd_buy_order(usd, round2(band['lower']))
+                push(band)
 
                 log("New buy order created.")
 
         else:               # The band is inactive
 
-            if data.buy < ACTIVATION_THRESHOLD:        # Buy Price is below Activation Threshold so we activate the band
+            if data.buy < config.falling_trench_activation_threshold:        # Buy Price is below Activation Threshold so we activate the band
 
                 log(current_time())
-                log("Avg Buy price = ${} has fallen below the Activation Threshold = ${}".format(data.avg_buy, ACTIVATION_THRESHOLD), True)
+                log("Avg Buy price = ${} has fallen below the Activation Threshold = ${}".format(data.avg_buy, config.falling_trench_activation_threshold), True)
 
-                b = {'upper': ACTIVATION_THRESHOLD, 'lower': data.buy * LOWER_LIMIT_FACTOR}       # Set band values
+                b = {'upper': config.falling_trench_activation_threshold, 'lower': data.buy * config.falling_trench_lower_limit_factor}       # Set band values
                 rds.set(REDIS_KEY, json.dumps(b))               # Convert dictionary to json string and store it in redis server
 
-                usd = data.usd_balance
-                client.cancel_all_orders()
-                client.usd_buy_order(usd, round2(b['lower']))      # Set up a sell order for the upper band limit
+                price = round2(b['lower'])
+                b['order'] = client.replace_order(None, 'buy', client.usd_btc_amount(data.usd_balance, price), price)      # Set up a buy order for the lower band limit (replacing all open orders)
+
+                push(b)
 
                 log("Creating band: ${} - ${}".format(b['lower'], b['upper']))
 
@@ -157,7 +159,7 @@ def condition(data):        # Define the condition function of the Decision
 
 def action(data):       # Define the action to be carried out if the condition is met
 
-    if redis_client.active_falling_trench():
+    if data.config.active_falling_trench:
 
         band = fetch()
 
@@ -170,8 +172,7 @@ def action(data):       # Define the action to be carried out if the condition i
             log("ERROR")
             return
 
-        actions.acquire()
-        delete()
+        actions.acquire(hook="bitcoin.decisions.falling_trench.delete")       # The band is deleted once the acquire ends
 
 
 decision = Decision(condition, action, True)
@@ -33,13 +33,11 @@
 from bitcoin import current_time
 import bitcoin.actions as actions
 from bitcoin.models import Decision
-import bitcoin.redis_client as redis_client
 
 
-# Define the necessary descriptive values:
-
-DROP_FACTOR = redis_client.minimize_loss_drop_factor()      # The factor of the original buy price below which the sell price must fall to trigger this
-                        # condition.
+# The descriptive values are read from the configuration snapshot (data.config):
+#
+#   minimize_loss_drop_factor           - The factor of the original buy price below which the sell price must fall to trigger this condition.
 
 
 def log(msg, newline=False):
@@ -56,9 +54,9 @@ def log(msg, newline=False):
 # anticipation of an upcoming slump.
 def condition(data):
 
-    if redis_client.active_minimize_loss() and data.btc_balance > 0:
+    if data.config.active_minimize_loss and data.btc_balance > 0:
 
-        if data.sell < DROP_FACTOR * data.last_buy_price:
+        if data.sell < data.config.minimize_loss_drop_factor * data.last_buy_price:
 
             log(current_time())
             log("Original Buy Price: {obuy} - Current Sell Price: {sell} - Delta: {delta} - %age: {pct}".format(obuy=data.last_buy_price, sell=data.sell, delta=data.sell - data.last_buy_price, pct=(data.sell - data.last_buy_price)/data.last_buy_price * 100))
@@ -70,9 +68,9 @@ def condition(data):
 
 def action(data):
 
-    if redis_client.active_minimize_loss():
+    if data.config.active_minimize_loss:
 
-        log("BTC sell price has fallen below a factor of {} of original buy price. Selling.\n".format(DROP_FACTOR), True)
+        log("BTC sell price has fallen below a factor of {} of original buy price. Selling.\n".format(data.config.minimize_loss_drop_factor), True)
 
         actions.purge()      # We are in a rush to off-load so we purge all BTC
 
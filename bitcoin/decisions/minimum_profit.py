@@ -31,16 +31,13 @@
 import bitcoin.actions as actions
 from bitcoin import current_time, max_price
 from bitcoin.models import Decision
-import bitcoin.redis_client as redis_client
 
 
-# Define the necessary descriptive values:
-
-BAND_UPPER = redis_client.min_profit_band_upper_factor()       # Upper bound of band is 2% above the original buy price
-BAND_LOWER = redis_client.min_profit_band_lower_factor()      # Lower bound is 0.8% above the orig. buy price (considering the fee to be about 0.4% for both the buy and the sell)
-
-TRIGGER_THRESHOLD = redis_client.min_profit_trigger_threshold()      # Threshold Factor which must be crossed by the max avg sell price to trigger the band
-
+# The descriptive values are read from the configuration snapshot (data.config):
+#
+#   min_profit_band_upper_factor        - Upper bound of band is 2% above the original buy price
+#   min_profit_band_lower_factor        - Lower bound is 0.8% above the orig. buy price (considering the fee to be about 0.4% for both the buy and the sell)
+#   min_profit_trigger_threshold        - Threshold Factor which must be crossed by the max avg sell price to trigger the band
 
 
 def log(msg, newline=False):
@@ -55,16 +52,18 @@ def log(msg, newline=False):
 
 def condition(data):
 
-    if redis_client.active_minimum_profit() and data.btc_balance > 0:
+    config = data.config
+
+    if config.active_minimum_profit and data.btc_balance > 0:
 
-        if BAND_LOWER * data.last_buy_price < data.sell < BAND_UPPER * data.last_buy_price:
+        if config.min_profit_band_lower_factor * data.last_buy_price < data.sell < config.min_profit_band_upper_factor * data.last_buy_price:
 
-            if max_price(data.weighted_sell_prices) > TRIGGER_THRESHOLD * data.last_buy_price:      # The weighted sell prices exceeded the upper threshold before dropping sometime in the past
+            if max_price(data.weighted_sell_aggregate) > config.min_profit_trigger_threshold * data.last_buy_price:      # The weighted sell prices exceeded the upper threshold before dropping sometime in the past
 
                 log(current_time())
                 log("Orig. Buy Price: {obuy} - Curr. Sell Price: {sell} - Delta: {delta} - %age: {pct}".format(obuy=data.last_buy_price, sell=data.sell, delta=data.sell - data.last_buy_price, pct=(data.sell - data.last_buy_price) / data.last_buy_price * 100))
 
-                log("Max Weighted Sell price: {}".format(max_price(data.sell_prices)))
+                log("Max Weighted Sell price: {}".format(max_price(data.weighted_sell_aggregate)))
 
                 return True
 
@@ -73,9 +72,11 @@ def condition(data):
 
 def action(data):
 
-    if redis_client.active_minimum_profit():
+    config = data.config
+
+    if config.active_minimum_profit:
 
-        log("BTC sell price is between {}% and {}% of orig. buy price and the Max Sell Price to date exceeds {}%.\n".format(BAND_LOWER, BAND_UPPER, BAND_UPPER), True)
+        log("BTC sell price is between {}% and {}% of orig. buy price and the Max Sell Price to date exceeds {}%.\n".format(config.min_profit_band_lower_factor, config.min_profit_band_upper_factor, config.min_profit_band_upper_factor), True)
 
         actions.purge()
 
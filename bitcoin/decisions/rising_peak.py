@@ -41,7 +41,6 @@
 
 
 import json
-import redis
 
 from bitcoin import current_time, round2
 import bitcoin.actions as actions
@@ -50,17 +49,17 @@ from bitcoin.models import Decision
 import bitcoin.redis_client as redis_client
 
 
-# Define the necessary descriptive values:
-
-ACTIVATION_THRESHOLD = redis_client.rising_peak_activiation_threshold()         # Value above which if the avg sell price increases the selling/peak band is activated
-UPPER_LIMIT_FACTOR = redis_client.rising_peak_upper_limit_factor()          # The factor by which the sell price is multiplied to get the new upper limit of the band
-LOWER_LIMIT_FACTOR = redis_client.rising_peak_lower_limit_factor()          # The factor by which the sell price is multiplied to get the new lower limit of the band
+# The descriptive values are read from the configuration snapshot (data.config):
+#
+#   rising_peak_activation_threshold    - Value above which if the avg sell price increases the selling/peak band is activated
+#   rising_peak_upper_limit_factor      - The factor by which the sell price is multiplied to get the new upper limit of the band
+#   rising_peak_lower_limit_factor      - The factor by which the sell price is multiplied to get the new lower limit of the band
 
 REDIS_KEY = "rising_peak_band"
 
 
 # Define the handle for the redis database
-rds = redis.StrictRedis(host='localhost', port=6379, db=0)
+rds = redis_client.rds
 
 
 def log(msg, newline=False):
@@ -104,7 +103,9 @@ def delete():
 
 def condition(data):        # Define the condition function of the Decision
 
-    if redis_client.active_rising_peak() and data.btc_balance > 0:       # We carry out the condition check only if the decision is set active in redis
+    config = data.config
+
+    if config.active_rising_peak and data.btc_balance > 0:       # We carry out the condition check only if the decision is set active in redis
 
         band = fetch()
 
@@ -114,7 +115,7 @@ def condition(data):        # Define the condition function of the Decision
 
                 return True
 
-            delta = round2(data.sell * UPPER_LIMIT_FACTOR - band['upper'])      # Change in upper band based on the current sell price
+            delta = round2(data.sell * config.rising_peak_upper_limit_factor - band['upper'])      # Change in upper band based on the current sell price
 
             if delta > 0:       # If the sell price has increased such that the band is pushed upwards we update the band (it NEVER goes down)
 
@@ -124,32 +125,32 @@ def condition(data):        # Define the condition function of the Decision
                 log("\n" + current_time())
                 log("Delta = ${}. Pushing band up to: ${} - ${}.".format(delta, band['lower'], band['upper']))
 
-                push(band)
-
                 btc = client.btc()
-                client.cancel_all_orders()
-                client.sell_order(btc, round2(band['upper']))
+                band['order'] = client.replace_order(band.get('order'), 'sell', btc, round2(band['upper']))       # Move the sell order (tracked in the band) up
+
+                push(band)
 
         else:               # The band is inactive
 
-            if data.sell > ACTIVATION_THRESHOLD:        # Avg Sell is above Activation Threshold so we activate the band
+            if data.sell > config.rising_peak_activation_threshold:        # Avg Sell is above Activation Threshold so we activate the band
 
                 log("\n" + current_time())
-                log("Sell price = ${} has risen above the Activation Threshold = ${}".format(data.sell, ACTIVATION_THRESHOLD), True)
+                log("Sell price = ${} has risen above the Activation Threshold = ${}".format(data.sell, config.rising_peak_activation_threshold), True)
 
-                b = {'lower': data.sell * LOWER_LIMIT_FACTOR, 'upper': data.sell * UPPER_LIMIT_FACTOR}       # Set band values
+                b = {'lower': data.sell * config.rising_peak_lower_limit_factor, 'upper': data.sell * config.rising_peak_upper_limit_factor}       # Set band values
                 rds.set(REDIS_KEY, json.dumps(b))               # Convert dictionary to json string and store it in redis server
 
                 btc = client.btc()
-                client.cancel_all_orders()
-                client.sell_order(btc, round2(b['upper']))      # Set up a sell order for the upper band limit
+                b['order'] = client.replace_order(None, 'sell', btc, round2(b['upper']))      # Set up a sell order for the upper band limit (replacing all open orders)
+
+                push(b)
 
     return False
 
 
 def action(data):       # Define the action to be carried out if the condition is met
 
-    if redis_client.active_rising_peak():
+    if data.config.active_rising_peak:
 
         band = fetch()
 
@@ -162,8 +163,7 @@ def action(data):       # Define the action to be carried out if the condition i
             log("ERROR")
             return
 
-        actions.purge()
-        delete()
+        actions.purge(hook="bitcoin.decisions.rising_peak.delete")        # The band is deleted once the purge ends
 
 
 decision = Decision(condition, action, True)
@@ -0,0 +1,263 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-01
+#
+# Implements the execution of a purge (sell all BTC) or an acquire (spend all USD) as a resumable state machine.
+#
+# An execution is started by actions.purge() or actions.acquire() and then advanced by calling step() with every new
+# price (by ooda.py, either for every published tick or once per cron run). Each step checks the balance and re-prices
+# the order if needed, so re-pricing happens as soon as a new price arrives and nothing blocks in between.
+#
+# The state of the execution is stored in redis as a json dictionary:
+#
+#       kind            - 'purge' or 'acquire'
+#       hook            - dotted path of a function called (without arguments) once the execution finishes (or None)
+#       order           - the last order placed (a dictionary with the keys 'id', 'type', 'amount' and 'price' as
+#                         returned by client.replace_order) or None
+#       price           - the market price on which the last order was based (None before the first order)
+#       started         - unix time at which the execution started
+#
+# Since the state is in redis an execution survives a restart and a cron-started ooda.py can not start a second one
+# that overlaps it. A lock ensures that only one process advances the execution at a time.
+
+
+import importlib
+import json
+import time
+import uuid
+
+import bitcoin
+import bitcoin.client as client
+import bitcoin.redis_client as redis_client
+import bitcoin.settings as settings
+from bitcoin.tracing import traced
+
+
+REDIS_KEY = redis_client.KEY_EXECUTION
+LOCK_KEY = redis_client.KEY_EXECUTION_LOCK
+
+LOCK_TIMEOUT = 60           # Time in seconds after which the lock held by a crashed process expires
+
+PRICE_DELTA = 0.1           # Amount in dollars by which the buy and sell price are offset to favor a quick acquire or purge
+
+# The values returned by step():
+
+RUNNING = 'running'
+DONE = 'done'
+ABORTED = 'aborted'
+
+
+def log(msg):
+    """
+    Method for logging messages from the execution.
+    """
+
+    print("[Execution] " + msg)
+
+
+def fetch():
+    """
+    Method for fetching the state dictionary of the current execution from redis. Returns None if there is none.
+    """
+    state = redis_client.rds.get(REDIS_KEY)
+
+    if state:
+
+        return json.loads(state)
+
+    return None
+
+
+def push(state):
+    """
+    Method for storing the state dictionary in redis.
+    """
+    redis_client.rds.set(REDIS_KEY, json.dumps(state))
+
+
+def delete():
+    """
+    Method for deleting the state of the execution from redis.
+    """
+    redis_client.rds.delete(REDIS_KEY)
+
+
+def active():
+    """
+    Returns True if an execution is in progress.
+    """
+
+    return bool(redis_client.rds.exists(REDIS_KEY))
+
+
+def start(kind, hook=None):
+    """
+    Start an execution of the specified kind ('purge' or 'acquire'). Returns False (and does nothing) if an execution
+    is already in progress.
+    """
+
+    state = {'kind': kind, 'hook': hook, 'order': None, 'price': None, 'started': int(time.time())}
+
+    return bool(redis_client.rds.set(REDIS_KEY, json.dumps(state), nx=True))
+
+
+@traced('execution.step')
+def step(buy, sell):
+    """
+    Advance the execution in progress (if any) using the latest buy and sell prices. Returns RUNNING, DONE or ABORTED,
+    or None if there is no execution in progress (or another process is advancing it).
+    """
+
+    token = uuid.uuid4().hex
+
+    if not redis_client.rds.set(LOCK_KEY, token, nx=True, ex=LOCK_TIMEOUT):
+
+        return None
+
+    try:
+        state = fetch()
+
+        if state is None:
+
+            return None
+
+        if state['kind'] == 'purge':
+
+            status = _purge(state, float(sell))
+
+        else:
+
+            status = _acquire(state, float(buy))
+
+        if status == RUNNING:
+
+            push(state)
+
+        else:
+
+            delete()
+
+            if state['hook']:
+
+                _call(state['hook'])
+
+        return status
+
+    finally:
+
+        if redis_client.rds.get(LOCK_KEY) == token:
+
+            redis_client.rds.delete(LOCK_KEY)
+
+
+def _purge(state, sell_price):
+    """
+    Carry out a single step of a purge (selling all BTC as quickly as possible).
+    """
+
+    btc = float(client.balance(fresh=True)['btc_balance'])      # No. of BTC still in account
+
+    if btc <= 0:
+
+        import bitcoin.decisions.rising_peak as rising_peak     # We import here to avoid a circular import
+
+        rising_peak.delete()        # Clear Redis information about band since the BTC has been purged
+
+        log("All BTC sold. Purge ends.\n")
+
+        return DONE
+
+    prev_sell_price = state['price'] or 1e9           # A very large number so that the condition is triggered the first time.
+
+    log("Remaining BTC: {} - Previous sell price: {} - Current sell price: {}".format(btc, prev_sell_price, sell_price))
+
+    if sell_price < prev_sell_price:            # The sell price has fallen and so the previous sell price will NOT trigger an actual sale (because of the way limit orders work) so we create a new order
+
+        # Offer to sell at a slightly lower price than the current sell price (to sweeten the deal)
+        state['order'] = client.replace_order(state['order'], 'sell', btc, sell_price - PRICE_DELTA)
+        state['price'] = sell_price
+
+    elif sell_price > settings.SELL_PRICE_RISE_FACTOR * prev_sell_price:
+
+        log("Sell price has increased to a factor of {}. Cancelling purge".format(settings.SELL_PRICE_RISE_FACTOR))
+        _cancel(state['order'])
+
+        return ABORTED
+
+    # NOTE: If the sell_price doesn't fall or rise by more than RISE_FACTOR we keep the same sell order active.
+
+    return RUNNING
+
+
+def _acquire(state, buy_price):
+    """
+    Carry out a single step of an acquire (spending all USD on BTC as quickly as possible).
+    """
+
+    bal = client.balance(fresh=True)
+    usd = float(bal['usd_balance'])      # Amount of USD still in account
+    fee = float(bal['fee'])              # %age of cost taken as transaction fee
+
+    if usd <= 1:      # BitStamp requires at least a $1 order (some small amount might be left once fees are calculated)
+
+        log("All USD spent. Acquire ends.\n")
+
+        return DONE
+
+    buy_price += PRICE_DELTA          # Offer to buy at slightly above the current buy price (to sweeten the deal)
+
+    prev_buy_price = state['price'] or 0            # A very small number so that the condition is triggered the first time.
+
+    if buy_price != prev_buy_price:       # If the buy price has changed we update the buy_order to ensure a quick acquire.
+
+        amount = bitcoin.adjusted_usd_amount(usd, fee)     # Amount of USD that can be used to buy BTC once the fee has been subtracted
+        btc = bitcoin.chop_btc(amount / buy_price)              # Calculate the correctly floored (rounded) amount of btc that can be bought at the current buy price
+
+        log("Remaining USD: {} - Fee %age: {} - Buying BTC: {} at {}".format(usd, fee, btc, buy_price))
+
+        state['order'] = client.replace_order(state['order'], 'buy', btc, buy_price)
+        state['price'] = buy_price
+
+    return RUNNING
+
+
+def _cancel(order):
+    """
+    Cancel the order (or all open orders if it is unknown).
+    """
+
+    if order is None:
+
+        client.cancel_all_orders()
+        return
+
+    try:
+        client.cancel_order(order['id'])
+
+    except client.ClientException as e:         # The order has already been filled
+
+        log("Unable to cancel order {}: {}".format(order['id'], e))
+
+
+def _call(hook):
+    """
+    Call the function specified by its dotted path (for example "bitcoin.decisions.rising_peak.delete").
+    """
+
+    module, function = hook.rsplit('.', 1)
+
+    getattr(importlib.import_module(module), function)()
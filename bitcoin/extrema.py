@@ -0,0 +1,226 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-10
+#
+# Implements a persistent range max/min structure over the prices: the maximum and minimum of the buy, sell and weighted
+# buy and sell prices (and the number of samples) over any time interval are found in logarithmic time instead of by
+# scanning every sample.
+#
+# The "extrema" table holds the max and min of every column and the count of samples over time-aligned blocks at
+# several levels. The blocks of level 1 span 2^10 seconds (about 17 minutes) and every level is FANOUT (16) times
+# coarser than the one below, so a block of one level is made up of exactly FANOUT blocks of the level below:
+#
+#       level 1: 17 minutes     level 2: 4.5 hours      level 3: 3 days     level 4: 49 days    level 5: 2 years    ...
+#
+# A query covers the ragged ends of the interval with the raw prices (less than one level 1 block at each end) and then,
+# moving up the levels, with less than FANOUT blocks at each end until the remaining aligned interval is covered by a
+# few blocks of the top level. All the pieces are combined in a single statement.
+#
+# The blocks are updated by the tick writer whenever a price is inserted (which only ever appends) and regenerated from
+# the "prices" table by rebuild() (called by the schema migrations and after a backfill).
+#
+# Usage:
+#
+#       python -m bitcoin.extrema rebuild                       - Regenerate the blocks
+#       python -m bitcoin.extrema query COLUMN START END        - Print the max and min of the column over the unix time range
+
+
+import sys
+
+from bitcoin import schema
+
+
+BASE = 2 ** 10          # Size in seconds of the blocks of level 1
+FANOUT = 16             # Number of blocks of a level that make up a block of the next level
+LEVELS = 6              # Number of levels (the top level blocks span about 34 years)
+
+# The size in seconds of the blocks of each level (indexed by level - 1)
+SIZES = [BASE * FANOUT ** ii for ii in range(LEVELS)]
+
+# Map each column to its expression in terms of the columns of "prices". A missing weighted average is taken to be the
+# price itself (as in bitcoin.aggregates).
+COLUMNS = {
+    'buy': '"buy"',
+    'sell': '"sell"',
+    'wa_buy': 'COALESCE("wa_buy", "buy")',
+    'wa_sell': 'COALESCE("wa_sell", "sell")',
+}
+
+NAMES = sorted(COLUMNS)
+
+
+def update(cursor, time, buy, sell, wa_buy, wa_sell):
+    """
+    Add the prices of a newly inserted tick to the block of every level that contains it.
+    """
+
+    values = {'buy': buy, 'sell': sell, 'wa_buy': buy if wa_buy is None else wa_buy, 'wa_sell': sell if wa_sell is None else wa_sell}
+
+    columns = ", ".join('"{c}_max", "{c}_min"'.format(c=c) for c in NAMES)
+    assignments = ", ".join('"{c}_max" = MAX("{c}_max", ?), "{c}_min" = MIN("{c}_min", ?)'.format(c=c) for c in NAMES)
+    params = tuple(values[c] for c in NAMES for _ in range(2))
+
+    for level, size in enumerate(SIZES, 1):
+
+        start = time - time % size
+
+        cursor.execute('''INSERT OR IGNORE INTO "extrema" ("level", "time", "count", {}) VALUES (?, ?, 0, {})'''.format(columns, ", ".join("?" * (2 * len(NAMES)))),
+                       (level, start) + params)
+        cursor.execute('''UPDATE "extrema" SET "count" = "count" + 1, {} WHERE "level" = ? AND "time" = ?'''.format(assignments), params + (level, start))
+
+
+def rebuild(cursor):
+    """
+    Regenerate the blocks of every level from the "prices" table. Level 1 is aggregated from the prices and every
+    other level from the level below it.
+    """
+
+    cursor.execute('''DELETE FROM "extrema"''')
+
+    columns = ", ".join('"{c}_max", "{c}_min"'.format(c=c) for c in NAMES)
+
+    aggregates = ", ".join('MAX({e}), MIN({e})'.format(e=COLUMNS[c]) for c in NAMES)
+
+    cursor.execute('''INSERT INTO "extrema" ("level", "time", "count", {columns})
+                      SELECT 1, "time" - "time" % {size} AS "block", COUNT(*), {aggregates} FROM "prices" GROUP BY "block"'''.format(columns=columns, size=SIZES[0], aggregates=aggregates))
+
+    aggregates = ", ".join('MAX("{c}_max"), MIN("{c}_min")'.format(c=c) for c in NAMES)
+
+    for level in range(2, LEVELS + 1):
+
+        cursor.execute('''INSERT INTO "extrema" ("level", "time", "count", {columns})
+                          SELECT ?, "time" - "time" % {size} AS "block", SUM("count"), {aggregates} FROM "extrema" WHERE "level" = ? GROUP BY "block"'''.format(columns=columns, size=SIZES[level - 1], aggregates=aggregates),
+                       (level, level - 1))
+
+
+def pieces(start, end):
+    """
+    Decompose the time interval [start, end] in to a list of tuples (level, lower, upper) of half-open intervals
+    [lower, upper) of the raw prices (level 0) and of the blocks of each level that together cover it exactly.
+    """
+
+    lower, upper = start, end + 1
+    result = []
+
+    for level in range(LEVELS + 1):
+
+        if level == LEVELS:         # Whatever remains is covered by blocks of the top level
+
+            result.append((level, lower, upper))
+            break
+
+        size = SIZES[level]         # Size of the blocks of the next level
+
+        aligned_lower = lower + (-lower) % size
+        aligned_upper = upper - upper % size
+
+        if aligned_lower >= aligned_upper:          # No block of the next level fits inside so this level covers the rest
+
+            result.append((level, lower, upper))
+            break
+
+        if lower < aligned_lower: result.append((level, lower, aligned_lower))
+        if aligned_upper < upper: result.append((level, aligned_upper, upper))
+
+        lower, upper = aligned_lower, aligned_upper
+
+    return result
+
+
+def summary(cursor, column, start, end):
+    """
+    Returns a tuple (max, min, count) of the column ('buy', 'sell', 'wa_buy' or 'wa_sell') over the prices with
+    start <= time <= end. The max and min are None if there are no prices in the interval.
+    """
+
+    selects = []
+    params = []
+
+    for level, lower, upper in pieces(start, end):
+
+        if level == 0:
+
+            selects.append('''SELECT MAX({e}) AS "max", MIN({e}) AS "min", COUNT(*) AS "count" FROM "prices" WHERE "time" >= ? AND "time" < ?'''.format(e=COLUMNS[column]))
+            params.extend([lower, upper])
+
+        else:
+
+            # The block containing 'lower' starts at 'lower' (the pieces are aligned) so the blocks are selected by their start time
+            selects.append('''SELECT MAX("{c}_max") AS "max", MIN("{c}_min") AS "min", SUM("count") AS "count" FROM "extrema" WHERE "level" = ? AND "time" >= ? AND "time" < ?'''.format(c=column))
+            params.extend([level, lower, upper])
+
+    return cursor.execute('''SELECT MAX("max"), MIN("min"), COALESCE(SUM("count"), 0) FROM ({})'''.format(" UNION ALL ".join(selects)), params).fetchone()
+
+
+def extrema(cursor, column, start, end):
+    """
+    Returns a tuple (max, min) of the column over the prices with start <= time <= end. Both are None if there are no
+    prices in the interval.
+    """
+
+    return summary(cursor, column, start, end)[:2]
+
+
+def count(cursor, start, end):
+    """
+    Returns the number of prices with start <= time <= end.
+    """
+
+    return summary(cursor, 'buy', start, end)[2]
+
+
+def maximum(cursor, column, start, end):
+    """
+    Returns the maximum of the column over the prices with start <= time <= end.
+    """
+
+    return extrema(cursor, column, start, end)[0]
+
+
+def minimum(cursor, column, start, end):
+    """
+    Returns the minimum of the column over the prices with start <= time <= end.
+    """
+
+    return extrema(cursor, column, start, end)[1]
+
+
+
+if __name__ == '__main__':
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    conn = schema.connect()
+    cursor = conn.cursor()
+
+    if command == 'rebuild':
+
+        rebuild(cursor)
+        conn.commit()
+
+    elif command == 'query':
+
+        print("max: {} - min: {}".format(*extrema(cursor, sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))))
+
+    else:
+
+        print("Usage: python -m bitcoin.extrema rebuild | query COLUMN START END")
+
+    conn.close()
@@ -19,33 +19,56 @@
 # Implements the various models used in the application, in OODA in particular.
 
 
-import sqlite3
-
-import rpy2.robjects as robjects
+from array import array
+from itertools import chain
 
 import bitcoin
-import bitcoin.client as client
+from bitcoin import aggregates, schema, tracing
+import bitcoin.config
+import bitcoin.async_client as async_client
 import bitcoin.utilities.push_transactions as push_transactions
 
 
-class Data:
+class Data(object):
     """
     This class encapsulates the data collected and as such is representative of the current STATE of bitcoin prices, including history.
+
+    The max, min and count of the buy prices since the last sell and of the (weighted) sell prices since the last buy are
+    available in O(1) as Aggregate objects. The full series of these prices are only loaded from the database when one
+    of the buy_prices, sell_prices or weighted_sell_prices attributes is accessed.
     """
 
-    def __init__(self):
+    def __init__(self, config=None):
         """
         Initialization method. Here is where we poll the database and the BitStamp API to collect relevant data.
+
+        The configuration snapshot (shared by all decisions) is taken from bitcoin.config unless one is passed in.
         """
-        # The first step is to fetch and store transactions from the backend to ensure that our knowledge of transactional data is up to Date
-        push_transactions.push(log=False)
 
-        # The next step is to fetch current price data from the sqlite3 database
+        with tracing.span('data'):
 
-        conn = sqlite3.connect( bitcoin.get_db() )
-        cursor = conn.cursor()
+            self._collect(config)
+
+
+    def _collect(self, config):
+        """
+        Collect the data. The sqlite reads and the wait for the API are traced separately (see bitcoin.tracing).
+        """
+
+        # The first step is to fetch and store transactions from the backend to ensure that our knowledge of transactional data is up to Date.
+        # This is done in the background concurrently with fetching the USD and BTC balance using the BitStamp API client.
+        pushed = async_client.spawn(push_transactions.push, log=False)
+        bal = async_client.balance()
+
+        # Meanwhile we take a snapshot of the configuration and fetch current price data from the sqlite3 database
+        self.config = config or bitcoin.config.snapshot()
+
+        with tracing.span('data.prices'):
 
-        values = cursor.execute('''SELECT "time", "buy", "sell", "wa_buy", "wa_sell" FROM "prices" ORDER BY "time" DESC LIMIT 1''').fetchone()
+            conn = schema.connect()
+            cursor = conn.cursor()
+
+            values = cursor.execute('''SELECT "time", "buy", "sell", "wa_buy", "wa_sell" FROM "prices" ORDER BY "time" DESC LIMIT 1''').fetchone()
 
         self.time = values[0]
         self.buy = values[1]
@@ -53,50 +76,169 @@ class Data:
         self.avg_buy = values[3]
         self.avg_sell = values[4]
 
-        # Use BitStamp API client to fetch the USD and BTC balance
-        bal = client.balance()
+        tracing.tick(self.time)         # The cycle evaluates this price sample
+
+        # Wait for the USD and BTC balance and the transactions
+        with tracing.span('data.wait'):
+
+            bal, _ = async_client.gather(bal, pushed)
 
         self.usd_balance = float(bal['usd_balance'])
         self.btc_balance = float(bal['btc_balance'])
 
-        # Query "transactions" table to database to get the latest buy and sell prices and the times they occurred (needed for orienting/analysis)
-        values = cursor.execute('''SELECT "time", "rate" FROM "transactions" WHERE "usd" > 0 ORDER BY "time" DESC LIMIT 1''').fetchone()
-        self.last_sell_time = values[0]
-        self.last_sell_price = values[1]
+        with tracing.span('data.trades'):
 
-        values = cursor.execute('''SELECT "time", "rate" FROM "transactions" WHERE "usd" < 0 ORDER BY "time" DESC LIMIT 1''').fetchone()
-        self.last_buy_time = values[0]
-        self.last_buy_price = values[1]
+            # Query "transactions" table to database to get the latest buy and sell prices and the times they occurred (needed for orienting/analysis)
+            values = cursor.execute('''SELECT "time", "rate" FROM "transactions" WHERE "usd" > 0 ORDER BY "time" DESC LIMIT 1''').fetchone()
+            self.last_sell_time = values[0]
+            self.last_sell_price = values[1]
 
-        # Fetch all buy prices since the last time BTC was sold
-        self.buy_prices = []
-        for values in cursor.execute('''SELECT "buy" FROM "prices" WHERE "time" > ?''', (self.last_sell_time,)):
+            values = cursor.execute('''SELECT "time", "rate" FROM "transactions" WHERE "usd" < 0 ORDER BY "time" DESC LIMIT 1''').fetchone()
+            self.last_buy_time = values[0]
+            self.last_buy_price = values[1]
 
-            self.buy_prices.append(values[0])
+            # Fetch the running aggregates of the prices since the last trades (they are reset if a trade has not yet been accounted for)
+            aggregates.sync(cursor, self.last_sell_time, self.last_buy_time)
 
-        # Fetch all sell prices since the last time BTC was bought
-        self.sell_prices = []
-        self.weighted_sell_prices = []
-        for values in cursor.execute('''SELECT "sell", "wa_sell" FROM "prices" WHERE "time" > ?''', (self.last_buy_time, )):
+            values = aggregates.fetch(cursor)
 
-            self.sell_prices.append(values[0])
-            self.weighted_sell_prices.append(values[1])
+            self.buy_aggregate = values['buy']
+            self.sell_aggregate = values['sell']
+            self.weighted_sell_aggregate = values['wa_sell']
 
-        # Convert array of prices in to R vectors
-        self.buy_prices = robjects.FloatVector(self.buy_prices)
-        self.sell_prices = robjects.FloatVector(self.sell_prices)
-        self.weighted_sell_prices = robjects.FloatVector(self.weighted_sell_prices)
+            conn.commit()
+            conn.close()
 
-        cursor.close()
+        self._series = {}
 
         # Carry out Debug tasks to change Date object for debugging:
 
 
+    def _load_series(self):
+        """
+        Load the full series of buy prices since the last sell and (weighted) sell prices since the last buy.
+        """
+
+        conn = schema.connect()
+        cursor = conn.cursor()
+
+        # Fetch all buy prices since the last time BTC was sold
+        cursor.execute('''SELECT "buy" FROM "prices" WHERE "time" > ?''', (self.last_sell_time,))
+        self._series['buy'] = PriceSeries.from_rows(cursor)
+
+        # Fetch all sell prices since the last time BTC was bought
+        cursor.execute('''SELECT "sell", COALESCE("wa_sell", "sell") FROM "prices" WHERE "time" > ?''', (self.last_buy_time, ))
+        self._series['sell'], self._series['wa_sell'] = PriceSeries.from_rows(cursor, 2)
+
+        conn.close()
+
+
+    @property
+    def buy_prices(self):
+
+        if not self._series: self._load_series()
+
+        return self._series['buy']
+
+
+    @property
+    def sell_prices(self):
+
+        if not self._series: self._load_series()
+
+        return self._series['sell']
+
+
+    @property
+    def weighted_sell_prices(self):
+
+        if not self._series: self._load_series()
+
+        return self._series['wa_sell']
+
+
     def __str__(self):
         """
         String representation of the object.
         """
-        return "Timestamp: {ts}\n\nBuy: {buy}\nSell: {sell}\n\nUSD Balance: {usd}\nBTC Balance: {btc}\n\nLast Buy Price: {obuy}  {obtime}\nLast Sell Price: {osell}  {ostime}\n\nBuy Prices: {bprices}\nSell Prices: {sprices}".format(ts=common.format_time(self.time), buy=self.buy, sell=self.sell, usd=self.usd_balance, btc=self.btc_balance, obuy=self.last_buy_price, osell=self.last_sell_price, bprices=self.buy_prices, sprices=self.sell_prices, obtime=bitcoin.format_time(self.last_buy_time), ostime=bitcoin.format_time(self.last_sell_time))
+        return "Timestamp: {ts}\n\nBuy: {buy}\nSell: {sell}\n\nUSD Balance: {usd}\nBTC Balance: {btc}\n\nLast Buy Price: {obuy}  {obtime}\nLast Sell Price: {osell}  {ostime}\n\nBuy Prices: {bprices}\nSell Prices: {sprices}".format(ts=bitcoin.format_time(self.time), buy=self.buy, sell=self.sell, usd=self.usd_balance, btc=self.btc_balance, obuy=self.last_buy_price, osell=self.last_sell_price, bprices=self.buy_aggregate, sprices=self.sell_aggregate, obtime=bitcoin.format_time(self.last_buy_time), ostime=bitcoin.format_time(self.last_sell_time))
+
+
+
+class PriceSeries(object):
+    """
+    This class encapsulates a compact (array backed) series of float prices which keeps track of its maximum and minimum
+    values so that they can be queried without iterating over the series.
+    """
+
+    __slots__ = ('values', 'maximum', 'minimum')
+
+
+    def __init__(self, values=()):
+        """
+        Initialization method. The values can be any iterable of floats (including another array).
+        """
+
+        self.values = array('d', values)
+
+        self.maximum = max(self.values) if self.values else None
+        self.minimum = min(self.values) if self.values else None
+
+
+    @classmethod
+    def from_rows(cls, cursor, columns=1):
+        """
+        Fill series straight from the rows of an executed cursor. The rows are flattened in to a single array (without
+        any per-row work in Python) which is then split in to one series per column.
+
+        Returns a single series if columns = 1 otherwise a tuple of series.
+        """
+
+        flat = array('d', chain.from_iterable(cursor))
+
+        if columns == 1:
+
+            return cls(flat)
+
+        return tuple(cls(flat[ii::columns]) for ii in range(columns))
+
+
+    def append(self, value):
+        """
+        Append a value to the series updating the maximum and minimum.
+        """
+
+        self.values.append(value)
+
+        if self.maximum is None or value > self.maximum: self.maximum = value
+        if self.minimum is None or value < self.minimum: self.minimum = value
+
+
+    def __len__(self):
+
+        return len(self.values)
+
+
+    def __iter__(self):
+
+        return iter(self.values)
+
+
+    def __getitem__(self, index):
+        """
+        Indexing returns a float while slicing returns a new PriceSeries (the slice of an array is a single memory copy).
+        """
+
+        if isinstance(index, slice):
+
+            return PriceSeries(self.values[index])
+
+        return self.values[index]
+
+
+    def __str__(self):
+
+        return str(self.values.tolist())
 
 
 
@@ -116,17 +258,26 @@ class Decision:
 
         self._condition = False     # Internal flag to determine if the condition test was true or false
 
+        name = condition.__module__.rsplit('.', 1)[-1]          # The module of the decision (e.g. rising_peak) names its tracing spans
+
+        self._condition_span = tracing.span("decision.{}.condition".format(name))         # Re-used on every execution (a decision is never nested)
+        self._action_span = tracing.span("decision.{}.action".format(name))
+
 
     def execute(self, data):
         """
         Carry out the decision that is test the data and if true carry out the required action.
         """
 
-        self._condition = self.condition(data)
+        with self._condition_span:
+
+            self._condition = self.condition(data)
 
         if (self._condition):
 
-            self.action(data)
+            with self._action_span:
+
+                self.action(data)
 
 
     def final(self):
@@ -0,0 +1,226 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-08
+#
+# Implements the --profile switch shared by the scripts (fetch.py, ooda.py, push.py, state.py and the utilities).
+#
+# Every script calls start() first thing. If --profile was passed on the command line it is removed from sys.argv (so
+# the script's own argument handling is unaffected) and a sampling CPU profiler is started: the ITIMER_PROF timer
+# interrupts the process every PROFILE_INTERVAL seconds of CPU time and the stacks of all threads are counted. When the
+# process exits (or is sent SIGTERM) the counts are written in the collapsed-stack format used by flamegraph.pl and
+# speedscope:
+#
+#       fetch.py:<module>;bitcoin/tick.py:insert;bitcoin/aggregates.py:update 12
+#
+# With --profile=memory a tracemalloc snapshot of the top allocators is also written, provided the tracemalloc module
+# is available (the standard library from Python 3.4, the pytracemalloc backport before that).
+#
+# The files are named after the script, the time and the pid and written to settings.PROFILE_DIR where only the latest
+# PROFILE_KEEP runs are kept so that a production cron job can be profiled (and runs compared) without any code changes.
+
+
+import atexit
+import os
+import signal
+import sys
+import thread
+import time
+
+from bitcoin.settings import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_KEEP
+
+try:
+    import tracemalloc
+
+except ImportError:
+
+    tracemalloc = None
+
+
+SWITCH = '--profile'
+TOP_ALLOCATORS = 50         # Number of allocation sites written to the memory snapshot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))          # Frames are named relative to the project
+
+
+class Sampler(object):
+    """
+    Sampling CPU profiler. Counts the collapsed stacks of every thread each time the profiling timer fires.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+
+        self.interval = interval
+        self.counts = {}            # Maps a collapsed stack to the number of samples it was seen in
+
+        self._names = {}            # Cache of the names of the code objects
+
+
+    def start(self):
+
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.siginterrupt(signal.SIGPROF, False)          # Restart the system calls (socket reads of other threads) that a sample interrupts
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+
+    def stop(self):
+
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_IGN)
+
+
+    def _sample(self, signum, frame):
+
+        frames = sys._current_frames()
+        frames[thread.get_ident()] = frame          # The handler runs in the main thread, which we sample where it was interrupted
+
+        for top in frames.values():
+
+            stack = self._collapse(top)
+            self.counts[stack] = self.counts.get(stack, 0) + 1
+
+
+    def _collapse(self, frame):
+
+        names = []
+
+        while frame is not None:
+
+            code = frame.f_code
+            name = self._names.get(code)
+
+            if name is None:
+
+                filename = os.path.abspath(code.co_filename)
+
+                if filename.startswith(ROOT): filename = os.path.relpath(filename, ROOT)
+
+                name = self._names[code] = "{}:{}".format(filename, code.co_name)
+
+            names.append(name)
+            frame = frame.f_back
+
+        names.reverse()
+
+        return ";".join(names)
+
+
+    def write(self, path):
+
+        with open(path, 'w') as fout:
+
+            for stack, count in sorted(self.counts.items()):
+
+                fout.write("{} {}\n".format(stack, count))
+
+
+
+def start(argv=None):
+    """
+    Start profiling if the --profile switch (or --profile=memory) is in argv (default: sys.argv), removing it. Returns
+    True if profiling was started.
+    """
+
+    argv = sys.argv if argv is None else argv
+
+    switches = [arg for arg in argv if arg == SWITCH or arg.startswith(SWITCH + '=')]
+
+    if not switches:
+
+        return False
+
+    for arg in switches:
+
+        argv.remove(arg)
+
+    memory = any(arg == SWITCH + '=memory' for arg in switches)
+
+    if memory:
+
+        if tracemalloc is None:
+
+            sys.stderr.write("WARNING: tracemalloc is not available. Only the CPU profile is captured.\n")
+
+        else:
+
+            tracemalloc.start()
+
+    script = os.path.splitext(os.path.basename(argv[0] if argv and argv[0] else 'python'))[0]
+
+    sampler = Sampler()
+    sampler.start()
+
+    atexit.register(_finish, sampler, script, memory and tracemalloc is not None)
+
+    # A daemon (fetch.py --daemon, ooda.py --watch) is stopped with SIGTERM which would otherwise skip the atexit handlers
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    return True
+
+
+def _finish(sampler, script, memory):
+    """
+    Stop profiling and write the results to PROFILE_DIR.
+    """
+
+    sampler.stop()
+
+    if not os.path.isdir(PROFILE_DIR):
+
+        os.makedirs(PROFILE_DIR)
+
+    prefix = os.path.join(PROFILE_DIR, "{}-{}-{}".format(script, time.strftime("%Y%m%d-%H%M%S"), os.getpid()))
+
+    sampler.write(prefix + ".collapsed")
+
+    if memory:
+
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        with open(prefix + ".alloc.txt", 'w') as fout:
+
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATORS]:
+
+                fout.write("{}\n".format(stat))
+
+    rotate(PROFILE_DIR, PROFILE_KEEP)
+
+    sys.stderr.write("Profile written to {}.collapsed\n".format(prefix))
+
+
+def rotate(directory, keep):
+    """
+    Delete the files of all but the latest 'keep' runs in the directory (the files of a run share their name up to the
+    first '.').
+    """
+
+    runs = {}
+
+    for name in os.listdir(directory):
+
+        path = os.path.join(directory, name)
+        run = name.split('.', 1)[0]
+
+        runs.setdefault(run, []).append(path)
+
+    latest = sorted(runs, key=lambda run: max(os.path.getmtime(path) for path in runs[run]), reverse=True)
+
+    for run in latest[keep:]:
+
+        for path in runs[run]:
+
+            os.remove(path)
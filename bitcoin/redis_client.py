@@ -11,6 +11,35 @@ import redis
 rds = redis.StrictRedis(host='localhost', port=6379, db=0)
 
 
+# The channel on which the tick writer publishes every price sample it records (see bitcoin.trigger)
+TICK_CHANNEL = "ticks"
+
+
+# The key of the counter that is incremented whenever a value is changed using this module (see bitcoin.config)
+KEY_CONFIG_VERSION = "config_version"
+
+# The keys holding the (JSON) state of push_transactions and of the execution of orders, which are not configuration
+KEY_TRANSACTIONS_SYNC = "transactions_sync"
+KEY_EXECUTION = "execution"
+KEY_EXECUTION_LOCK = "execution_lock"
+
+STATE_KEYS = [KEY_CONFIG_VERSION, KEY_TRANSACTIONS_SYNC, KEY_EXECUTION, KEY_EXECUTION_LOCK]
+
+
+def bump_version():
+    """
+    Method for signalling to long-running processes that the configuration has changed.
+    """
+    rds.incr(KEY_CONFIG_VERSION)
+
+
+def parse_bool(value):
+    """
+    Method for converting a flag stored in redis (as the string 'True' or 'False') to a boolean.
+    """
+    return value == 'True'
+
+
 def dump():
     """
     Method for printing a dump of redis keys and corresponding values
@@ -31,7 +60,7 @@ def change():
     reActive = re.compile("^active_.*")
 
     keys = rds.keys()
-    keys = [k for k in keys if not reActive.match(k)]
+    keys = [k for k in keys if not reActive.match(k) and k not in STATE_KEYS]
     keys.sort()
 
     for ii in range(len(keys)):                                             # Print keys with associated values indexed by an integer for choosing.
@@ -50,6 +79,8 @@ def change():
         v = float(v)
         rds.set(keys[jj], v)
 
+        bump_version()
+
 
 def toggle():
     """
@@ -72,6 +103,7 @@ def toggle():
     v = rds.get(keys[jj]) == 'True'         # Convert the string to boolean by performing a comparison
 
     rds.set(keys[jj], not v)      # Flip/Toggle the specified value
+    bump_version()
 
     print("{} set to {}".format(keys[jj], not v))
 
@@ -100,23 +132,25 @@ def load():
     rds.set(KEY_ACTIVE_RISING_PEAK, False)
     rds.set(KEY_ACTIVE_FALLING_TRENCH, False)
 
+    bump_version()
+
 
 # Activation keys and functions
 
 KEY_ACTIVE_ABSOLUTE_ZERO = "active_absolute_zero"
-def active_absolute_zero(): return rds.get(KEY_ACTIVE_ABSOLUTE_ZERO) == 'True'
+def active_absolute_zero(): return parse_bool(rds.get(KEY_ACTIVE_ABSOLUTE_ZERO))
 
 KEY_ACTIVE_MINIMIZE_LOSS = "active_minimize_loss"
-def active_minimize_loss(): return rds.get(KEY_ACTIVE_MINIMIZE_LOSS) == 'True'
+def active_minimize_loss(): return parse_bool(rds.get(KEY_ACTIVE_MINIMIZE_LOSS))
 
 KEY_ACTIVE_MINIMUM_PROFIT = "active_min_profit"
-def active_minimum_profit(): return rds.get(KEY_ACTIVE_MINIMUM_PROFIT) == 'True'
+def active_minimum_profit(): return parse_bool(rds.get(KEY_ACTIVE_MINIMUM_PROFIT))
 
 KEY_ACTIVE_RISING_PEAK = "active_rising_peak"
-def active_rising_peak(): return rds.get(KEY_ACTIVE_RISING_PEAK) == 'True'
+def active_rising_peak(): return parse_bool(rds.get(KEY_ACTIVE_RISING_PEAK))
 
 KEY_ACTIVE_FALLING_TRENCH = "active_falling_trench"
-def active_falling_trench(): return rds.get(KEY_ACTIVE_FALLING_TRENCH) == 'True'
+def active_falling_trench(): return parse_bool(rds.get(KEY_ACTIVE_FALLING_TRENCH))
 
 
 
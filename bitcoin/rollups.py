@@ -0,0 +1,179 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-09
+#
+# Implements rollups of the prices at several resolutions (1 minute, 5 minutes, 1 hour and 1 day) so that long-range
+# views do not have to scan every sample. Each resolution has its own table ("rollups_1m", ...) with one row per time
+# bucket holding the count of samples and, for each of the buy price, the sell price and the spread (buy - sell), the
+# open, high, low and close values and the sum (from which the mean is calculated).
+#
+# The rollups are updated incrementally by the tick writer whenever a price is inserted and can be regenerated from the
+# "prices" table with rebuild() (called by the schema migration that creates the tables).
+#
+# Usage:
+#
+#       python -m bitcoin.rollups rebuild                   - Regenerate the rollups of every resolution
+#       python -m bitcoin.rollups query START END [POINTS]  - Print the rollups of the unix time range at the finest
+#                                                             resolution that returns at most POINTS rows
+
+
+import sys
+
+from bitcoin import schema
+
+
+# The resolutions as tuples (name, bucket size in seconds) from the finest to the coarsest. The tables are created by
+# schema.migration_5.
+RESOLUTIONS = [('1m', 60), ('5m', 300), ('1h', 3600), ('1d', 86400)]
+
+SERIES = ['buy', 'sell', 'spread']
+
+# Expressions of the value of each series in terms of the columns of "prices" ({p} is the prefix of the table alias)
+EXPRESSIONS = {'buy': '{p}"buy"', 'sell': '{p}"sell"', 'spread': '({p}"buy" - {p}"sell")'}
+
+# The columns of the rows returned by query()
+COLUMNS = ['time', 'count'] + ['{}_{}'.format(s, field) for s in SERIES for field in ('open', 'high', 'low', 'close', 'mean')]
+
+
+def table(name):
+
+    return 'rollups_' + name
+
+
+def bucket(time, size):
+    """
+    Returns the start of the bucket of the specified size (in seconds) that contains the time.
+    """
+
+    return time - time % size
+
+
+def update(cursor, time, buy, sell):
+    """
+    Add the prices of a newly inserted tick to the rollups. Ticks are expected in chronological order (the close of a
+    bucket is the latest value added to it).
+    """
+
+    values = (buy, sell, buy - sell)
+
+    for name, size in RESOLUTIONS:
+
+        start = bucket(time, size)
+
+        # A new bucket is opened (with a count of zero) at the values of its first tick, which the UPDATE then adds
+        cursor.execute('''INSERT OR IGNORE INTO "{}" VALUES (?, 0, ?, ?, ?, ?, 0, ?, ?, ?, ?, 0, ?, ?, ?, ?, 0)'''.format(table(name)),
+                       (start,) + tuple(v for v in values for _ in range(4)))
+
+        cursor.execute('''UPDATE "{}" SET "count" = "count" + 1,
+                                          "buy_high" = MAX("buy_high", ?), "buy_low" = MIN("buy_low", ?), "buy_close" = ?, "buy_sum" = "buy_sum" + ?,
+                                          "sell_high" = MAX("sell_high", ?), "sell_low" = MIN("sell_low", ?), "sell_close" = ?, "sell_sum" = "sell_sum" + ?,
+                                          "spread_high" = MAX("spread_high", ?), "spread_low" = MIN("spread_low", ?), "spread_close" = ?, "spread_sum" = "spread_sum" + ?
+                          WHERE "time" = ?'''.format(table(name)),
+                       tuple(v for v in values for _ in range(4)) + (start,))
+
+
+def rebuild(cursor, names=None):
+    """
+    Regenerate the rollups of the specified resolutions (default: all) from the "prices" table.
+
+    The samples of each bucket are aggregated by sqlite in a single pass and the open and close values are looked up by
+    the times of the first and last sample (the primary key of "prices").
+    """
+
+    for name, size in RESOLUTIONS:
+
+        if names and name not in names:
+
+            continue
+
+        aggregates = ", ".join('MAX({e}) AS "{s}_high", MIN({e}) AS "{s}_low", SUM({e}) AS "{s}_sum"'.format(e=EXPRESSIONS[s].format(p=''), s=s) for s in SERIES)
+        columns = ", ".join('{o}, g."{s}_high", g."{s}_low", {c}, g."{s}_sum"'.format(o=EXPRESSIONS[s].format(p='o.'), c=EXPRESSIONS[s].format(p='c.'), s=s) for s in SERIES)
+
+        cursor.execute('''DELETE FROM "{}"'''.format(table(name)))
+
+        cursor.execute('''INSERT INTO "{t}"
+                          SELECT g."bucket", g."count", {columns}
+                          FROM (SELECT "time" - "time" % {size} AS "bucket", MIN("time") AS "first", MAX("time") AS "last", COUNT(*) AS "count", {aggregates}
+                                FROM "prices" GROUP BY "bucket") AS g
+                          JOIN "prices" AS o ON o."time" = g."first"
+                          JOIN "prices" AS c ON c."time" = g."last"
+                          ORDER BY g."bucket"'''.format(t=table(name), size=size, columns=columns, aggregates=aggregates))
+
+
+def resolution(start, end, points):
+    """
+    Returns the (name, size) of the finest resolution at which the time range spans at most 'points' buckets, or the
+    coarsest resolution if even that spans more.
+    """
+
+    for name, size in RESOLUTIONS:
+
+        if bucket(end, size) - bucket(start, size) < points * size:
+
+            return name, size
+
+    return RESOLUTIONS[-1]
+
+
+def query(cursor, start, end, points=1000):
+    """
+    Returns a tuple (resolution name, rows) of the rollups of the buckets overlapping the time range (in chronological
+    order) at the resolution chosen by resolution(). The rows are tuples with the fields listed in COLUMNS.
+    """
+
+    name, size = resolution(start, end, points)
+
+    fields = ", ".join('"{s}_open", "{s}_high", "{s}_low", "{s}_close", "{s}_sum" / "count"'.format(s=s) for s in SERIES)
+
+    rows = cursor.execute('''SELECT "time", "count", {} FROM "{}" WHERE "time" >= ? AND "time" <= ? ORDER BY "time"'''.format(fields, table(name)),
+                          (bucket(start, size), end)).fetchall()
+
+    return name, rows
+
+
+
+if __name__ == '__main__':
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    conn = schema.connect()
+    cursor = conn.cursor()
+
+    if command == 'rebuild':
+
+        rebuild(cursor)
+        conn.commit()
+
+    elif command == 'query':
+
+        name, rows = query(cursor, int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]) if len(sys.argv) > 4 else 1000)
+
+        print("Resolution: {} ({} rows)".format(name, len(rows)))
+        print(" ".join(COLUMNS))
+
+        for row in rows:
+
+            print(" ".join(str(value) for value in row))
+
+    else:
+
+        print("Usage: python -m bitcoin.rollups rebuild | query START END [POINTS]")
+
+    conn.close()
@@ -0,0 +1,245 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-27
+#
+# Implements the versioned schema of the sqlite3 database (data.db) and the function used to connect to it.
+#
+# The version of the schema is stored in the database using "PRAGMA user_version". Every connection made using connect()
+# brings the schema up to date by applying the migrations after the stored version (in order). All statements are
+# idempotent so a database created by hand (version 0) is migrated safely.
+#
+# The database is switched to WAL mode with a busy timeout so that fetch.py (which writes a tick every minute) and
+# ooda.py (which reads the prices and writes transactions) do not block each other.
+#
+# Usage:
+#
+#       python -m bitcoin.schema migrate        - Bring the schema up to date
+#       python -m bitcoin.schema verify         - Print the query plans of the hot queries
+
+
+import sqlite3
+import sys
+
+import bitcoin
+from bitcoin.settings import DB_BUSY_TIMEOUT
+
+
+def rowid_time(cursor, table):
+    """
+    Returns True if the "time" column of the table is an alias for the rowid (INTEGER PRIMARY KEY) in which case the
+    table itself is a b-tree ordered by time and no separate index on time is needed.
+    """
+
+    columns = cursor.execute('''PRAGMA table_info("{}")'''.format(table)).fetchall()        # Rows of (cid, name, type, notnull, default, pk)
+    pks = [c for c in columns if c[5]]
+
+    return len(pks) == 1 and pks[0][1] == 'time' and pks[0][2].upper() == 'INTEGER'
+
+
+def migration_1(cursor):
+    """
+    Create the tables.
+    """
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS "prices" ("time" INTEGER PRIMARY KEY, "buy" REAL, "sell" REAL, "wa_buy" REAL, "wa_sell" REAL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS "diffs" ("time" INTEGER PRIMARY KEY, "d1_buy" REAL, "d1_sell" REAL, "d2_buy" REAL, "d2_sell" REAL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS "averages" ("time" INTEGER PRIMARY KEY, "b_sma" REAL, "b_lma" REAL, "b_delta" REAL, "s_sma" REAL, "s_lma" REAL, "s_delta" REAL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS "transactions" ("time" INTEGER PRIMARY KEY, "usd" REAL, "btc" REAL, "rate" REAL)''')
+
+
+def migration_2(cursor):
+    """
+    Create the table of running aggregates of the prices since the last trade (see bitcoin.aggregates).
+    """
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS "aggregates" ("name" TEXT PRIMARY KEY, "since" INTEGER, "max" REAL, "min" REAL, "count" INTEGER)''')
+
+
+def migration_3(cursor):
+    """
+    Create indexes for the hot access paths:
+
+        "transactions" WHERE "usd" > 0 (or < 0) ORDER BY "time" DESC LIMIT 1       - partial indexes (sells and buys) covering "rate"
+        "prices" WHERE "time" > ?                                                   - covering index on time (unless time is the rowid)
+        "prices" NATURAL JOIN "diffs" ORDER BY "time" DESC                          - covering index on time (unless time is the rowid)
+    """
+
+    cursor.execute('''CREATE INDEX IF NOT EXISTS "transactions_sells" ON "transactions" ("time", "rate") WHERE "usd" > 0''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS "transactions_buys" ON "transactions" ("time", "rate") WHERE "usd" < 0''')
+
+    if not rowid_time(cursor, 'prices'):
+
+        cursor.execute('''CREATE INDEX IF NOT EXISTS "prices_time" ON "prices" ("time", "buy", "sell", "wa_buy", "wa_sell")''')
+
+    if not rowid_time(cursor, 'diffs'):
+
+        cursor.execute('''CREATE INDEX IF NOT EXISTS "diffs_time" ON "diffs" ("time", "d1_buy", "d1_sell")''')
+
+    if not rowid_time(cursor, 'averages'):
+
+        cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS "averages_time" ON "averages" ("time")''')
+
+
+def migration_4(cursor):
+    """
+    Create the table of checkpoints that records the time of the last row processed by a resumable bulk job (see
+    bitcoin.utilities.backfill).
+    """
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS "checkpoints" ("name" TEXT PRIMARY KEY, "time" INTEGER)''')
+
+
+def migration_5(cursor):
+    """
+    Create the tables of the rollups of the prices at each resolution (see bitcoin.rollups) and build them from the
+    existing prices.
+    """
+
+    from bitcoin import rollups         # We import here since bitcoin.rollups uses this module when run as a script
+
+    columns = ", ".join('"{s}_open" REAL, "{s}_high" REAL, "{s}_low" REAL, "{s}_close" REAL, "{s}_sum" REAL'.format(s=s) for s in rollups.SERIES)
+
+    for name, size in rollups.RESOLUTIONS:
+
+        cursor.execute('''CREATE TABLE IF NOT EXISTS "{}" ("time" INTEGER PRIMARY KEY, "count" INTEGER, {})'''.format(rollups.table(name), columns))
+
+    rollups.rebuild(cursor)
+
+
+def migration_6(cursor):
+    """
+    Create the table of the block-level max and min of the prices used for range queries (see bitcoin.extrema). It is
+    built from the existing prices by migration_7.
+    """
+
+    from bitcoin import extrema         # We import here since bitcoin.extrema uses this module when run as a script
+
+    columns = ", ".join('"{c}_max" REAL, "{c}_min" REAL'.format(c=c) for c in extrema.NAMES)
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS "extrema" ("level" INTEGER, "time" INTEGER, {}, PRIMARY KEY ("level", "time"))'''.format(columns))
+
+
+def migration_7(cursor):
+    """
+    Add the number of prices in each block to the "extrema" table (so that the count of prices over a range is found in
+    logarithmic time as well) and build it from the existing prices.
+    """
+
+    from bitcoin import extrema
+
+    cursor.execute('''ALTER TABLE "extrema" ADD COLUMN "count" INTEGER''')
+
+    extrema.rebuild(cursor)
+
+
+# The migrations in order. The schema version of a database is the number of migrations that have been applied to it.
+MIGRATIONS = [migration_1, migration_2, migration_3, migration_4, migration_5, migration_6, migration_7]
+
+
+def version(cursor):
+    """
+    Returns the schema version of the database.
+    """
+
+    return cursor.execute('''PRAGMA user_version''').fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Apply the migrations that have not yet been applied to the database.
+    """
+
+    cursor = conn.cursor()
+    current = version(cursor)
+
+    for ii in range(current, len(MIGRATIONS)):
+
+        MIGRATIONS[ii](cursor)
+        cursor.execute('''PRAGMA user_version = {}'''.format(ii + 1))       # PRAGMA does not accept parameters
+
+        conn.commit()
+
+    cursor.close()
+
+
+def connect(path=None):
+    """
+    Connect to the database (data.db by default) with WAL enabled, a busy timeout and an up to date schema.
+    """
+
+    conn = sqlite3.connect(path or bitcoin.get_db(), timeout=DB_BUSY_TIMEOUT)
+
+    conn.execute('''PRAGMA journal_mode = WAL''')          # Readers and a writer no longer block each other
+    conn.execute('''PRAGMA synchronous = NORMAL''')        # Safe with WAL (a power loss can only lose the last transactions, never corrupt)
+    conn.execute('''PRAGMA busy_timeout = {}'''.format(int(DB_BUSY_TIMEOUT * 1000)))
+
+    migrate(conn)
+
+    return conn
+
+
+# The hot queries whose plans are printed by verify() together with sample parameters.
+QUERIES = [
+    ('''SELECT "time", "rate" FROM "transactions" WHERE "usd" > 0 ORDER BY "time" DESC LIMIT 1''', ()),
+    ('''SELECT "time", "rate" FROM "transactions" WHERE "usd" < 0 ORDER BY "time" DESC LIMIT 1''', ()),
+    ('''SELECT MAX("time") FROM "transactions" WHERE "usd" > 0''', ()),
+    ('''SELECT "time", "buy", "sell", "wa_buy", "wa_sell" FROM "prices" ORDER BY "time" DESC LIMIT 1''', ()),
+    ('''SELECT "buy" FROM "prices" WHERE "time" > ?''', (0,)),
+    ('''SELECT "sell", COALESCE("wa_sell", "sell") FROM "prices" WHERE "time" > ?''', (0,)),
+    ('''SELECT "buy", "sell" FROM "prices" ORDER BY "time" DESC LIMIT ?''', (120,)),
+    ('''SELECT "buy", "sell", "d1_buy", "d1_sell" FROM "prices" NATURAL JOIN "diffs" ORDER BY "time" DESC LIMIT 1''', ()),
+]
+
+
+def verify(conn):
+    """
+    Print the schema version, journal mode and the query plan of each of the hot queries.
+    """
+
+    cursor = conn.cursor()
+
+    print("Schema version: {} of {}".format(version(cursor), len(MIGRATIONS)))
+    print("Journal mode: {}\n".format(cursor.execute('''PRAGMA journal_mode''').fetchone()[0]))
+
+    for query, params in QUERIES:
+
+        print(query)
+
+        for row in cursor.execute('''EXPLAIN QUERY PLAN ''' + query, params):
+
+            print("    " + str(row[-1]))         # The last column is the human readable description of the step
+
+        print("")
+
+    cursor.close()
+
+
+
+if __name__ == '__main__':
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+
+    conn = connect()            # Connecting also migrates the schema
+
+    if command == 'verify':
+
+        verify(conn)
+
+    conn.close()
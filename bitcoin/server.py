@@ -0,0 +1,388 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-06
+#
+# Implements a local stand-in for the BitStamp API so that the client, the actions and the decisions can be exercised
+# (and load-tested) offline. The ticker, balance, user_transactions, open_orders, buy, sell and cancel_order endpoints
+# are served from a SimulatedExchange (see bitcoin.simulation) whose limit orders are matched against a price path that
+# is replayed in the background: either the prices recorded in the database or a synthetic random walk.
+#
+# Authenticated requests must carry a strictly increasing nonce (as on BitStamp) but the signature is not checked.
+# Latency and errors (HTTP 500 responses) can be injected to test how the client copes with a slow or failing API.
+#
+# Usage:
+#
+#       python -m bitcoin.server [options]
+#
+#       --port PORT                 - Port to listen on (default: 8000)
+#       --from TIME / --to TIME     - Unix time range of the recorded prices to replay (default: all)
+#       --synthetic                 - Replay a random walk starting at --price (default: 450) instead
+#       --seed SEED                 - Seed of the random walk and of the injected errors (default: 0)
+#       --interval SECONDS          - Time between successive prices of the path (default: 1)
+#       --usd USD / --btc BTC       - Starting balances (default: $1000 and no BTC)
+#       --fee PERCENT               - Fee charged per trade (default: 0.5)
+#       --latency SECONDS           - Delay added to every response (default: 0)
+#       --jitter SECONDS            - Maximum random delay added on top of the latency (default: 0)
+#       --error-rate P              - Probability of responding with an HTTP 500 instead (default: 0)
+#       --endpoints NAME,...        - Restrict the latency and errors to these endpoints (default: all)
+#       --verbose                   - Log every request
+#
+# The client is pointed at the server using the BITSTAMP_API_URL environment variable, for example:
+#
+#       BITSTAMP_API_URL=http://127.0.0.1:8000/api/ python ooda.py
+
+
+import argparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import json
+import random
+from SocketServer import ThreadingMixIn
+import sys
+import threading
+import time
+import urlparse
+
+from bitcoin import round2, schema
+from bitcoin.simulation import OrderError, SimulatedExchange
+
+
+PUBLIC = ['ticker']
+PRIVATE = ['balance', 'user_transactions', 'open_orders', 'buy', 'sell', 'cancel_order']
+
+
+def recorded(start=None, end=None):
+    """
+    Generate the (time, buy, sell) prices recorded in the database in the time range. The connection is opened by the
+    thread that consumes the prices (sqlite connections can not be shared between threads).
+    """
+
+    conn = schema.connect()
+
+    for values in conn.execute('''SELECT "time", "buy", "sell" FROM "prices" WHERE "time" >= ? AND "time" <= ? ORDER BY "time"''',
+                               (start if start is not None else 0, end if end is not None else 2 ** 62)):
+
+        yield values
+
+    conn.close()
+
+
+def synthetic(price=450.0, spread=1.5, seed=0):
+    """
+    Generate an endless random walk of (time, buy, sell) prices. The time is the current time.
+    """
+
+    rng = random.Random(seed)
+
+    while True:
+
+        price = max(price + rng.gauss(0, 0.5), 10.0)
+
+        buy = round2(price + spread / 2)
+        yield int(time.time()), buy, round2(buy - spread)
+
+
+
+class Market(threading.Thread):
+    """
+    Background thread that moves the exchange along the price path, one price every 'interval' seconds. Once the path
+    is exhausted the last price is held.
+    """
+
+    def __init__(self, exchange, prices, interval=1.0):
+
+        super(Market, self).__init__()
+
+        self.daemon = True
+
+        self.exchange = exchange
+        self.prices = prices
+        self.interval = interval
+
+        self.ready = threading.Event()          # Set once the first price is known
+
+
+    def run(self):
+
+        for t, buy, sell in self.prices:
+
+            for trade in self.exchange.tick(t, buy, sell):
+
+                sys.stderr.write("Filled {} {} BTC at {}\n".format(trade[1], trade[2], trade[3]))
+
+            self.ready.set()
+
+            time.sleep(self.interval)
+
+        self.ready.set()
+
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server holding the simulated exchange and the fault injection options.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, exchange, latency=0.0, jitter=0.0, error_rate=0.0, endpoints=None, seed=0, verbose=False):
+
+        HTTPServer.__init__(self, address, Handler)
+
+        self.exchange = exchange
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.endpoints = endpoints          # Set of the endpoints affected by the latency and errors (None means all)
+        self.verbose = verbose
+
+        self.nonces = {}            # Maps an API key to the last nonce it used
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+
+    def inject(self, endpoint):
+        """
+        Sleep for the configured latency and return True if the request should fail.
+        """
+
+        if self.endpoints is not None and endpoint not in self.endpoints:
+
+            return False
+
+        with self._lock:
+
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            fail = self._rng.random() < self.error_rate
+
+        if delay > 0: time.sleep(delay)
+
+        return fail
+
+
+    def check_nonce(self, key, nonce):
+        """
+        Returns True if the nonce is larger than the last one used with the key (and records it).
+        """
+
+        with self._lock:
+
+            if nonce <= self.nonces.get(key, -1):
+
+                return False
+
+            self.nonces[key] = nonce
+
+            return True
+
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serves the BitStamp endpoints. The endpoint is the last component of the path so any prefix (such as /api/) works.
+    """
+
+    protocol_version = 'HTTP/1.1'           # Keep the connections of the client's pool alive
+
+    def do_GET(self):
+
+        self.dispatch({})
+
+
+    def do_POST(self):
+
+        length = int(self.headers.getheader('Content-Length') or 0)
+        form = urlparse.parse_qs(self.rfile.read(length))
+
+        self.dispatch(dict((key, values[0]) for key, values in form.items()))
+
+
+    def dispatch(self, form):
+
+        endpoint = urlparse.urlsplit(self.path).path.strip('/').split('/')[-1]
+
+        if endpoint not in PUBLIC and endpoint not in PRIVATE:
+
+            return self.respond(404, "Not Found")
+
+        if self.server.inject(endpoint):
+
+            return self.respond(500, "Internal Server Error")
+
+        if endpoint in PRIVATE:
+
+            try:
+                nonce = int(form.get('nonce'))
+
+            except (TypeError, ValueError):
+
+                return self.respond(200, {'error': "Missing key, signature and nonce parameters"})
+
+            if not self.server.check_nonce(form.get('key'), nonce):
+
+                return self.respond(200, {'error': "Invalid nonce"})
+
+        try:
+            response = getattr(self, endpoint)(self.server.exchange, form)
+
+        except OrderError as e:
+
+            response = {'error': e.error}
+
+        except (KeyError, TypeError, ValueError):
+
+            response = {'error': "Invalid parameters"}
+
+        self.respond(200, response)
+
+
+    def respond(self, status, body):
+
+        data = body if isinstance(body, str) else json.dumps(body)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json' if status == 200 else 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+
+        self.wfile.write(data)
+
+
+    def log_message(self, format, *args):
+
+        if self.server.verbose:
+
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+    # The endpoints. Like BitStamp every number is returned as a string.
+
+    def ticker(self, exchange, form):
+
+        buy, sell = exchange.buy, exchange.sell
+
+        return {'ask': str(buy), 'bid': str(sell), 'last': str(sell), 'high': str(buy), 'low': str(sell), 'volume': "0.0",
+                'timestamp': str(exchange.time)}
+
+
+    def balance(self, exchange, form):
+
+        bal = exchange.balance()
+
+        return {'usd_balance': str(bal['usd_balance']), 'btc_balance': str(bal['btc_balance']),
+                'usd_available': str(round2(bal['usd_available'])), 'btc_available': str(round(bal['btc_available'], 8)),
+                'usd_reserved': str(round2(bal['usd_balance'] - bal['usd_available'])),
+                'btc_reserved': str(round(bal['btc_balance'] - bal['btc_available'], 8)), 'fee': str(bal['fee'])}
+
+
+    def user_transactions(self, exchange, form):
+
+        trades = exchange.transactions(int(form.get('offset', 0)), int(form.get('limit', 100)), form.get('sort', 'desc'))
+
+        for trade in trades:
+
+            for key in ('usd', 'btc', 'btc_usd', 'fee'):
+
+                trade[key] = str(trade[key])
+
+        return trades
+
+
+    def open_orders(self, exchange, form):
+
+        return [{'id': order['id'], 'datetime': time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()), 'type': 0 if order['type'] == 'buy' else 1,
+                 'price': str(order['price']), 'amount': str(order['amount'])} for order in exchange.open_orders()]
+
+
+    def buy(self, exchange, form):
+
+        return self._order(exchange, 'buy', form)
+
+
+    def sell(self, exchange, form):
+
+        return self._order(exchange, 'sell', form)
+
+
+    def _order(self, exchange, kind, form):
+
+        response = exchange.place(kind, float(form['amount']), float(form['price']))
+
+        response['price'] = str(response['price'])
+        response['amount'] = str(response['amount'])
+        response['datetime'] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+        return response
+
+
+    def cancel_order(self, exchange, form):
+
+        return exchange.cancel(int(form['id']))
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the BitStamp API.")
+
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--from', dest='start', type=int)
+    parser.add_argument('--to', dest='end', type=int)
+    parser.add_argument('--synthetic', action='store_true')
+    parser.add_argument('--price', type=float, default=450.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--interval', type=float, default=1.0)
+    parser.add_argument('--usd', type=float, default=1000.0)
+    parser.add_argument('--btc', type=float, default=0.0)
+    parser.add_argument('--fee', type=float, default=0.5)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', dest='error_rate', type=float, default=0.0)
+    parser.add_argument('--endpoints')
+    parser.add_argument('--verbose', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.synthetic:
+
+        prices = synthetic(args.price, seed=args.seed)
+
+    else:
+
+        prices = recorded(args.start, args.end)
+
+    exchange = SimulatedExchange(args.usd, args.btc, args.fee)
+
+    market = Market(exchange, prices, args.interval)
+    market.start()
+    market.ready.wait()
+
+    server = StandInServer(('127.0.0.1', args.port), exchange, args.latency, args.jitter, args.error_rate,
+                           set(args.endpoints.split(',')) if args.endpoints else None, args.seed, args.verbose)
+
+    print("Serving the BitStamp API at http://127.0.0.1:{}/api/".format(args.port))
+
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+
+        pass
@@ -19,6 +19,9 @@
 # Implements the various settings/values used to make determinations during the decision-making phase of the OODA cycle.
 
 
+import os
+
+
 # We set the margin within which the sell price is NOT changed in a purge.
 
 SELL_PRICE_DROP_FACTOR = 99.75 / 100            # The percentage of the sell price to which if it drops the purge needs to reset to the sell price.
@@ -29,10 +32,41 @@ SELL_PRICE_RISE_FACTOR = 100.5 / 100            # The pecerntage of the sell pri
 BUY_PRICE_DROP_FACTOR = 99.5 / 100              # The %age of the buy price to which if it drop the acquire is cancelled and the price can be re-analyzed on the next OODA cycle.
 BUY_PRICE_RISE_FACTOR = 100.25 / 100            # The %age of the buy price to which if it rises the acquire needs to reset to the new buy price otherwise we will be unable to buy btc.
 
-
-TRANSACTION_INTERVAL = 20           # The interval in seconds between updating the order in a purge or acquire
-
 # The number of samples used to calculate the short and long moving averages:
 
 SMA_SAMPLES = 60
 LMA_SAMPLES = 120
+
+
+TICK_INTERVAL = 60          # The interval in seconds between price samples when fetch.py is run as a daemon (fetch.py --daemon)
+
+# Settings for the pool of keep-alive connections used to communicate with the BitStamp API:
+
+HTTP_POOL_SIZE = 2          # Maximum number of idle connections kept open per host
+HTTP_TIMEOUT = 10           # Timeout in seconds for connecting and for each socket operation of a request
+
+# Time-to-live in seconds of the account state cached by the client. The cache is invalidated whenever an order is placed or cancelled.
+
+ACCOUNT_CACHE_TTL = 5           # Balance and open orders
+FEE_CACHE_TTL = 3600            # The fee %age changes very rarely (it depends on the 30 day trading volume)
+
+# Base URL of the BitStamp API. It can be overridden using the BITSTAMP_API_URL environment variable (to point the client at a local stand-in server for example).
+
+API_URL = os.environ.get('BITSTAMP_API_URL', "https://www.bitstamp.net/api/")
+
+DB_BUSY_TIMEOUT = 30            # Time in seconds a connection to the database waits for a lock held by another process before giving up
+
+# Settings for the event-driven OODA loop (ooda.py --watch):
+
+OODA_EPSILON = 0.5          # Change in USD of the buy or sell price (since the last evaluation) that triggers an evaluation
+OODA_HEARTBEAT = 300        # Maximum interval in seconds between evaluations (even if the price has not moved)
+
+# Path of the file the tracing spans are appended to (see bitcoin.tracing). Tracing is disabled unless the BITCOIN_TRACE_FILE environment variable is set.
+
+TRACE_FILE = os.environ.get('BITCOIN_TRACE_FILE')
+
+# Settings for the --profile switch of the scripts (see bitcoin.profiling):
+
+PROFILE_DIR = os.environ.get('BITCOIN_PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'profiles'))
+PROFILE_KEEP = 20               # Number of profiled runs kept in PROFILE_DIR (the oldest are deleted)
+PROFILE_INTERVAL = 0.005        # Seconds of CPU time between samples
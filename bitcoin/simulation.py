@@ -0,0 +1,449 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-03
+#
+# Implements in-memory stand-ins for the BitStamp exchange and the redis database so that the real decisions and
+# actions can be run against recorded prices (see bitcoin.backtest).
+#
+#       FakeRedis               - the subset of the redis.StrictRedis interface used by the application
+#       SimulatedExchange       - balances, limit orders filled against the recorded bid (sell) and ask (buy) prices,
+#                                 fees and a log of the trades (also served over HTTP by bitcoin.server)
+#       install()               - point bitcoin.client and every module level redis handle at the stand-ins
+
+
+from contextlib import contextmanager
+import datetime
+import math
+import threading
+import time
+
+import bitcoin.client as client
+import bitcoin.config as config
+import bitcoin.redis_client as redis_client
+
+
+class FakeRedis(object):
+    """
+    In-memory stand-in for redis.StrictRedis. Values are stored as strings just like redis does.
+    """
+
+    def __init__(self):
+
+        self.data = {}
+        self.expiry = {}
+
+
+    def _alive(self, key):
+
+        expiry = self.expiry.get(key)
+
+        if expiry is not None and expiry <= time.time():
+
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+
+        return key in self.data
+
+
+    def get(self, key):
+
+        return self.data.get(key) if self._alive(key) else None
+
+
+    def mget(self, keys):
+
+        return [self.get(key) for key in keys]
+
+
+    def set(self, key, value, ex=None, nx=False):
+
+        if nx and self._alive(key):
+
+            return None
+
+        self.data[key] = str(value)
+        self.expiry.pop(key, None)
+
+        if ex is not None:
+
+            self.expiry[key] = time.time() + ex
+
+        return True
+
+
+    def delete(self, *keys):
+
+        count = 0
+
+        for key in keys:
+
+            if self._alive(key):
+
+                del self.data[key]
+                count += 1
+
+        return count
+
+
+    def exists(self, key):
+
+        return int(self._alive(key))
+
+
+    def incr(self, key):
+
+        value = int(self.get(key) or 0) + 1
+        self.data[key] = str(value)
+
+        return value
+
+
+    def keys(self, pattern='*'):
+
+        return [key for key in self.data.keys() if self._alive(key)]
+
+
+    def publish(self, channel, message):
+
+        return 0            # Nobody is listening
+
+
+    def config_get(self, name):
+
+        return {}           # No keyspace notifications so the config snapshot relies on the version counter
+
+
+    def pipeline(self, transaction=True):
+
+        return FakePipeline(self)
+
+
+
+class FakePipeline(object):
+    """
+    Queues commands and runs them on execute() (there is no round trip to save in memory).
+    """
+
+    def __init__(self, rds):
+
+        self.rds = rds
+        self.commands = []
+
+
+    def __getattr__(self, name):
+
+        method = getattr(self.rds, name)
+
+        def queue(*args, **kwargs):
+
+            self.commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+
+    def execute(self):
+
+        results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+
+        return results
+
+
+
+class SimulatedExchange(object):
+    """
+    Simulates the BitStamp account. Implements the client functions that talk to the API (current_price, balance,
+    open_orders, cancel_order, buy_order and sell_order) in terms of an internal order book.
+
+    A buy (limit) order fills at its price once the ask (recorded buy price) is at or below it and a sell order once the
+    bid (recorded sell price) is at or above it. Orders are checked against the current prices as soon as they are placed
+    and then on every tick. Like BitStamp the funds of an open order are reserved and the fee (a percentage of the
+    USD value, rounded up to the cent) is charged in USD.
+    """
+
+    def __init__(self, usd=1000.0, btc=0.0, fee=0.5):
+
+        self.usd = float(usd)
+        self.btc = float(btc)
+        self.fee = float(fee)
+
+        self.time = None
+        self.buy = None
+        self.sell = None
+
+        self.orders = {}            # Maps the id of every open order to a dictionary (id, type, amount, price)
+        self.trades = []            # Tuples (time, type, amount, price, usd value, fee, usd balance, btc balance, order id)
+
+        self._next_id = 1
+        self._lock = threading.Lock()           # The stand-in server (see bitcoin.server) handles requests concurrently
+
+
+    def tick(self, time, buy, sell):
+        """
+        Move the market to the new prices and fill the open orders that are now matched. Returns the list of trades
+        carried out.
+        """
+
+        with self._lock:
+
+            self.time = time
+            self.buy = buy
+            self.sell = sell
+
+            filled = []
+
+            for order in list(self.orders.values()):
+
+                trade = self._match(order)
+
+                if trade: filled.append(trade)
+
+            return filled
+
+
+    def equity(self):
+        """
+        Returns the value in USD of the account if the BTC were sold at the current sell price.
+        """
+
+        return self.usd + self.btc * (self.sell or 0)
+
+
+    def _reserved(self, kind):
+
+        if kind == 'buy':
+
+            return sum(o['amount'] * o['price'] for o in self.orders.values() if o['type'] == 'buy')
+
+        return sum(o['amount'] for o in self.orders.values() if o['type'] == 'sell')
+
+
+    def _match(self, order):
+
+        if order['type'] == 'buy' and self.buy is not None and self.buy <= order['price']:
+
+            return self._fill(order)
+
+        if order['type'] == 'sell' and self.sell is not None and self.sell >= order['price']:
+
+            return self._fill(order)
+
+        return None
+
+
+    def _fill(self, order):
+
+        del self.orders[order['id']]
+
+        value = order['amount'] * order['price']
+        fee = math.ceil(round(value * self.fee, 6)) / 100.0            # fee %age of the value rounded up to the cent
+
+        if order['type'] == 'buy':
+
+            self.usd -= value + fee
+            self.btc += order['amount']
+
+        else:
+
+            self.usd += value - fee
+            self.btc -= order['amount']
+
+        self.usd = round(self.usd, 2)
+        self.btc = round(self.btc, 8)
+
+        trade = (self.time, order['type'], order['amount'], order['price'], round(value, 2), fee, self.usd, self.btc, order['id'])
+        self.trades.append(trade)
+
+        return trade
+
+
+    # The client API:
+
+    def current_price(self):
+
+        return {'buy': self.buy, 'sell': self.sell}
+
+
+    def balance(self, fresh=False):
+
+        with self._lock:
+
+            return {'usd_balance': self.usd, 'btc_balance': self.btc, 'fee': self.fee,
+                    'usd_available': self.usd - self._reserved('buy'), 'btc_available': self.btc - self._reserved('sell')}
+
+
+    def fee_percentage(self):
+
+        return self.fee
+
+
+    def transactions(self, offset=0, limit=100, sort='desc'):
+        """
+        Returns the trades in the format of the BitStamp user_transactions endpoint.
+        """
+
+        with self._lock:
+
+            trades = [{'id': ii + 1,
+                       'datetime': datetime.datetime.utcfromtimestamp(t[0]).strftime("%Y-%m-%d %H:%M:%S"),
+                       'type': 2,
+                       'usd': t[4] if t[1] == 'sell' else -t[4],
+                       'btc': -t[2] if t[1] == 'sell' else t[2],
+                       'btc_usd': t[3],
+                       'fee': t[5],
+                       'order_id': t[8]} for ii, t in enumerate(self.trades)]
+
+        if sort == 'desc':
+
+            trades.reverse()
+
+        return trades[offset:offset + limit]
+
+
+    def open_orders(self):
+
+        with self._lock:
+
+            return [dict(order) for order in self.orders.values()]
+
+
+    def cancel_order(self, id):
+
+        response = self.cancel(id)
+        client.orders.pop(id, None)
+
+        return response
+
+
+    def buy_order(self, amount, price):
+
+        return client.track('buy', float(amount), price, self.place('buy', amount, price))
+
+
+    def sell_order(self, amount, price):
+
+        return client.track('sell', float(amount), price, self.place('sell', amount, price))
+
+
+    # The order book (shared by the client API above and the stand-in server, see bitcoin.server):
+
+    def cancel(self, id):
+        """
+        Remove an open order from the book. Raises OrderError if there is no such order.
+        """
+
+        with self._lock:
+
+            if id not in self.orders:
+
+                raise OrderError("Order not found")
+
+            del self.orders[id]
+
+            return True
+
+
+    def place(self, kind, amount, price):
+        """
+        Place a limit order and return the response of the BitStamp API. Raises OrderError if there are not enough
+        funds available.
+        """
+
+        amount = float(amount)
+        price = round(float(price), 2)          # BitStamp only accepts prices in whole cents
+
+        with self._lock:
+
+            if kind == 'buy':
+
+                cost = amount * price * (1 + self.fee / 100.0)
+
+                if amount <= 0 or cost > self.usd - self._reserved('buy') + 1e-9:
+
+                    raise OrderError("You need {} USD to open that order.".format(round(cost, 2)))
+
+            else:
+
+                if amount <= 0 or amount > self.btc - self._reserved('sell') + 1e-9:
+
+                    raise OrderError("You have only {} BTC available.".format(self.btc - self._reserved('sell')))
+
+            order = {'id': self._next_id, 'type': kind, 'amount': amount, 'price': price}
+
+            self._next_id += 1
+            self.orders[order['id']] = order
+
+            self._match(order)          # A marketable order fills straight away
+
+        return {'id': order['id'], 'type': 0 if kind == 'buy' else 1, 'amount': amount, 'price': price}
+
+
+
+class OrderError(client.ClientException):
+    """
+    Raised by the simulated exchange when BitStamp would have responded with an error. The message of the API is
+    kept in 'error'.
+    """
+
+    def __init__(self, error):
+
+        super(OrderError, self).__init__("API Error: " + error)
+        self.error = error
+
+
+
+@contextmanager
+def install(exchange, rds):
+    """
+    Point the client functions that talk to the API at the simulated exchange and every module level redis handle at
+    the fake redis for the duration of the with block.
+    """
+
+    import bitcoin.decisions.falling_trench as falling_trench         # We import here to avoid a circular import
+    import bitcoin.decisions.rising_peak as rising_peak
+
+    patches = [
+        (client, 'current_price', exchange.current_price),
+        (client, 'balance', exchange.balance),
+        (client, 'fee', exchange.fee_percentage),
+        (client, 'open_orders', exchange.open_orders),
+        (client, 'transactions', exchange.transactions),
+        (client, 'cancel_order', exchange.cancel_order),
+        (client, 'buy_order', exchange.buy_order),
+        (client, 'sell_order', exchange.sell_order),
+        (client, 'orders', {}),
+        (redis_client, 'rds', rds),
+        (rising_peak, 'rds', rds),
+        (falling_trench, 'rds', rds),
+        (config, '_snapshot', config.Snapshot(rds)),
+    ]
+
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+
+    for module, name, value in patches:
+
+        setattr(module, name, value)
+
+    try:
+        yield
+
+    finally:
+
+        for module, name, value in originals:
+
+            setattr(module, name, value)
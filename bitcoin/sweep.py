@@ -0,0 +1,242 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-04
+#
+# Implements a sweep over the configuration values (thresholds and factors) of the decisions. Every parameter set is
+# backtested (see bitcoin.backtest) in a pool of worker processes and the best sets are reported with their P&L,
+# maximum drawdown and number of trades.
+#
+# The prices are loaded once in to shared memory (one array per column) which the workers inherit when they are forked,
+# so the history is never pickled and sent to each worker.
+#
+# Usage:
+#
+#       python -m bitcoin.sweep [options]
+#
+#       --grid KEY=V1,V2,...        - Values of a key to sweep over (every combination of the grid keys is tested)
+#       --random KEY=LOW:HIGH       - Range of a key from which values are sampled uniformly
+#       --samples N                 - Number of random samples (of all --random keys) per grid point (default: 20)
+#       --seed SEED                 - Seed of the random samples (default: 0)
+#       --set KEY=VALUE             - Fixed configuration value used by every backtest
+#       --processes N               - Number of worker processes (default: number of CPUs)
+#       --top N                     - Number of parameter sets reported (default: 10)
+#       --csv FILE                  - Also write the results of every parameter set as csv
+#       --from, --to, --usd, --btc, --fee      - As for bitcoin.backtest
+#
+# Example:
+#
+#       python -m bitcoin.sweep --grid rising_peak_upper_limit_factor=1.005,1.01,1.02 --random min_profit_band_lower_factor=1.004:1.012
+
+
+import argparse
+import csv
+from itertools import izip, product
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import random
+
+from bitcoin import schema
+from bitcoin.backtest import Backtest, parse_settings, read_prices
+
+
+COLUMNS = 5         # time, buy, sell, wa_buy, wa_sell
+
+# The shared price arrays (set in each worker by _initialize) and the options common to every backtest
+_prices = None
+_options = None
+
+
+def load(cursor, start=None, end=None):
+    """
+    Load the prices in the time range in to shared memory. Returns a list of RawArrays (one per column). A missing
+    weighted average is stored as NaN.
+    """
+
+    rows = read_prices(cursor, start, end).fetchall()
+
+    arrays = [RawArray('d', len(rows)) for _ in range(COLUMNS)]
+
+    for column in range(COLUMNS):
+
+        arrays[column][:] = [value if value is not None else float('nan') for value in (row[column] for row in rows)]
+
+    return arrays
+
+
+def rows(arrays):
+    """
+    Returns an iterator over the price rows stored in the shared arrays.
+    """
+
+    for t, buy, sell, wa_buy, wa_sell in izip(*arrays):
+
+        yield (int(t), buy, sell, wa_buy if wa_buy == wa_buy else None, wa_sell if wa_sell == wa_sell else None)       # NaN != NaN
+
+
+def grid(values):
+    """
+    Returns the list of parameter dictionaries of every combination of the values (a dictionary mapping each key to a
+    list of values).
+    """
+
+    keys = sorted(values.keys())
+
+    return [dict(zip(keys, combination)) for combination in product(*[values[key] for key in keys])]
+
+
+def sample(ranges, count, rng):
+    """
+    Returns a list of 'count' parameter dictionaries sampled uniformly from the ranges (a dictionary mapping each key to
+    a tuple (low, high)).
+    """
+
+    keys = sorted(ranges.keys())
+
+    return [dict((key, round(rng.uniform(*ranges[key]), 6)) for key in keys) for _ in range(count)]
+
+
+def candidates(grid_values, random_ranges, samples, seed=0):
+    """
+    Returns the list of parameter sets to test: every grid point combined with 'samples' random samples (or just the
+    grid points if there are no random ranges).
+    """
+
+    points = grid(grid_values) if grid_values else [{}]
+
+    if not random_ranges:
+
+        return points
+
+    rng = random.Random(seed)
+    params = []
+
+    for point in points:
+
+        for extra in sample(random_ranges, samples, rng):
+
+            extra.update(point)
+            params.append(extra)
+
+    return params
+
+
+def _initialize(arrays, options):
+
+    global _prices, _options
+
+    _prices = arrays
+    _options = options
+
+
+def _evaluate(params):
+    """
+    Backtest a single parameter set (in a worker) and return its summary together with the parameters.
+    """
+
+    settings = dict(_options['settings'])
+    settings.update(params)
+
+    result = Backtest(settings, _options['usd'], _options['btc'], _options['fee']).run(rows(_prices))
+    result['params'] = params
+
+    return result
+
+
+def sweep(arrays, params, settings=None, usd=1000.0, btc=0.0, fee=0.5, processes=None):
+    """
+    Backtest every parameter set using a pool of processes and return the results sorted by P&L (best first).
+    """
+
+    options = {'settings': settings or {}, 'usd': usd, 'btc': btc, 'fee': fee}
+
+    pool = multiprocessing.Pool(processes, _initialize, (arrays, options))
+
+    try:
+        results = pool.map(_evaluate, params, chunksize=1)
+
+    finally:
+
+        pool.close()
+        pool.join()
+
+    results.sort(key=lambda r: (-r['pnl'], r['max_drawdown']))
+
+    return results
+
+
+def write_csv(path, results):
+    """
+    Write the results (one row per parameter set) to a csv file.
+    """
+
+    keys = sorted(set(key for r in results for key in r['params']))
+
+    with open(path, 'wb') as fout:
+
+        writer = csv.writer(fout)
+        writer.writerow(keys + ['pnl', 'max_drawdown', 'trades', 'final_equity'])
+
+        for r in results:
+
+            writer.writerow([r['params'].get(key) for key in keys] + [r['pnl'], r['max_drawdown'], r['trades'], r['final_equity']])
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Backtest a sweep of configuration values in parallel.")
+
+    parser.add_argument('--grid', action='append', default=[])
+    parser.add_argument('--random', action='append', default=[])
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--set', dest='settings', action='append', default=[])
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--csv')
+    parser.add_argument('--from', dest='start', type=int)
+    parser.add_argument('--to', dest='end', type=int)
+    parser.add_argument('--usd', type=float, default=1000.0)
+    parser.add_argument('--btc', type=float, default=0.0)
+    parser.add_argument('--fee', type=float, default=0.5)
+
+    args = parser.parse_args()
+
+    grid_values = dict((key, [float(v) for v in values.split(',')]) for key, values in parse_settings(args.grid).items())
+    random_ranges = dict((key, tuple(float(v) for v in bounds.split(':'))) for key, bounds in parse_settings(args.random).items())
+
+    params = candidates(grid_values, random_ranges, args.samples, args.seed)
+
+    conn = schema.connect()
+    arrays = load(conn.cursor(), args.start, args.end)
+    conn.close()
+
+    print("Backtesting {} parameter sets over {} prices".format(len(params), len(arrays[0])))
+
+    results = sweep(arrays, params, parse_settings(args.settings), args.usd, args.btc, args.fee, args.processes)
+
+    if args.csv:
+
+        write_csv(args.csv, results)
+
+    for r in results[:args.top]:
+
+        print("pnl: {:>10.2f} - drawdown: {:>6.2%} - trades: {:>4} - {}".format(r['pnl'], r['max_drawdown'], r['trades'],
+                " ".join("{}={}".format(key, value) for key, value in sorted(r['params'].items()))))
@@ -0,0 +1,216 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-20
+#
+# Implements the writer that records a price sample (tick) in the "prices", "diffs" and "averages" tables.
+#
+# The writer keeps a single connection to the database and in-memory rolling windows of the latest prices so that
+# after it has been primed once it never has to read back the values it has itself written. This allows it to be used
+# both for a single insert (cron) and as a long-running daemon that samples at a sub-minute interval.
+#
+# Every recorded sample is published on the redis channel redis_client.TICK_CHANNEL so that the event-driven OODA loop
+# (ooda.py --watch) wakes up as soon as the price moves.
+
+
+from collections import deque
+from itertools import islice
+import json
+import sys
+import time
+
+from bitcoin import aggregates, client, extrema, rollups, round2, tracing
+import bitcoin.redis_client as redis_client
+from bitcoin.settings import SMA_SAMPLES, LMA_SAMPLES
+from bitcoin.utilities.weighted_average import single_weighted_average, NUM_WEIGHING_SAMPLES, WEIGHING_FUNCTION
+from bitcoin.utilities.moving_averages import LinearWeightedAverage
+
+
+WINDOW = max(LMA_SAMPLES, NUM_WEIGHING_SAMPLES)         # Number of past samples that must be kept in memory to calculate all averages
+
+
+def warning(msg):
+    """
+    Method for printing a warning to stderr.
+    """
+    sys.stderr.write("WARNING: " + msg + "\n")
+
+
+class TickWriter:
+    """
+    This class encapsulates the connection to the database and the rolling windows of prices needed to calculate the
+    weighted averages, finite differences and moving averages of a new price sample.
+    """
+
+    def __init__(self, conn):
+        """
+        Initialization method. We take ownership of the passed in sqlite3 connection and prime the rolling windows from
+        the database. This is the ONLY time the writer reads from the database.
+        """
+
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+        self.buy = deque(maxlen=NUM_WEIGHING_SAMPLES)         # Rolling windows of prices in chronological order (latest value at the right end)
+        self.sell = deque(maxlen=NUM_WEIGHING_SAMPLES)
+
+        # Streaming estimators for the short and long moving averages of the buy and sell prices
+        self.b_sma = LinearWeightedAverage(SMA_SAMPLES)
+        self.b_lma = LinearWeightedAverage(LMA_SAMPLES)
+        self.s_sma = LinearWeightedAverage(SMA_SAMPLES)
+        self.s_lma = LinearWeightedAverage(LMA_SAMPLES)
+
+        rows = self.cursor.execute('''SELECT "buy", "sell" FROM "prices" ORDER BY "time" DESC LIMIT ?''', (WINDOW,)).fetchall()
+
+        for values in reversed(rows):
+
+            self._push(values[0], values[1])
+
+        # We JOIN the "prices" and "diffs" table NATURALly (which means on the common columns, in this case only "time") and then extract the latest value of the prices and 1st finite
+        # difference. We will use these to calculate the 1st and 2nd finite differences of the next tick.
+        values = self.cursor.execute('''SELECT "buy", "sell", "d1_buy", "d1_sell" FROM "prices" NATURAL JOIN "diffs" ORDER BY "time" DESC LIMIT 1''').fetchone()
+
+        self.last_buy = values[0]
+        self.last_sell = values[1]
+        self.last_d1_buy = values[2]
+        self.last_d1_sell = values[3]
+
+
+    @tracing.traced('tick.insert')
+    def insert(self, now, buy, sell):
+        """
+        Calculate all derived values for the price sample and write them to the database. The rolling windows are
+        updated in place so the next insert does not need to query the database.
+        """
+
+        tracing.tick(now)           # The sample's time is the id that follows it through the OODA cycle
+
+        buy = float(buy)
+        sell = float(sell)
+
+        # The weighted average uses the previous (NUM_WEIGHING_SAMPLES - 1) prices in REVERSE chronological order with the current value appended at the end
+        s_buy = list(islice(reversed(self.buy), NUM_WEIGHING_SAMPLES - 1))
+        s_sell = list(islice(reversed(self.sell), NUM_WEIGHING_SAMPLES - 1))
+
+        s_buy.append(buy)
+        s_sell.append(sell)
+
+        wbuy = single_weighted_average(s_buy, NUM_WEIGHING_SAMPLES, WEIGHING_FUNCTION)
+        wsell = single_weighted_average(s_sell, NUM_WEIGHING_SAMPLES, WEIGHING_FUNCTION)
+
+        d1_buy = round2( buy - self.last_buy )             # Calculate the finite differences and round to 2 decimal places
+        d1_sell = round2( sell - self.last_sell )
+
+        d2_buy = round2( d1_buy - self.last_d1_buy )
+        d2_sell = round2( d1_sell - self.last_d1_sell )
+
+        self.cursor.execute('''INSERT INTO "prices" ("time", "buy", "sell", "wa_buy", "wa_sell") VALUES (?, ?, ?, ?, ?)''', (now, buy, sell, wbuy, wsell))
+
+        self.cursor.execute('''INSERT INTO "diffs" ("time", "d1_buy", "d1_sell", "d2_buy", "d2_sell") VALUES (?, ?, ?, ?, ?)''', (now, d1_buy, d1_sell, d2_buy, d2_sell))
+
+        aggregates.update(self.cursor, now, buy, sell, wsell)          # Update the running aggregates of the prices since the last trade
+        rollups.update(self.cursor, now, buy, sell)
+        extrema.update(self.cursor, now, buy, sell, wbuy, wsell)
+
+        # Update the rolling windows and estimators with the values just written
+        b_lma, b_sma, s_lma, s_sma = self._push(buy, sell)
+
+        self.last_buy = buy
+        self.last_sell = sell
+        self.last_d1_buy = d1_buy
+        self.last_d1_sell = d1_sell
+
+        # Calculate deltas between the moving averages:
+
+        b_delta = round2(b_sma - b_lma)
+        s_delta = round2(s_sma - s_lma)
+
+        self.cursor.execute('''INSERT INTO "averages" ("time", "b_sma", "b_lma", "b_delta", "s_sma", "s_lma", "s_delta") VALUES (?, ?, ?, ?, ?, ?, ?)''', (now, b_sma, b_lma, b_delta, s_sma, s_lma, s_delta))
+
+        self.conn.commit()
+
+        self.publish(now, buy, sell)
+
+
+    def publish(self, now, buy, sell):
+        """
+        Publish the price sample (after it has been committed). A failure to publish is logged but does not affect the
+        recording of prices.
+        """
+
+        try:
+            redis_client.rds.publish(redis_client.TICK_CHANNEL, json.dumps({'time': now, 'buy': buy, 'sell': sell}))
+
+        except Exception as e:
+
+            warning("Unable to publish tick: {}".format(e))
+
+
+    def _push(self, buy, sell):
+        """
+        Add a price sample to the rolling windows and moving average estimators. Returns the updated long and short
+        moving averages of the buy and sell prices.
+        """
+
+        self.buy.append(buy)
+        self.sell.append(sell)
+
+        return self.b_lma.push(buy), self.b_sma.push(buy), self.s_lma.push(sell), self.s_sma.push(sell)
+
+
+    def run(self, interval):
+        """
+        Run as a daemon, fetching and inserting a price sample every 'interval' seconds (which can be less than a minute).
+
+        A failure to fetch the price is logged and the sample skipped so that a transient network error does not kill the daemon.
+        """
+
+        next_sample = time.time()
+
+        while True:
+
+            try:
+                data = client.current_price()
+
+            except Exception as e:
+
+                warning("Unable to fetch current price: {}".format(e))
+
+            else:
+
+                self.insert(int(time.time()), data['buy'], data['sell'])
+
+            tracing.flush()
+
+            next_sample += interval
+            delay = next_sample - time.time()
+
+            if delay > 0:
+
+                time.sleep(delay)
+
+            else:           # We have fallen behind (a slow request) so we reset the schedule instead of sampling in a burst
+
+                next_sample = time.time()
+
+
+    def close(self):
+        """
+        Close the connection to the database.
+        """
+
+        self.cursor.close()
+        self.conn.close()
@@ -0,0 +1,255 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-05-07
+#
+# Implements lightweight span instrumentation used to find out where the time of a cycle goes (push_transactions, the
+# balance call, the sqlite reads of Data, each decision and each client order call).
+#
+# Tracing is enabled by setting the BITCOIN_TRACE_FILE environment variable to the path of the trace file (see
+# settings.TRACE_FILE). When it is not set span() returns a shared no-op object and traced() leaves the functions
+# undecorated so the instrumentation costs (next to) nothing.
+#
+# The spans of a process are buffered in memory and appended to the trace file (one JSON object per line) by flush(),
+# which ooda.py and the tick writer call at the end of every cycle and which also runs when the process exits. Every
+# span written by a flush is labelled with the current tick id: the time of the price sample being processed, which
+# follows a price from the fetch.py insert through the OODA cycle that evaluates it.
+#
+# Usage:
+#
+#       python -m bitcoin.tracing [FILE] [--since TIME]
+#
+#       Summarize the trace file (default: settings.TRACE_FILE) reporting the count and the p50/p95/p99/max duration of
+#       every phase. --since only takes in to account the spans that started after the unix TIME.
+
+
+import argparse
+import atexit
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+from bitcoin.settings import TRACE_FILE
+
+
+_pending = []               # The finished spans (name, start, duration) not yet written to the trace file
+_tick = [None]              # The id of the tick being processed
+_lock = threading.Lock()            # Spans are recorded by the background threads of async_client too
+
+
+class Span(object):
+    """
+    Context manager that records the time taken by the code it encloses.
+    """
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+
+        self.name = name
+
+
+    def __enter__(self):
+
+        self.start = time.time()
+
+        return self
+
+
+    def __exit__(self, *exc):
+
+        duration = time.time() - self.start
+
+        with _lock:
+
+            _pending.append((self.name, self.start, duration))
+
+
+
+class NoSpan(object):
+    """
+    Stand-in for Span when tracing is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+
+        return self
+
+
+    def __exit__(self, *exc):
+
+        pass
+
+
+_NO_SPAN = NoSpan()
+
+
+def span(name):
+    """
+    Returns a context manager that records a span with the specified name (or does nothing if tracing is disabled).
+    """
+
+    return Span(name) if TRACE_FILE else _NO_SPAN
+
+
+def traced(name):
+    """
+    Decorator recording a span for every call of the decorated function. The function is returned unchanged if tracing
+    is disabled.
+    """
+
+    def decorate(function):
+
+        if not TRACE_FILE:
+
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+
+            with Span(name):
+
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def tick(id):
+    """
+    Set the id of the tick being processed (the time of the price sample).
+    """
+
+    _tick[0] = id
+
+
+def flush():
+    """
+    Append the pending spans, labelled with the current tick id, to the trace file.
+    """
+
+    with _lock:
+
+        spans = _pending[:]
+        del _pending[:]
+
+    if not spans or not TRACE_FILE:
+
+        return
+
+    pid = os.getpid()
+    lines = "".join(json.dumps({'tick': _tick[0], 'name': name, 'start': round(start, 6), 'duration': round(duration, 6), 'pid': pid}) + "\n"
+                    for name, start, duration in spans)
+
+    with open(TRACE_FILE, 'a') as fout:         # A single write in append mode so that concurrent processes do not interleave lines
+
+        fout.write(lines)
+
+
+if TRACE_FILE:
+
+    atexit.register(flush)
+
+
+def read(path, since=None):
+    """
+    Returns an iterator over the spans (dictionaries) stored in the trace file. Malformed lines (a process killed while
+    writing) are skipped.
+    """
+
+    with open(path) as fin:
+
+        for line in fin:
+
+            try:
+                record = json.loads(line)
+
+            except ValueError:
+
+                continue
+
+            if since is None or record['start'] >= since:
+
+                yield record
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile (nearest rank) of a sorted list of values.
+    """
+
+    rank = int(math.ceil(p / 100.0 * len(values))) - 1
+
+    return values[max(rank, 0)]
+
+
+def summarize(records):
+    """
+    Returns a dictionary mapping the name of every phase to a dictionary with the count and the p50, p95, p99 and max
+    duration (in seconds) of its spans.
+    """
+
+    durations = {}
+
+    for record in records:
+
+        durations.setdefault(record['name'], []).append(record['duration'])
+
+    summary = {}
+
+    for name, values in durations.items():
+
+        values.sort()
+
+        summary[name] = {'count': len(values), 'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                         'p99': percentile(values, 99), 'max': values[-1]}
+
+    return summary
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Summarize the spans in a trace file.")
+
+    parser.add_argument('path', nargs='?', default=TRACE_FILE)
+    parser.add_argument('--since', type=float)
+
+    args = parser.parse_args()
+
+    if not args.path:
+
+        parser.error("No trace file specified (and BITCOIN_TRACE_FILE is not set)")
+
+    summary = summarize(read(args.path, args.since))
+
+    print("{:<40} {:>8} {:>10} {:>10} {:>10} {:>10}".format('phase', 'count', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'max (ms)'))
+
+    for name in sorted(summary):
+
+        s = summary[name]
+
+        print("{:<40} {:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}".format(name, s['count'], s['p50'] * 1e3, s['p95'] * 1e3,
+                                                                              s['p99'] * 1e3, s['max'] * 1e3))
@@ -0,0 +1,283 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-22
+#
+# Implements a pool of persistent (keep-alive) HTTP(S) connections used by the client to talk to the BitStamp API.
+#
+# Re-using a connection saves the TCP and TLS handshakes on every request after the first which matters most on the
+# order-replacement path where the time spent handshaking is pure slippage. The pool also records the connect, TLS and
+# response latency of every request per endpoint.
+
+
+import errno
+import httplib
+import socket
+import threading
+import time
+import urlparse
+
+from bitcoin.settings import HTTP_POOL_SIZE, HTTP_TIMEOUT
+
+
+class TimedHTTPConnection(httplib.HTTPConnection):
+    """
+    HTTP connection that records how long it took to connect.
+    """
+
+    tls_latency = 0.0
+
+    def connect(self):
+
+        start = time.time()
+        httplib.HTTPConnection.connect(self)
+        self.connect_latency = time.time() - start
+
+
+
+class TimedHTTPSConnection(httplib.HTTPSConnection):
+    """
+    HTTPS connection that records how long the TCP connect and the TLS handshake took separately.
+    """
+
+    def connect(self):
+
+        start = time.time()
+        httplib.HTTPConnection.connect(self)            # Open the TCP connection only
+        self.connect_latency = time.time() - start
+
+        start = time.time()
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host)         # Carry out the TLS handshake
+        self.tls_latency = time.time() - start
+
+
+
+class Latency(object):
+    """
+    Accumulates the latencies (in seconds) measured for a single endpoint.
+    """
+
+    __slots__ = ('requests', 'connects', 'connect', 'tls', 'response', 'max_response')
+
+    def __init__(self):
+
+        self.requests = 0           # Number of requests made
+        self.connects = 0           # Number of those that required a new connection (and hence handshakes)
+
+        self.connect = 0.0          # Total time spent on TCP connects, TLS handshakes and waiting for responses
+        self.tls = 0.0
+        self.response = 0.0
+
+        self.max_response = 0.0
+
+
+    def __str__(self):
+
+        return "requests: {} - connects: {} - avg connect: {:.3f}s - avg tls: {:.3f}s - avg response: {:.3f}s - max response: {:.3f}s".format(
+                self.requests, self.connects, self.connect / max(self.connects, 1), self.tls / max(self.connects, 1), self.response / max(self.requests, 1), self.max_response)
+
+
+
+class ConnectionPool(object):
+    """
+    A thread-safe pool of keep-alive connections grouped by (scheme, host, port). At most 'size' idle connections are
+    kept per host; any more are closed when they are released.
+    """
+
+    def __init__(self, size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+
+        self.size = size
+        self.timeout = timeout
+
+        self.latencies = {}         # Dictionary mapping the endpoint (path) to its Latency object
+
+        self._idle = {}
+        self._lock = threading.Lock()
+
+
+    def request(self, method, url, body=None, headers={}, timeout=None):
+        """
+        Make a request using a pooled connection and return a tuple (status, body) of the response.
+
+        The timeout (in seconds) applies to the connect and to every subsequent socket operation of this request.
+        """
+
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+
+        path = parts.path
+        if parts.query: path += '?' + parts.query
+
+        timeout = timeout or self.timeout
+
+        conn, reused = self._acquire(key, timeout)
+
+        try:
+            status, data, latency = self._send(conn, method, path, body, headers)
+
+        except (httplib.BadStatusLine, socket.error) as e:
+
+            conn.close()
+
+            # A connection that sat idle in the pool may have been closed by the server. We retry such a failure once on
+            # a fresh connection. This can not duplicate an authenticated request since BitStamp rejects a re-used nonce.
+            if not reused or (isinstance(e, socket.error) and e.errno not in (errno.EPIPE, errno.ECONNRESET)):
+
+                raise
+
+            conn, reused = self._acquire(key, timeout, fresh=True)
+            status, data, latency = self._send(conn, method, path, body, headers)
+
+        self._record(parts.path, conn, reused, latency)
+        self._release(key, conn)
+
+        return status, data
+
+
+    def get(self, url, timeout=None):
+        """
+        Make a GET request.
+        """
+
+        return self.request('GET', url, timeout=timeout)
+
+
+    def post(self, url, body, timeout=None):
+        """
+        Make a POST request with a url-encoded body.
+        """
+
+        return self.request('POST', url, body, {'Content-Type': 'application/x-www-form-urlencoded'}, timeout)
+
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+
+        with self._lock:
+
+            for conns in self._idle.values():
+
+                for conn in conns:
+
+                    conn.close()
+
+            self._idle = {}
+
+
+    def _send(self, conn, method, path, body, headers):
+        """
+        Send the request over the connection and read the complete response. Returns a tuple (status, body, latency).
+        """
+
+        if conn.sock is not None:
+
+            conn.sock.settimeout(conn.timeout)
+
+        conn.request(method, path, body, headers)
+
+        start = time.time()
+        response = conn.getresponse()
+        data = response.read()
+        latency = time.time() - start
+
+        if response.will_close:         # The server does not want to keep the connection alive
+
+            conn.close()
+
+        return response.status, data, latency
+
+
+    def _acquire(self, key, timeout, fresh=False):
+        """
+        Get an idle connection to the host (or create a new one). Returns a tuple (connection, reused).
+        """
+
+        if not fresh:
+
+            with self._lock:
+
+                conns = self._idle.get(key)
+
+                if conns:
+
+                    conn = conns.pop()
+                    conn.timeout = timeout
+
+                    return conn, True
+
+        scheme, host, port = key
+
+        if scheme == 'https':
+
+            conn = TimedHTTPSConnection(host, port, timeout=timeout)
+
+        else:
+
+            conn = TimedHTTPConnection(host, port, timeout=timeout)
+
+        return conn, False
+
+
+    def _release(self, key, conn):
+        """
+        Return the connection to the pool (unless it has been closed or the pool is full).
+        """
+
+        if conn.sock is None:
+
+            return
+
+        with self._lock:
+
+            conns = self._idle.setdefault(key, [])
+
+            if len(conns) < self.size:
+
+                conns.append(conn)
+                return
+
+        conn.close()
+
+
+    def _record(self, endpoint, conn, reused, response_latency):
+        """
+        Record the latencies of a request made to the endpoint.
+        """
+
+        with self._lock:
+
+            latency = self.latencies.get(endpoint)
+
+            if latency is None:
+
+                latency = self.latencies[endpoint] = Latency()
+
+            latency.requests += 1
+            latency.response += response_latency
+            latency.max_response = max(latency.max_response, response_latency)
+
+            if not reused:
+
+                latency.connects += 1
+                latency.connect += conn.connect_latency
+                latency.tls += conn.tls_latency
+
+
+
+# The pool shared by all client functions
+pool = ConnectionPool()
@@ -0,0 +1,249 @@
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-30
+#
+# Implements the trigger that decides when the event-driven OODA loop (ooda.py --watch) needs to evaluate the decisions.
+#
+# The loop listens to the ticks published by the tick writer and evaluates the decisions (which requires a transaction
+# sync, a balance call and reads from the database) only when:
+#
+#       the buy or sell price has moved by at least OODA_EPSILON since the last evaluation, or
+#       the buy or sell price has crossed one of the levels currently in force (activation thresholds, band edges or
+#           the levels relative to the last buy price used by Minimize Loss and Minimum Profit), or
+#       the configuration has changed, or
+#       OODA_HEARTBEAT seconds have passed since the last evaluation
+#
+# While a purge or acquire is in progress every tick is used to advance it (see bitcoin.execution) instead and the
+# decisions are not evaluated until it ends.
+
+
+import json
+import sys
+import time
+
+from bitcoin import config, tracing
+import bitcoin.execution as execution
+import bitcoin.decisions.falling_trench as falling_trench
+import bitcoin.decisions.rising_peak as rising_peak
+import bitcoin.redis_client as redis_client
+from bitcoin.settings import OODA_EPSILON, OODA_HEARTBEAT
+
+
+ERROR_DELAY = 1             # Time in seconds to wait after a failure before listening to the ticks again
+
+
+def warning(msg):
+    """
+    Method for printing a warning to stderr.
+    """
+    sys.stderr.write("WARNING: " + msg + "\n")
+
+
+def levels(data):
+    """
+    Returns a tuple (buy_levels, sell_levels) of the prices at which the outcome of a decision can change given the data
+    of the last evaluation and the bands currently stored in redis.
+    """
+
+    c = data.config
+
+    sell_levels = [c.absolute_zero_min_threshold, c.rising_peak_activation_threshold]
+    buy_levels = [c.falling_trench_activation_threshold]
+
+    if data.last_buy_price:
+
+        for factor in (c.minimize_loss_drop_factor, c.min_profit_band_lower_factor, c.min_profit_band_upper_factor):
+
+            if factor: sell_levels.append(factor * data.last_buy_price)
+
+    band = rising_peak.fetch()
+
+    if band:        # The band is pushed up when the sell price rises above upper / factor and is acted upon below lower
+
+        sell_levels.append(band['lower'])
+        if c.rising_peak_upper_limit_factor: sell_levels.append(band['upper'] / c.rising_peak_upper_limit_factor)
+
+    band = falling_trench.fetch()
+
+    if band:        # The band is pushed down when the buy price falls below lower / factor and is acted upon above upper
+
+        buy_levels.append(band['upper'])
+        if c.falling_trench_lower_limit_factor: buy_levels.append(band['lower'] / c.falling_trench_lower_limit_factor)
+
+    return [l for l in buy_levels if l is not None], [l for l in sell_levels if l is not None]
+
+
+
+def crossed(previous, current, levels):
+    """
+    Returns True if moving from the previous to the current price crosses (or touches) any of the levels.
+    """
+
+    for level in levels:
+
+        if (previous - level) * (current - level) <= 0 and previous != current:
+
+            return True
+
+    return False
+
+
+
+class Trigger(object):
+    """
+    Keeps the prices, levels and time of the last evaluation and determines whether a new tick requires an evaluation.
+    """
+
+    def __init__(self, epsilon=OODA_EPSILON, heartbeat=OODA_HEARTBEAT):
+
+        self.epsilon = epsilon
+        self.heartbeat = heartbeat
+
+        self.time = None                # Time of the last evaluation (None means an evaluation is due immediately)
+        self.version = None             # Version of the configuration used in the last evaluation
+
+        self.buy = None
+        self.sell = None
+
+        self.buy_levels = []
+        self.sell_levels = []
+
+
+    def reset(self, data):
+        """
+        Record the state of an evaluation that has just been carried out.
+        """
+
+        self.time = time.time()
+        self.version = data.config.version
+
+        self.buy = data.buy
+        self.sell = data.sell
+
+        self.buy_levels, self.sell_levels = levels(data)
+
+
+    def remaining(self):
+        """
+        Returns the number of seconds until the heartbeat requires an evaluation.
+        """
+
+        if self.time is None:
+
+            return 0
+
+        return max(self.time + self.heartbeat - time.time(), 0)
+
+
+    def fire(self, tick=None):
+        """
+        Returns True if an evaluation is required. 'tick' is the latest price sample (a dictionary with 'buy' and 'sell')
+        or None if no tick has arrived (in which case only the heartbeat and the configuration are checked).
+        """
+
+        if self.time is None or self.remaining() == 0:
+
+            return True
+
+        if config.snapshot().version != self.version:
+
+            return True
+
+        if tick is None:
+
+            return False
+
+        if self.buy is None or self.sell is None:           # The last evaluation failed
+
+            return True
+
+        buy = tick['buy']
+        sell = tick['sell']
+
+        if abs(buy - self.buy) >= self.epsilon or abs(sell - self.sell) >= self.epsilon:
+
+            return True
+
+        return crossed(self.buy, buy, self.buy_levels) or crossed(self.sell, sell, self.sell_levels)
+
+
+
+def watch(evaluate, trigger=None):
+    """
+    Listen to the ticks published by the tick writer forever and call evaluate() (which must return the Data object it
+    evaluated the decisions on) whenever the trigger fires. Ticks that arrive while an execution is in progress are
+    used to advance it. A failure is logged and the loop carries on (as the tick writer does).
+    """
+
+    trigger = trigger or Trigger()
+
+    config.subscribe()          # Use keyspace notifications (if enabled) so that checking the config costs no round trip
+
+    pubsub = redis_client.rds.pubsub()
+    pubsub.subscribe(redis_client.TICK_CHANNEL)
+
+    while True:
+
+        try:
+            tick = None
+
+            # An execution in progress is only advanced by ticks so we do not wake up for the heartbeat meanwhile
+            timeout = trigger.heartbeat if execution.active() else max(trigger.remaining(), 0.01)
+
+            message = pubsub.get_message(timeout=timeout)
+
+            if message is not None and message['type'] == 'message':
+
+                tick = json.loads(message['data'])
+
+                # Skip ahead to the latest tick if several have queued up while we were evaluating
+                message = pubsub.get_message()
+
+                while message is not None:
+
+                    if message['type'] == 'message': tick = json.loads(message['data'])
+
+                    message = pubsub.get_message()
+
+            if execution.active():
+
+                if tick is not None:
+
+                    tracing.tick(tick['time'])
+
+                    if execution.step(tick['buy'], tick['sell']) in (execution.DONE, execution.ABORTED):
+
+                        trigger.time = None         # The balance has changed so the decisions are evaluated right away
+
+                    tracing.flush()
+
+                continue
+
+            if trigger.fire(tick):
+
+                trigger.reset(evaluate())
+
+        except Exception as e:
+
+            # A transient failure (API, network, database busy) must not kill the watcher. The evaluation is retried on
+            # the next tick that arrives or at the next heartbeat, whichever comes first.
+            warning("Unable to process tick: {!r}".format(e))
+
+            trigger.time = time.time()
+            trigger.buy = trigger.sell = None
+
+            time.sleep(ERROR_DELAY)         # Do not spin if the failure persists (e.g. redis is down)
@@ -28,9 +28,101 @@ import os
 import pytz
 
 
+CACHE_SIZE = 4096           # Maximum number of memoized timestamps (the cache is simply cleared when it is full)
+
+_cache = {}
+
+_DAYS_IN_MONTH = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
 def unix_timestamp(timestring):
     """
     Takes a timestring denoting the timestamp in UTC and converts it to the unix epoch.
+
+    BitStamp timestamps always have the fixed format 'YYYY-MM-DD HH:MM:SS' which is parsed directly. Anything else is
+    handed over to dateutil. The results are memoized since the same transactions are seen on every sync.
+    """
+
+    ts = _cache.get(timestring)
+
+    if ts is None:
+
+        ts = fixed_format_timestamp(timestring)
+
+        if ts is None:
+
+            ts = dateutil_timestamp(timestring)
+
+        if len(_cache) >= CACHE_SIZE:
+
+            _cache.clear()
+
+        _cache[timestring] = ts
+
+    return ts
+
+
+def fixed_format_timestamp(timestring):
+    """
+    Converts a timestring with the fixed format 'YYYY-MM-DD HH:MM:SS' (optionally followed by a fraction of a second
+    which is truncated) in UTC to the unix epoch using calendar arithmetic. Returns None if the string does not have
+    this format.
+    """
+
+    if len(timestring) < 19 or timestring[4] != '-' or timestring[7] != '-' or timestring[10] != ' ' or timestring[13] != ':' or timestring[16] != ':':
+
+        return None
+
+    if len(timestring) > 19 and (timestring[19] != '.' or not timestring[20:].isdigit()):
+
+        return None
+
+    try:
+        year = int(timestring[0:4])
+        month = int(timestring[5:7])
+        day = int(timestring[8:10])
+        hour = int(timestring[11:13])
+        minute = int(timestring[14:16])
+        second = int(timestring[17:19])
+
+    except ValueError:
+
+        return None
+
+    if not (1970 <= year and 1 <= month <= 12 and 1 <= day <= _DAYS_IN_MONTH[month] and hour < 24 and minute < 60 and second < 60):
+
+        return None
+
+    if month == 2 and day == 29 and not (year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)):
+
+        return None
+
+    return days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second
+
+
+def days_from_civil(year, month, day):
+    """
+    Number of days between 1970-01-01 and the specified date in the (proleptic) Gregorian calendar.
+
+    We count years from March so that the leap day is the last day of the year: the day of the year is then a simple
+    linear function of the month and the days before a year are given by the number of leap years before it.
+    """
+
+    if month <= 2:
+
+        year -= 1
+
+    era = year // 400
+    yoe = year - era * 400                                          # Year of the 400 year era [0, 399]
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1       # Day of the year starting from 1st March [0, 365]
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy                   # Day of the era [0, 146096]
+
+    return era * 146097 + doe - 719468
+
+
+def dateutil_timestamp(timestring):
+    """
+    Converts the timestring (in any format understood by dateutil) in UTC to the unix epoch.
     """
 
     dt = pytz.utc.localize( parse(timestring) )          # Parses the time-string and explicitly sets its locale to UTC
@@ -38,4 +130,4 @@ def unix_timestamp(timestring):
     epoch = pytz.utc.localize( datetime.utcfromtimestamp(0) )       # Get a localized datetime object corresponding to the start of the epoch
     delta = dt - epoch          # Calculate time difference between beginning of epoch and timestamp
 
-    return int(delta.total_seconds())           # Converts delta to seconds which is the definition of the unix timestamp (seconds since epoch)
\ No newline at end of file
+    return int(delta.total_seconds())           # Converts delta to seconds which is the definition of the unix timestamp (seconds since epoch)
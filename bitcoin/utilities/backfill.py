@@ -0,0 +1,223 @@
+#! /usr/bin/python
+#
+#
+# Copyright 2014 Abid Hasan Mujtaba
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+#
+# Author: Abid H. Mujtaba
+# Date: 2014-04-28
+#
+# This script (re)calculates all of the values derived from the prices in a single pass over the "prices" table:
+#
+#       wa_buy, wa_sell                 - weighted averages (previously migrate_2.py)
+#       d1_*, d2_*                      - 1st and 2nd finite differences (previously migrate_4.py)
+#       *_sma, *_lma, *_delta           - short and long moving averages and their separation (previously migrate_5.py)
+#
+# The prices are streamed in time-ordered chunks. Each chunk is preceded by the last OVERLAP prices of the previous one
+# so that the windows of the averages and differences are warmed up exactly as if the whole table had been read at once.
+# The values of each chunk are written using executemany and committed together with a checkpoint (the time of the last
+# price processed) so that an interrupted run resumes from the last committed chunk instead of starting over.
+#
+# Usage:
+#
+#       python -m bitcoin.utilities.backfill [--numpy] [--verify] [--restart] [--chunk SIZE]
+#
+#       --numpy         - Use the vectorized NumPy backend to calculate the averages
+#       --verify        - Check the calculated averages against the (slow) reference implementation
+#       --restart       - Ignore the checkpoint of an interrupted run and start from the beginning
+#       --chunk SIZE    - Number of prices processed (and committed) per chunk
+
+
+import sys
+
+from bitcoin import extrema, profiling, round2, schema
+from bitcoin.settings import SMA_SAMPLES, LMA_SAMPLES
+from bitcoin.utilities.moving_averages import moving_average, verify
+from bitcoin.utilities.weighted_average import linear_weighted_running_average, round_2dp, NUM_WEIGHING_SAMPLES
+
+
+CHECKPOINT = "backfill"         # Name of the checkpoint in the "checkpoints" table
+
+CHUNK_SIZE = 10000              # Number of prices processed per chunk
+
+OVERLAP = max(LMA_SAMPLES, NUM_WEIGHING_SAMPLES, 3) - 1        # Number of previous prices needed to warm up the windows (the 2nd difference needs 2)
+
+
+def fetch_checkpoint(cursor):
+    """
+    Returns the time of the last price processed by an interrupted run or None if there is no such run.
+    """
+
+    values = cursor.execute('''SELECT "time" FROM "checkpoints" WHERE "name" = ?''', (CHECKPOINT,)).fetchone()
+
+    return values[0] if values else None
+
+
+def push_checkpoint(cursor, time):
+    """
+    Record the time of the last price processed. This is committed in the same transaction as the values of the chunk.
+    """
+
+    cursor.execute('''REPLACE INTO "checkpoints" ("name", "time") VALUES (?, ?)''', (CHECKPOINT, time))
+
+
+def delete_checkpoint(cursor):
+    """
+    Delete the checkpoint so that the next run starts from the beginning.
+    """
+
+    cursor.execute('''DELETE FROM "checkpoints" WHERE "name" = ?''', (CHECKPOINT,))
+
+
+def calculate(s_time, s_buy, s_sell, start, backend='python', check=False):
+    """
+    Calculate the derived values of the prices from index 'start' onwards. The prices before 'start' are only used to
+    warm up the windows. Returns a tuple of lists (prices, diffs, averages) of the rows to be written to each table.
+    """
+
+    wa_buy = linear_weighted_running_average(s_buy, NUM_WEIGHING_SAMPLES, backend)
+    wa_sell = linear_weighted_running_average(s_sell, NUM_WEIGHING_SAMPLES, backend)
+
+    b_sma = moving_average(s_buy, SMA_SAMPLES, backend=backend)
+    b_lma = moving_average(s_buy, LMA_SAMPLES, backend=backend)
+
+    s_sma = moving_average(s_sell, SMA_SAMPLES, backend=backend)
+    s_lma = moving_average(s_sell, LMA_SAMPLES, backend=backend)
+
+    if check:
+
+        for series in (s_buy, s_sell):
+
+            verify(series, NUM_WEIGHING_SAMPLES, round_2dp, backend)
+            verify(series, SMA_SAMPLES, backend=backend)
+            verify(series, LMA_SAMPLES, backend=backend)
+
+    prices = []
+    diffs = []
+    averages = []
+
+    for ii in range(start, len(s_time)):
+
+        t = s_time[ii]
+
+        prices.append((wa_buy[ii], wa_sell[ii], t))
+
+        # The finite differences are only defined for prices with at least two predecessors. The 2nd difference is
+        # calculated from the unrounded 1st differences.
+        if ii >= 2:
+
+            diffs.append((t,
+                          round2( s_buy[ii] - s_buy[ii - 1] ),
+                          round2( s_sell[ii] - s_sell[ii - 1] ),
+                          round2( (s_buy[ii] - s_buy[ii - 1]) - (s_buy[ii - 1] - s_buy[ii - 2]) ),
+                          round2( (s_sell[ii] - s_sell[ii - 1]) - (s_sell[ii - 1] - s_sell[ii - 2]) )))
+
+        # The delta indicates how separated the short and long moving averages are at any given time
+        averages.append((t, b_sma[ii], b_lma[ii], round2(b_sma[ii] - b_lma[ii]), s_sma[ii], s_lma[ii], round2(s_sma[ii] - s_lma[ii])))
+
+    return prices, diffs, averages
+
+
+def backfill(conn, chunk_size=CHUNK_SIZE, backend='python', check=False, restart=False, log=True):
+    """
+    Calculate and write the derived values of all prices after the checkpoint (if any), one chunk at a time.
+    Returns the number of prices processed.
+    """
+
+    cursor = conn.cursor()
+
+    if restart:
+
+        delete_checkpoint(cursor)
+        conn.commit()
+
+    last = fetch_checkpoint(cursor)
+
+    if last is None:
+
+        context = []
+
+    else:
+
+        if log: print("Resuming after checkpoint at time {}".format(last))
+
+        context = cursor.execute('''SELECT "time", "buy", "sell" FROM "prices" WHERE "time" <= ? ORDER BY "time" DESC LIMIT ?''', (last, OVERLAP)).fetchall()
+        context.reverse()
+
+    count = 0
+
+    while True:
+
+        if last is None:
+
+            rows = cursor.execute('''SELECT "time", "buy", "sell" FROM "prices" ORDER BY "time" LIMIT ?''', (chunk_size,)).fetchall()
+
+        else:
+
+            rows = cursor.execute('''SELECT "time", "buy", "sell" FROM "prices" WHERE "time" > ? ORDER BY "time" LIMIT ?''', (last, chunk_size)).fetchall()
+
+        if not rows:
+
+            break
+
+        window = context + rows
+        s_time, s_buy, s_sell = [list(column) for column in zip(*window)]
+
+        prices, diffs, averages = calculate(s_time, s_buy, s_sell, len(context), backend, check)
+
+        cursor.executemany('''UPDATE "prices" SET "wa_buy" = ?, "wa_sell" = ? WHERE "time" = ?''', prices)
+        cursor.executemany('''REPLACE INTO "diffs" ("time", "d1_buy", "d1_sell", "d2_buy", "d2_sell") VALUES (?, ?, ?, ?, ?)''', diffs)
+        cursor.executemany('''REPLACE INTO "averages" ("time", "b_sma", "b_lma", "b_delta", "s_sma", "s_lma", "s_delta") VALUES (?, ?, ?, ?, ?, ?, ?)''', averages)
+
+        last = rows[-1][0]
+        push_checkpoint(cursor, last)
+
+        conn.commit()           # The chunk and the checkpoint are committed atomically
+
+        count += len(rows)
+        context = window[-OVERLAP:]
+
+        if log: print("Processed {} prices (up to time {})".format(count, last))
+
+    extrema.rebuild(cursor)         # The block max and min of the weighted averages are out of date
+
+    delete_checkpoint(cursor)           # The run is complete so the next one starts from the beginning
+    conn.commit()
+
+    cursor.close()
+
+    return count
+
+
+
+if __name__ == '__main__':
+
+    profiling.start()           # Handles the --profile switch (see bitcoin.profiling)
+
+    backend = 'numpy' if '--numpy' in sys.argv else 'python'
+
+    chunk_size = CHUNK_SIZE
+
+    if '--chunk' in sys.argv:
+
+        chunk_size = int(sys.argv[sys.argv.index('--chunk') + 1])
+
+    conn = schema.connect()
+
+    backfill(conn, chunk_size, backend, '--verify' in sys.argv, '--restart' in sys.argv)
+
+    conn.close()
+
+    print("Done")
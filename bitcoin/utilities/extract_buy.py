@@ -22,18 +22,18 @@
 # A script for extracting the last 6 hours of buy prices (180 samples) from the database and storing it in a file.
 
 
-import sqlite3
-
-import bitcoin
+from bitcoin import profiling, schema
 
 SAMPLES = 6 * 60
 
 
 if __name__ == '__main__':
 
+    profiling.start()           # Handles the --profile switch (see bitcoin.profiling)
+
     fout = open('buy.txt', 'w')
 
-    conn = sqlite3.connect(bitcoin.get_db())
+    conn = schema.connect()
     cursor = conn.cursor()
 
     for values in cursor.execute('''SELECT "buy" FROM (SELECT "time", "buy" FROM "prices" ORDER BY "time" DESC LIMIT ?) ORDER BY "time" ASC''', (SAMPLES,)):   # Get list of times in descending order
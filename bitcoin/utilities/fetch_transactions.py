@@ -23,17 +23,20 @@
 # information in a CSV file for inclusion in our spreadsheet.
 
 
-from dateutil.parser import parse
-import pytz
+from datetime import datetime
 import sys
 
+from bitcoin import profiling
 import bitcoin.client
+from bitcoin.utilities import unix_timestamp
 
 
 if __name__ == '__main__':
 
+    profiling.start()           # Handles the --profile switch (see bitcoin.profiling)
+
     threshold = sys.argv[1]     # Date containing the threshold date after which to store transactions in the csv file
-    dt = pytz.utc.localize( parse(threshold) )      # Convert sys arg to datetime
+    dt = unix_timestamp(threshold)      # Convert sys arg to unix timestamp
 
 
     print("Fetching transactions from BitStamp server ...")
@@ -47,9 +50,11 @@ if __name__ == '__main__':
 
     for trx in data:
 
-        dts = pytz.utc.localize( parse( trx['datetime'] ))      # Convert transaction time-string to datetime object
+        ts = unix_timestamp(trx['datetime'])      # Convert transaction time-string to unix timestamp
+
+        if trx['type'] == 2 and ts > dt:
 
-        if trx['type'] == 2 and dts > dt:
+            dts = datetime.utcfromtimestamp(ts)
 
             usd = float(trx['usd'])
             btc = float(trx['btc'])
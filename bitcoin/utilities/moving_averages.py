@@ -22,12 +22,206 @@
 # This module implements utilities for calculating the moving average of a data series.
 
 
+from collections import deque
+
 from bitcoin import round2
 
 
-def moving_average(series, N):
+class LinearWeightedAverage:
+    """
+    Streaming estimator of the linearly weighted moving average over the last N values (weight N for the latest value
+    down to 1 for the oldest). Each new sample is incorporated in constant time by keeping a running sum and a running
+    weighted sum of the window: when a sample arrives every existing weight drops by one, so the weighted sum decreases
+    by the plain sum (which also removes the value leaving the window whose weight reaches zero).
+
+    Prices have a precision of one cent so the sums are kept as integer cents which makes them exact (no drift). The
+    rounded result is then identical to the one calculated by reference_moving_average. On an (almost) exact tie at
+    the rounding boundary, or if a value is not a whole number of cents, we fall back to the reference calculation over
+    the window so that the floating point behaviour is reproduced exactly.
+    """
+
+    def __init__(self, N, rounding=round2):
+
+        self.N = N
+        self.rounding = rounding
+
+        self.values = deque()       # The window of values in chronological order (latest at the right end)
+        self.cents = deque()        # The same values as integer cents (None if the value is not a whole number of cents)
+
+        self.sum = 0                # Running sum of the window in cents
+        self.weighted_sum = 0       # Running weighted sum of the window in cents
+        self.inexact = 0            # Number of values in the window that are not a whole number of cents
+
+
+    def push(self, value):
+        """
+        Add a new sample to the window and return the (rounded) moving average including it.
+        """
+
+        cents = int(round(value * 100))
+
+        if abs(value * 100 - cents) > 1e-7:         # Not a whole number of cents so the integer sums can not be used while it is in the window
+
+            cents = None
+            self.inexact += 1
+
+        self.weighted_sum += self.N * (cents or 0) - self.sum       # Every existing weight drops by one and the new value gets weight N
+        self.sum += cents or 0
+
+        self.values.append(value)
+        self.cents.append(cents)
+
+        if len(self.values) > self.N:       # The oldest value now has weight zero (already removed from the weighted sum) so we drop it from the window
+
+            self.values.popleft()
+            old = self.cents.popleft()
+
+            if old is None:
+                self.inexact -= 1
+
+            else:
+                self.sum -= old
+
+        return self.value()
+
+
+    def value(self):
+        """
+        The (rounded) moving average of the current window.
+        """
+
+        k = len(self.values)
+        denom = k * self.N - k * (k - 1) // 2           # Sum of the weights N, N - 1, ..., N - k + 1
+
+        if self.inexact:
+
+            return self.reference()
+
+        # Round the exact quotient (weighted_sum / denom) to the nearest cent: q = floor(weighted_sum / denom + 1/2)
+        q, r = divmod(2 * self.weighted_sum + denom, 2 * denom)
+
+        if min(r, 2 * denom - r) < 1e-6 * 2 * denom:         # The quotient lies (almost) exactly on the rounding boundary
+
+            return self.reference()
+
+        return q / 100.0
+
+
+    def reference(self):
+        """
+        Calculates the (rounded) moving average of the current window in exactly the same manner as reference_moving_average.
+        """
+
+        sum = 0
+        denom = 0
+
+        for jj in range(len(self.values)):
+
+            sum += self.values[-1 - jj] * (self.N - jj)
+            denom += self.N - jj
+
+        return self.rounding( sum / float(denom) )
+
+
+
+def moving_average(series, N, rounding=round2, backend='python'):
+    """
+    Calculates the Weighted Moving Average of a series over the last N values using a linear weighing function.
+
+    This is the batch mode of LinearWeightedAverage and produces exactly the same series as reference_moving_average in O(len) time.
+
+    Passing backend='numpy' calculates the series with numpy_moving_average instead which is much faster for a full
+    history re-calculation.
+    """
+    if backend == 'numpy':
+
+        return numpy_moving_average(series, N, rounding)
+
+    estimator = LinearWeightedAverage(N, rounding)
+
+    return [estimator.push(value) for value in series]
+
+
+
+def numpy_moving_average(series, N, rounding=round2):
+    """
+    Vectorized version of moving_average that uses NumPy to convolve the series with the linear weight kernel.
+
+    As with LinearWeightedAverage the convolution is carried out on integer cents so that it is exact (including the
+    truncated moving average for the first N values) and only the samples whose average lies on a rounding boundary (or
+    whose window contains a value that is not a whole number of cents) are re-calculated using the reference method.
+    """
+    import numpy        # Imported here so that numpy is only required if this backend is selected
+
+    values = numpy.asarray(series, dtype=numpy.float64)
+    length = len(values)
+
+    if length == 0:
+
+        return []
+
+    cents = numpy.rint(values * 100)
+    inexact = numpy.abs(values * 100 - cents) > 1e-7        # Values that are not a whole number of cents
+
+    cents[inexact] = 0
+    cents = cents.astype(numpy.int64)
+
+    kernel = numpy.arange(N, 0, -1, dtype=numpy.int64)          # Weights N, N - 1, ..., 1 for the latest value backwards
+
+    weighted_sum = numpy.convolve(cents, kernel)[:length]       # weighted_sum[ii] = sum(cents[ii - jj] * (N - jj)) over the available jj < N
+
+    k = numpy.minimum(numpy.arange(1, length + 1, dtype=numpy.int64), N)      # Number of values in the window of each sample
+    denom = k * N - k * (k - 1) // 2
+
+    # Round the exact quotient (weighted_sum / denom) to the nearest cent: q = floor(weighted_sum / denom + 1/2)
+    q, r = numpy.divmod(2 * weighted_sum + denom, 2 * denom)
+
+    fallback = numpy.minimum(r, 2 * denom - r) < 1e-6 * 2 * denom        # The quotient lies (almost) exactly on a rounding boundary
+
+    if inexact.any():
+
+        fallback |= numpy.convolve(inexact.astype(numpy.int64), numpy.ones(N, dtype=numpy.int64))[:length] > 0
+
+    result = (q / 100.0).tolist()
+    values = values.tolist()
+
+    for ii in numpy.flatnonzero(fallback).tolist():
+
+        sum = 0
+        weight = 0
+
+        for jj in range(min(ii + 1, N)):
+
+            sum += values[ii - jj] * (N - jj)
+            weight += N - jj
+
+        result[ii] = rounding( sum / float(weight) )
+
+    return result
+
+
+
+def verify(series, N, rounding=round2, backend='python'):
+    """
+    Verifies that the moving average calculated using the specified backend is identical (bit-for-bit after rounding) to
+    the one calculated by reference_moving_average. Raises a RuntimeError at the first sample that differs.
+    """
+    calculated = moving_average(series, N, rounding, backend)
+    reference = reference_moving_average(series, N, rounding)
+
+    for ii in range(len(reference)):
+
+        if calculated[ii] != reference[ii]:
+
+            raise RuntimeError("Backend '{}' differs from reference at sample {}: {} != {}".format(backend, ii, calculated[ii], reference[ii]))
+
+
+
+def reference_moving_average(series, N, rounding=round2):
     """
     Calculates the Weighted Moving Average of a series over the last N values using a linear weighing function.
+
+    This is the original O(len x N) implementation which is kept as the reference against which the faster ones are verified.
     """
     weighing_function = lambda x: (N - x)       # We define a linear weighing function over N samples
 
@@ -47,7 +241,7 @@ def moving_average(series, N):
             sum += series[ii - jj] * weighing_function(jj)       # Multiply value by weight calculated accordingly to distance from main value
             denom += weighing_function(jj)
 
-        weighted_series.append( round2( sum / float(denom) ) )     # Append the calculated weighted sum (rounded to 2 decimal places) to the output series
+        weighted_series.append( rounding( sum / float(denom) ) )     # Append the calculated weighted sum (rounded to 2 decimal places) to the output series
 
     return weighted_series
 
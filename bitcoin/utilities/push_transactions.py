@@ -20,35 +20,127 @@
 # relevant entries (exchange) in the sqlite3 database.
 
 
-import sqlite3
+import json
 
 
 import bitcoin
+from bitcoin import aggregates, schema
+import bitcoin.async_client
 import bitcoin.client
+import bitcoin.redis_client as redis_client
+from bitcoin.tracing import traced
 from bitcoin.utilities import unix_timestamp
 
 
+PAGE_SIZE = 100         # Number of transactions requested per page when syncing
+
+REDIS_KEY = redis_client.KEY_TRANSACTIONS_SYNC      # Key of the high-water mark (id and time of the latest synced transaction) in redis
+
+
+def fetch_mark():
+    """
+    Method for fetching the high-water mark dictionary from redis. Returns None if no sync has been carried out.
+    """
+    mark = redis_client.rds.get(REDIS_KEY)
+
+    if mark:
+
+        return json.loads(mark)
+
+    return None
+
+
+def push_mark(trx):
+    """
+    Method for storing the id and time of the transaction as the high-water mark in redis.
+    """
+    redis_client.rds.set(REDIS_KEY, json.dumps({'id': trx['id'], 'time': unix_timestamp(trx['datetime'])}))
+
+
+def delete_mark():
+    """
+    Method for deleting the high-water mark from redis which forces the next push to carry out a full sync.
+    """
+    redis_client.rds.delete(REDIS_KEY)
+
+
+def fetch_new(mark, latest):
+    """
+    Page through the transactions (newest first) collecting the ones newer than the high-water mark. 'latest' is the
+    first page which has already been fetched. If there is no mark the entire history is collected.
+    """
+
+    new = []
+    page = latest
+    offset = 0
+
+    while True:
+
+        for trx in page:
+
+            if mark and trx['id'] <= mark['id']:        # We have reached the transactions that have already been synced
+
+                return new
+
+            new.append(trx)
+
+        if len(page) < PAGE_SIZE:           # The last page of the history
+
+            return new
+
+        offset += len(page)
+        page = bitcoin.client.transactions(offset, PAGE_SIZE)
+
+
+@traced('push_transactions')
 def push(log=True):
     """
     Fetches transactions from BitStamp and pushes them in to the sqlite3 database where they are used to determine the
     latest buy and sell prices.
+
+    Only transactions newer than the high-water mark (the latest transaction synced previously) are requested and
+    written. If the latest transaction on the server is the high-water mark itself the sync is skipped entirely.
+
+    Returns the list of new transactions written to the database (newest first).
     """
 
-    conn = sqlite3.connect( bitcoin.get_db() )
-    cursor = conn.cursor()
+    mark = fetch_mark()
 
     if log: print("Fetching transactions from BitStamp server ...")
-    data = bitcoin.client.transactions()
 
-    if log: print("Inserting data in to 'transactions' table ...")
+    # If we have a high-water mark the cheap check is to request only the latest transaction and compare it with the mark.
+    # The request runs in the background while we connect to the database.
+    pending = bitcoin.async_client.transactions(0, 1 if mark else PAGE_SIZE)
 
-    for trx in data:
+    conn = schema.connect()
+    cursor = conn.cursor()
+
+    latest = pending.result()
+
+    if mark and (not latest or latest[0]['id'] == mark['id']):
+
+        if log: print("No new transactions.\n")
+
+        conn.close()
+        return []
+
+    data = fetch_new(mark, latest if not mark else bitcoin.client.transactions(0, PAGE_SIZE))
 
-        ts = unix_timestamp(trx['datetime'])
+    if log: print("Inserting {} transactions in to 'transactions' table ...".format(len(data)))
 
-        cursor.execute('''REPLACE INTO "transactions" ("time", "usd", "btc", "rate") VALUES (?,?,?,?)''', (ts, trx['usd'], trx['btc'], trx['btc_usd']))
+    cursor.executemany('''REPLACE INTO "transactions" ("time", "usd", "btc", "rate") VALUES (?,?,?,?)''', [(unix_timestamp(trx['datetime']), trx['usd'], trx['btc'], trx['btc_usd']) for trx in data])
+
+    if data:            # A new trade resets the running aggregates of the prices since the last trade
+
+        aggregates.sync(cursor, *aggregates.last_trade_times(cursor))
 
     conn.commit()
     conn.close()
 
-    if log: print("Done\n")
\ No newline at end of file
+    if data:
+
+        push_mark(data[0])          # Only move the mark once the transactions have been committed
+
+    if log: print("Done\n")
+
+    return data
@@ -22,8 +22,13 @@
 # This module implements utilities for calculating the weighted average of a data series.
 
 
+from bitcoin.utilities.moving_averages import moving_average
+
+
 NUM_WEIGHING_SAMPLES = 10      # Define the weighted sum sampling window to be 15 min
 
+round_2dp = lambda x: round(x, 2)          # The rounding used by the functions in this module (which differs slightly from bitcoin.round2)
+
 WEIGHING_FUNCTION = lambda x: (NUM_WEIGHING_SAMPLES - x)           # We use a linear weighing function. x = 0 is the end-value
                                                                    # and as x increases we are looking at successively older values
 
@@ -59,6 +64,16 @@ def weighted_running_average(series, N, weighing_function = None):
 
 
 
+def linear_weighted_running_average(series, N, backend='python'):
+    """
+    Calculates the same series as weighted_running_average(series, N, lambda x: (N - x)) but in constant time per sample
+    using the streaming LinearWeightedAverage estimator (or the vectorized NumPy backend if backend='numpy').
+    """
+
+    return moving_average(series, N, round_2dp, backend)
+
+
+
 def single_weighted_average(series, N, weighing_function = None):
     """
     Calculates the weighted running average of the last sample in the series using the previous samples.
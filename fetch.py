@@ -22,19 +22,25 @@
 # This script fetches data from the BitStamp backedn API and prints it to stdout
 
 from datetime import datetime
-import sqlite3
 import sys
 import time
 
-import bitcoin
-from bitcoin import client, round2
-from bitcoin.settings import SMA_SAMPLES, LMA_SAMPLES
-from bitcoin.utilities.weighted_average import single_weighted_average, NUM_WEIGHING_SAMPLES, WEIGHING_FUNCTION
-from bitcoin.utilities.moving_averages import latest_moving_average
+from bitcoin import client, profiling, schema
+from bitcoin.settings import TICK_INTERVAL
+from bitcoin.tick import TickWriter
 
 
 if __name__ == '__main__':
 
+    profiling.start()           # Handles the --profile switch (see bitcoin.profiling)
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--daemon':         # The --daemon switch has been passed so we keep running and insert a sample every interval seconds
+
+        interval = float(sys.argv[2]) if len(sys.argv) > 2 else TICK_INTERVAL
+
+        writer = TickWriter( schema.connect() )
+        writer.run(interval)
+
     data = client.current_price()
 
     buy = data["buy"]
@@ -45,72 +51,9 @@ if __name__ == '__main__':
 
     if len(sys.argv) > 1 and sys.argv[1] == '--insert':         # The --insert switch has been passed so we insert the data in to the sqlite3 database
 
-        conn = sqlite3.connect( bitcoin.get_db() )
-        cursor = conn.cursor()
-
-        # We pull previous (NUM_WEIGHING_SAMPLES - 1) prices to calculate the current weighted_average of the prices:
-        
-        s_buy = []
-        s_sell = []
-
-        for values in cursor.execute('''SELECT "buy", "sell" FROM "prices" ORDER BY "time" DESC LIMIT ?''', (NUM_WEIGHING_SAMPLES - 1,)):
-
-            s_buy.append( values[0] )
-            s_sell.append( values[1] )
-
-        # Append the current values
-        s_buy.append( float(buy) )
-        s_sell.append( float(sell) )
-
-        wbuy = single_weighted_average(s_buy, NUM_WEIGHING_SAMPLES, WEIGHING_FUNCTION)
-        wsell = single_weighted_average(s_sell, NUM_WEIGHING_SAMPLES, WEIGHING_FUNCTION)
-
-
-        # We JOIN the "prices" and "diffs" table NATURALly (which means on the common columns, in this case only "time") and then extract the latest value of the prices and 1st finite
-        # difference. We will use these to calculate the current 1st and 2nd finite differences.
-        values = cursor.execute('''SELECT "buy", "sell", "d1_buy", "d1_sell" FROM "prices" NATURAL JOIN "diffs" ORDER BY "time" DESC LIMIT 1''').fetchone()
-
-        last_buy = values[0]
-        last_sell = values[1]
-        last_d1_buy = values[2]
-        last_d1_sell = values[3]
-
-        d1_buy = round2( float(buy) - last_buy )             # Calculate the finite differences and round to 2 decimal places
-        d1_sell = round2( float(sell) - last_sell )
-
-        d2_buy = round2( d1_buy - last_d1_buy )
-        d2_sell = round2( d1_sell - last_d1_sell )
-
-
-        cursor.execute('''INSERT INTO "prices" ("time", "buy", "sell", "wa_buy", "wa_sell") VALUES (?, ?, ?, ?, ?)''', (now, buy, sell, wbuy, wsell))
-
-        cursor.execute('''INSERT INTO "diffs" ("time", "d1_buy", "d1_sell", "d2_buy", "d2_sell") VALUES (?, ?, ?, ?, ?)''', (now, d1_buy, d1_sell, d2_buy, d2_sell))
-
-        s_buy = []
-        s_sell = []
-
-        for values in cursor.execute('''SELECT "buy", "sell" FROM "prices" ORDER BY "time" DESC LIMIT ?''', (LMA_SAMPLES,)):
-
-            s_buy.append(values[0])
-            s_sell.append(values[1])
-
-
-        # Calculate moving averages and deltas:
-
-        b_lma = latest_moving_average(s_buy, LMA_SAMPLES)
-        b_sma = latest_moving_average(s_buy, SMA_SAMPLES)
-        b_delta = round2(b_sma - b_lma)
-
-        s_lma = latest_moving_average(s_sell, LMA_SAMPLES)
-        s_sma = latest_moving_average(s_sell, SMA_SAMPLES)
-        s_delta = round2(s_sma - s_lma)
-
-        # Store calculated values in database:
-
-        cursor.execute('''INSERT INTO "averages" ("time", "b_sma", "b_lma", "b_delta", "s_sma", "s_lma", "s_delta") VALUES (?, ?, ?, ?, ?, ?, ?)''', (now, b_sma, b_lma, b_delta, s_sma, s_lma, s_delta))
-
-        conn.commit()
-        conn.close()
+        writer = TickWriter( schema.connect() )
+        writer.insert(now, buy, sell)
+        writer.close()
 
     else:           # The --insert switch has NOT been passed so we print the fetched data to stdout
 
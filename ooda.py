@@ -20,9 +20,21 @@
 # Date: 2014-02-27
 #
 # Implement the OODA loop (Observe-Orient-Decide-Act) for bitcoin exchange.
+#
+# Usage:
+#
+#       python ooda.py              - Carry out a single OODA cycle (run from cron). If a purge or acquire is in
+#                                     progress it is advanced using the current price instead.
+#       python ooda.py --watch      - Keep running and carry out a cycle whenever a tick published by fetch.py moves the
+#                                     price enough to matter (or the heartbeat interval passes). See bitcoin.trigger.
+
 
+import sys
 
 from bitcoin.models import Data
+from bitcoin import profiling, tracing, trigger
+import bitcoin.client as client
+import bitcoin.execution as execution
 
 import bitcoin.decisions.absolute_zero as absolute_zero
 import bitcoin.decisions.minimize_loss as minimize_loss
@@ -48,18 +60,49 @@ def initiate_decisions():
 
 
 
+def evaluate(decisions):
+    """
+    Carry out a single OODA cycle and return the Data object the decisions were evaluated on.
+    """
+
+    with tracing.span('ooda.cycle'):
+
+        d = Data()
+
+        for decision in decisions:
+
+            decision.execute(d)
+
+            if decision.final():
+
+                break
+
+        if execution.active():          # A decision has started a purge or acquire so we place its first order right away
+
+            execution.step(d.buy, d.sell)
+
+    tracing.flush()         # Write the spans of the cycle to the trace file
+
+    return d
+
+
+
 if __name__ == '__main__':
 
-    d = Data()
+    profiling.start()           # Handles the --profile switch (see bitcoin.profiling)
 
     # Create the list of decisions to be carried out (this includes the Orient, Decide and Act phases of OODA)
     decisions = initiate_decisions()
 
+    if '--watch' in sys.argv:
+
+        trigger.watch(lambda: evaluate(decisions))
+
+    elif execution.active():
 
-    for decision in decisions:
+        price = client.current_price()
+        execution.step(price['buy'], price['sell'])
 
-        decision.execute(d)
-        
-        if decision.final():
+    else:
 
-            break
+        evaluate(decisions)
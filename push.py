@@ -22,9 +22,12 @@
 # This script fetches transaction data from the BitStamp backend API and pushes it in to the database
 
 
+from bitcoin import profiling
 import bitcoin.utilities.push_transactions as push_transactions
 
 
 if __name__ == '__main__':
 
+    profiling.start()           # Handles the --profile switch (see bitcoin.profiling)
+
     push_transactions.push()
\ No newline at end of file
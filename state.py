@@ -23,18 +23,24 @@
 # prices and open orders
 
 
-import bitcoin.client as client
+from bitcoin import profiling
+import bitcoin.async_client as async_client
 
 
 if __name__ == '__main__':
 
+    profiling.start()           # Handles the --profile switch (see bitcoin.profiling)
+
+    # The three requests are made concurrently
+    price, balance, orders = async_client.gather( async_client.current_price(), async_client.balance(), async_client.open_orders() )
+
     print("\nCurrent Price:\n")
-    print(client.current_price())
+    print(price)
 
     print("\n\nBalance:\n")
-    print(client.balance())
+    print(balance)
 
     print("\n\nOpen Orders:\n")
-    print(client.open_orders())
+    print(orders)
 
     print
\ No newline at end of file